@@ -6,12 +6,12 @@ from PyQt6.QtWidgets import (
     QWidget,
     QGraphicsView,
 )
-from PyQt6.QtGui import QImage, QPixmap, QPainter
-from PyQt6.QtCore import Qt, QPointF, pyqtSignal, QObject, QEvent, QTimer
+from PyQt6.QtGui import QImage, QPixmap, QPainter, QColor
+from PyQt6.QtCore import Qt, QPointF, pyqtSignal, QObject, QEvent, QTimer, QThread
 from enum import Enum
 import yaml
 from random_qt_color import get_rand_brush_color
-from graphic_items import NgonItem
+from graphic_items import NgonItem, TextGraphicItem
 
 from video_processing_thread import VideoProcessingThread
 from file_methods import get_user_path_save_last_dir
@@ -26,6 +26,15 @@ from source.track_objects import (
     get_track_object_from_dict,
 )
 from source.threaded_camgear import ThreadedCamGear
+from source.capture_manager import capture_manager
+from source.session import (
+    get_source_options,
+    get_stream_options,
+    get_track_objects_scale,
+)
+from source.dewarp import Dewarper
+from source.detection_store import DetectionStore, find_detection_store
+from source.trajectory_index import TrajectoryIndex
 
 
 class ToolType(Enum):
@@ -77,6 +86,9 @@ class DrawableGraphicsScene(QGraphicsScene):
     detect_window_completed = pyqtSignal(
         int, int, int, int, int, int, int, int
     )  # x1, y1, x2, y2, x3, y3, x4, y4
+    detect_window_changed = pyqtSignal(
+        int, int, int, int, int, int, int, int
+    )  # while the last point follows the mouse
     drawing_interrupted = pyqtSignal()
 
     def __init__(self, parent=None):
@@ -185,6 +197,8 @@ class DrawableGraphicsScene(QGraphicsScene):
                 self.current_item.setPoints(
                     *[*self.current_item.points[:3], current_point],
                 )
+                if self.touched >= 3:
+                    self.detect_window_changed.emit(*self.current_item.get_xy())
 
         return super().mouseMoveEvent(event)
 
@@ -192,12 +206,33 @@ class DrawableGraphicsScene(QGraphicsScene):
         event.ignore()
 
 
+class LoadTrajectoriesThread(QThread):
+    loaded = pyqtSignal(str, object)  # source path, TrajectoryIndex or None
+
+    def __init__(self, path: str):
+        super().__init__(parent=None)
+        self.path = path
+
+    def run(self):
+        trajectories = None
+        store_path = find_detection_store(self.path)
+        if not store_path is None:
+            try:
+                trajectories = TrajectoryIndex(DetectionStore(store_path))
+                print(
+                    f"What-if counting on {len(trajectories)} points of tracks from {store_path}"
+                )
+            except Exception as err:
+                print(f"Can't load trajectories from {store_path}: {err}")
+        self.loaded.emit(self.path, trajectories)
+
+
 class EditConfigWidget(QWidget):
 
     video_processor: VideoProcessingThread
     data: list[AbstractTrackObject]
     _video_cap: ThreadedCamGear
-    _later_delete_threads: list[ThreadedCamGear]
+    _later_delete_threads: list[ThreadedCamGear | LoadTrajectoriesThread]
     processing = pyqtSignal(list)  # show, AI options
     set_path_succeded = pyqtSignal(bool)
 
@@ -209,7 +244,8 @@ class EditConfigWidget(QWidget):
         self.scene = DrawableGraphicsScene()
 
         self.scene.detect_window_completed.connect(self.get_detect_window)
-        self.scene.drawing_interrupted.connect(self.stop_drawing)
+        self.scene.detect_window_changed.connect(self.schedule_what_if)
+        self.scene.drawing_interrupted.connect(self.interrupt_drawing)
         self.ui.button_add_detect_window.clicked.connect(self.draw_spectator)
         self.ui.button_save_config.clicked.connect(self.save_config)
         self.ui.action_save_config.triggered.connect(self.save_config)
@@ -254,6 +290,7 @@ class EditConfigWidget(QWidget):
         self.video_processor = None
         self.data = []
         self.path = None
+        self.source_options = None
         self.curr_id = 0
         self.curr_scale = 1.0
         self.exit_connection = []
@@ -261,6 +298,15 @@ class EditConfigWidget(QWidget):
         self._async_scenario = 0
         self._later_delete_threads = []
 
+        # what-if counts of edited rooms from trajectories of a detection store of the source
+        self.trajectories = None
+        self.what_if_items = {}  # room id -> TextGraphicItem
+        self.what_if_pending = None  # (room id, scene coordinates) of the latest change
+        self.what_if_timer = QTimer(self)
+        self.what_if_timer.setSingleShot(True)
+        self.what_if_timer.setInterval(30)  # changes while dragging are coalesced
+        self.what_if_timer.timeout.connect(self.update_what_if)
+
     def closeEvent(self, a0):
         for cam_thread in self._later_delete_threads:
             if cam_thread.isRunning():
@@ -278,15 +324,31 @@ class EditConfigWidget(QWidget):
         for i in idx[::-1]:
             self._later_delete_threads.pop(i)
 
-    def set_path(self, path: str):
+    def set_path(self, path: str, source_options: dict = None):
         """Change frame, delete all previous data
 
         Emits success of the operation with set_path_succeded(bool) pyqtsignal
+
+        Args:
+            source_options: decoding options of the session entry. Rooms of dewarped sources are edited on the dewarped view
         """
         if self._async_scenario != 0:
             return
         self.path = path
+        self.source_options = source_options
         self.data = []
+        self.load_trajectories()
+
+        frame = None
+        options = get_source_options({"source_options": source_options})
+        if get_track_objects_scale(options) == 1.0:
+            # frames of the capture are in coordinates of the rooms
+            frame = capture_manager.latest_frame(path, **get_stream_options(options))
+        if not frame is None:
+            # source is already shown by a viewer, don't open it once more
+            self.change_frame(frame)
+            QTimer.singleShot(0, lambda: self.set_path_succeded.emit(True))
+            return
 
         self._video_cap = ThreadedCamGear(10)
         self._video_cap.init_succeed.connect(self._finalize1_set_path)
@@ -319,6 +381,9 @@ class EditConfigWidget(QWidget):
         if async_scenario != 2:
             return
         if not frame is None:
+            dewarp = (self.source_options or {}).get("dewarp")
+            if dewarp:
+                frame = Dewarper(dewarp).apply(frame)
             self.change_frame(frame)
 
         self._video_cap.finished.connect(self._remove_deleted_threads)
@@ -342,6 +407,7 @@ class EditConfigWidget(QWidget):
             )
         )
         self.scene.clear()
+        self.what_if_items = {}
         pixmap = self.scene.addPixmap(self.current_frame)
         pixmap.setZValue(-2)
         self.scene.setSceneRect(
@@ -430,7 +496,84 @@ class EditConfigWidget(QWidget):
         self.ui.frame_viewer.setMouseTracking(True)
         self.curr_id += 1
 
+    def load_trajectories(self):
+        """Trajectories of people from the latest detection store of the source (--save-detections
+        of source.batch), rooms being edited are counted on them
+
+        The store is read on a background thread like frames of the source, counts of rooms
+        appear when it's loaded
+        """
+        self.trajectories = None
+        loader = LoadTrajectoriesThread(self.path)
+        loader.loaded.connect(self._finalize_load_trajectories)
+        loader.finished.connect(self._remove_deleted_threads)
+        self._later_delete_threads.append(loader)
+        loader.start()
+
+    def _finalize_load_trajectories(self, path: str, trajectories):
+        if path != self.path:  # another source was opened meanwhile
+            return
+        self.trajectories = trajectories
+        self.show_what_if_all()
+
+    def schedule_what_if(self, *points: int):
+        if self.trajectories is None:
+            return
+        self.what_if_pending = (self.scene.curr_id, points)
+        if not self.what_if_timer.isActive():
+            self.what_if_timer.start()
+
+    def update_what_if(self):
+        if self.what_if_pending is None:
+            return
+        room_id, points = self.what_if_pending
+        self.what_if_pending = None
+        self.show_what_if(room_id, points)
+
+    def show_what_if(self, room_id: int, points: tuple[int]):
+        """Show counts of a room over stored trajectories next to it
+
+        Args:
+            points: x1, y1, ..., x4, y4 in scene coordinates
+        """
+        if self.trajectories is None:
+            return
+        zoom_val = self.zoom_value()
+        pack = [
+            [int(points[i] / zoom_val), int(points[i + 1] / zoom_val)]
+            for i in range(0, 8, 2)
+        ]
+        window = get_track_object_from_dict(DetectWindow(room_id, *pack).get_dict())
+        counts = self.trajectories.count(window)
+
+        item = self.what_if_items.get(room_id)
+        if item is None:
+            item = TextGraphicItem("")
+            item.setFontAndColor(12, QColor("yellow"))
+            item.setZValue(3)
+            self.scene.addItem(item)
+            self.what_if_items[room_id] = item
+        item.setPlainText(
+            f"in {counts['in']} / out {counts['out']}\n"
+            f"inside {counts['contain']} (max {counts['max_contain']})\n"
+            f"incidents {counts['incidents']}"
+        )
+        xs, ys = points[0::2], points[1::2]
+        item.setValidPos([min(xs), max(ys)], [max(xs), max(ys)], 0, 5, self.scene)
+        item.show()
+
+    def hide_what_if(self, room_id: int):
+        item = self.what_if_items.pop(room_id, None)
+        if not item is None:
+            self.scene.removeItem(item)
+
+    def interrupt_drawing(self):
+        self.hide_what_if(self.scene.curr_id)
+        self.stop_drawing()
+
     def stop_drawing(self):
+        self.what_if_timer.stop()
+        self.what_if_pending = None
         self.set_drag(True)
         self.ui.frame_viewer.setMouseTracking(False)
         self.ui.frame_viewer.setTransformationAnchor(
@@ -461,6 +604,9 @@ class EditConfigWidget(QWidget):
         self.data.append(DetectWindow(self.curr_id, *pack))
 
         self.stop_drawing()
+        self.show_what_if(
+            self.scene.curr_id, (p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, p4_x, p4_y)
+        )
 
     def set_drag(self, is_active: bool):
         if is_active:
@@ -522,9 +668,18 @@ class EditConfigWidget(QWidget):
             data = yaml.safe_load(file)
 
         self.construct_data(data)
-        resized = self.get_rescaled_data(self.data)
+        self.scene.draw_objects(self.get_rescaled_data(self.data))
+        self.show_what_if_all()
 
-        self.scene.draw_objects(resized)
+    def show_what_if_all(self):
+        if self.trajectories is None or len(self.data) == 0:
+            return
+        for track_object in self.get_rescaled_data(self.data):
+            obj_dict = track_object.get_dict()
+            self.show_what_if(
+                track_object.room_id,
+                [v for i in range(1, 5) for v in obj_dict[f"point{i}"]],
+            )
 
     def process(self):
         dialog = Dialog(self, "Show processing?")
@@ -0,0 +1,38 @@
+from PyQt6.QtCore import QMutex, QMutexLocker
+import numpy as np
+
+
+class FrameBufferPool:
+    """Fixed set of reusable uint8 image buffers shared between a worker and the GUI
+
+    Worker acquires a free buffer, renders into it and hands its index to the GUI.
+    GUI releases the index after it stopped displaying the buffer.
+    """
+
+    def __init__(self, size: int = 3):
+        self.mutex = QMutex()
+        self._buffers = [None] * size
+        self._free = list(range(size))
+
+    def acquire(self, shape: tuple[int]) -> tuple[int, np.ndarray]:
+        """
+        Returns:
+            (index, buffer) of a free buffer with requested shape or (None, None) if all buffers are in use
+        """
+        with QMutexLocker(self.mutex):
+            if len(self._free) == 0:
+                return None, None
+            index = self._free.pop(0)
+
+        buffer = self._buffers[index]
+        if buffer is None or buffer.shape != tuple(shape):
+            buffer = np.empty(shape, dtype=np.uint8)
+            self._buffers[index] = buffer
+        return index, buffer
+
+    def release(self, index: int):
+        if index is None:
+            return
+        with QMutexLocker(self.mutex):
+            if index not in self._free:
+                self._free.append(index)
@@ -164,7 +164,13 @@ class NgonItem(AbstractActivatedIdGraphicsItem):
             ]
         elif len(points) == self.n:
             self.points = points
+        self._points_key = None
+        self._sorted_points = []
+        self._path = QPainterPath()
+        self._bounding_rect = QRectF()
+        self._pen = QPen()
         self.points = self.get_sorted_points()
+        self._update_geometry()
         self.orig_color = [QColor(255, 140, 0), QColor(255, 165, 0, 128)]
         self.setPen(QPen(self.orig_color[0], 2))
         self.setBrush(QBrush(self.orig_color[1]))
@@ -172,7 +178,7 @@ class NgonItem(AbstractActivatedIdGraphicsItem):
 
     def get_sorted_points(self):
         if len(self.points) < 3:
-            return self.points
+            return list(self.points)
 
         center_x = sum(p.x() for p in self.points) / len(self.points)
         center_y = sum(p.y() for p in self.points) / len(self.points)
@@ -182,6 +188,39 @@ class NgonItem(AbstractActivatedIdGraphicsItem):
 
         return sorted(self.points, key=angle_from_center)
 
+    def _update_geometry(self):
+        """Rebuild cached sorted points, path and bounding rect from self.points"""
+        self._points_key = tuple((point.x(), point.y()) for point in self.points)
+
+        self._sorted_points = [QPointF(point) for point in self.get_sorted_points()]
+
+        self._path = QPainterPath()
+        if len(self._sorted_points) >= 2:
+            self._path.moveTo(self._sorted_points[0])
+            for point in self._sorted_points[1:]:
+                self._path.lineTo(point)
+            self._path.closeSubpath()
+
+        self._update_bounding_rect()
+
+    def _update_bounding_rect(self):
+        if not self.points:
+            self._bounding_rect = QRectF()
+            return
+
+        min_x = min(x for x, _ in self._points_key)
+        min_y = min(y for _, y in self._points_key)
+        max_x = max(x for x, _ in self._points_key)
+        max_y = max(y for _, y in self._points_key)
+
+        pen_width = self._pen.width()
+        self._bounding_rect = QRectF(
+            min_x - pen_width,
+            min_y - pen_width,
+            max_x - min_x + 2 * pen_width,
+            max_y - min_y + 2 * pen_width,
+        )
+
     def setPoints(self, *points: QPointF | int):
         """Установить точки многоугольника"""
         if len(points) == self.n:
@@ -193,7 +232,12 @@ class NgonItem(AbstractActivatedIdGraphicsItem):
         else:
             return
 
+        points_key = tuple((point.x(), point.y()) for point in self.points)
+        if points_key == self._points_key:
+            return
+
         self.prepareGeometryChange()
+        self._update_geometry()
         self.update()
 
     def get_xy(self) -> list[int]:
@@ -210,57 +254,32 @@ class NgonItem(AbstractActivatedIdGraphicsItem):
         return super().setBrush(brush)
 
     def setPen(self, pen):
+        width_changed = pen.width() != self._pen.width()
+        if width_changed:
+            self.prepareGeometryChange()
         self._pen = pen
         self.orig_color[0] = pen.color()
+        if width_changed:
+            self._update_bounding_rect()
         self.update(self.boundingRect())
         return super().setPen(pen)
 
     def boundingRect(self):
         """Возвращает ограничивающий прямоугольник элемента"""
-        if not self.points:
-            return QRectF()
-
-        min_x = min(point.x() for point in self.points)
-        min_y = min(point.y() for point in self.points)
-        max_x = max(point.x() for point in self.points)
-        max_y = max(point.y() for point in self.points)
-
-        pen_width = self.pen().width()
-        return QRectF(
-            min_x - pen_width,
-            min_y - pen_width,
-            max_x - min_x + 2 * pen_width,
-            max_y - min_y + 2 * pen_width,
-        )
+        return self._bounding_rect
 
     def shape(self):
         """Возвращает точную форму для обработки событий"""
-        path = QPainterPath()
-        points = self.get_sorted_points()
-        if len(points) < 2:
-            return path
-
-        path.moveTo(points[0])
-        for i in range(1, len(points)):
-            path.lineTo(points[i])
-        path.closeSubpath()
-        return path
+        return self._path
 
     def paint(self, painter, option, widget=None):
         """Отрисовывает четырёхугольник"""
-        points = self.get_sorted_points()
-        if len(points) != self.n:
+        if len(self._sorted_points) != self.n:
             return
 
-        path = QPainterPath()
-        path.moveTo(points[0])
-        for i in range(1, self.n):
-            path.lineTo(points[i])
-        path.closeSubpath()
-
         painter.setBrush(self._brush)
         painter.setPen(self._pen)
-        painter.drawPath(path)
+        painter.drawPath(self._path)
 
     def set_orig_color(self):
         pen_color, brush_color = self.orig_color
@@ -290,11 +309,16 @@ class NgonItem(AbstractActivatedIdGraphicsItem):
 
 class TrackGraphicItem(QGraphicsItem):
 
+    centre_brush = QBrush(QColor(255, 0, 0, 255))
+
     def __init__(self, x1: int, y1: int, x2: int, y2: int, parent=...):
         super().__init__(parent)
 
         self.rect = None
         self.centre_point = None
+        self.p1 = None
+        self.p2 = None
+        self._bounding_rect = QRectF()
         self.pen = QPen(QColor(255, 0, 0))
         self.pen.setJoinStyle(Qt.PenJoinStyle.RoundJoin)
         self.pen.setWidth(2)
@@ -304,11 +328,17 @@ class TrackGraphicItem(QGraphicsItem):
         self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, False)
 
     def boundingRect(self):
+        return self._bounding_rect
+
+    def _update_bounding_rect(self):
         if self.rect is None:
-            return QRectF()
+            self._bounding_rect = QRectF()
+            return
 
         pen_width = self.pen.widthF()
-        return self.rect.adjusted(-pen_width, -pen_width, pen_width, pen_width)
+        self._bounding_rect = self.rect.adjusted(
+            -pen_width, -pen_width, pen_width, pen_width
+        )
 
     def height(self):
         if self.rect:
@@ -328,15 +358,21 @@ class TrackGraphicItem(QGraphicsItem):
             painter.drawRect(self.rect)
 
         if self.centre_point:
-            painter.setBrush(QBrush(QColor(255, 0, 0, 255)))
+            painter.setBrush(self.centre_brush)
             painter.drawEllipse(self.centre_point)
 
     def setRect(self, x1: int, y1: int, x2: int, y2: int):
         sorted_x = sorted([x1, x2])
         sorted_y = sorted([y1, y2])
 
-        self.p1 = [sorted_x[0], sorted_y[0]]
-        self.p2 = [sorted_x[1], sorted_y[1]]
+        p1 = [sorted_x[0], sorted_y[0]]
+        p2 = [sorted_x[1], sorted_y[1]]
+        if p1 == self.p1 and p2 == self.p2:
+            return
+
+        self.prepareGeometryChange()
+        self.p1 = p1
+        self.p2 = p2
 
         width = self.p2[0] - self.p1[0]
         height = self.p2[1] - self.p1[1]
@@ -346,11 +382,15 @@ class TrackGraphicItem(QGraphicsItem):
         center_x = self.p1[0] + width / 2 - 2.5
         center_y = self.p1[1] + height / 2 - 2.5
         self.centre_point = QRectF(center_x, center_y, 5, 5)
-
-        self.prepareGeometryChange()
+        self._update_bounding_rect()
 
     def setPen(self, pen):
-        self.pen = pen
+        if pen.widthF() != self.pen.widthF():
+            self.prepareGeometryChange()
+            self.pen = pen
+            self._update_bounding_rect()
+        else:
+            self.pen = pen
         self.update()
 
     def setBrush(self, brush):
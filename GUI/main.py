@@ -7,8 +7,6 @@ from video_processing_thread import VideoProcessingThread
 from threaded_viewer import ThreadedViewer
 from PyQt6.QtCore import QTimer, QThread, pyqtSignal
 import yaml
-import torch.cuda as cuda
-from ultralytics import YOLO
 from file_methods import get_user_path_save_last_dir
 
 import sys
@@ -17,6 +15,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from source.tracker import AI_names
+from source.model_export import export_stale_models, print_progress
 
 
 class EditConfigWindow(QMainWindow):
@@ -84,7 +83,10 @@ class EditConfigWindow(QMainWindow):
             if success:
                 self._load_session_success = True
                 self.ui.edit_config_widget.construct_data(self._load_session_list[0]["data"])
-                self.process(self._load_session_list[0]["options"])
+                self.process(
+                    self._load_session_list[0]["options"],
+                    self._load_session_list[0].get("source_options"),
+                )
 
             self._load_session_list.pop(0)
 
@@ -100,7 +102,10 @@ class EditConfigWindow(QMainWindow):
                 self.load_session_succeded.emit(True)
                 return
 
-            self.ui.edit_config_widget.set_path(self._load_session_list[0]["path"])
+            self.ui.edit_config_widget.set_path(
+                self._load_session_list[0]["path"],
+                self._load_session_list[0].get("source_options"),
+            )
             return
         
         if self._finalize_editconfigwidget_set_path_scenario == -1:
@@ -147,38 +152,29 @@ class EditConfigWindow(QMainWindow):
 
         return row, column
 
-    def add_viewer(self, options):
+    def add_viewer(self, options, source_options: dict = None):
         last_viewer_ind = len(self.viewers) % 9
         row, column = self.get_row_column(last_viewer_ind)
 
         viewer = ThreadedViewer(row=row, column=column, parent=self)
+        session_entry = {
+            "options": options,
+            "path": self.ui.edit_config_widget.path,
+            "data": [
+                track_object.get_dict()
+                for track_object in self.ui.edit_config_widget.data
+            ],
+        }
+        if not source_options is None:
+            session_entry["source_options"] = source_options
         if len(self.viewers) > 9:
             self.viewers.insert(0, viewer)
             self.viewers.pop(1)
-            self.session.insert(
-                0,
-                {
-                    "options": options,
-                    "path": self.ui.edit_config_widget.path,
-                    "data": [
-                        track_object.get_dict()
-                        for track_object in self.ui.edit_config_widget.data
-                    ],
-                },
-            )
+            self.session.insert(0, session_entry)
             self.session.pop(1)
         else:
             self.viewers.append(viewer)
-            self.session.append(
-                {
-                    "options": options,
-                    "path": self.ui.edit_config_widget.path,
-                    "data": [
-                        track_object.get_dict()
-                        for track_object in self.ui.edit_config_widget.data
-                    ],
-                }
-            )
+            self.session.append(session_entry)
 
         viewer.closed.connect(self.remove_viewer)
         viewer.clicked.connect(self.focus_viewer)
@@ -194,6 +190,7 @@ class EditConfigWindow(QMainWindow):
             ),
             self.ui.edit_config_widget.data,
             options,
+            source_options,
         )
 
     def remove_viewer(self, row: int, column: int):
@@ -262,10 +259,16 @@ class EditConfigWindow(QMainWindow):
 
             self.ui.stacked_widget.setCurrentIndex(1)  # viewers page
 
-    def process(self, options: list[bool] = None):
+    def process(self, options: list[bool] = None, source_options: dict = None):
+        """
+        Args:
+            source_options: decoding options of the session entry, see source.session.default_source_options
+        """
         self.ui.stacked_widget.setCurrentIndex(1)  # viewers page
 
-        self.add_viewer(options)
+        if source_options is None:
+            source_options = self.ui.edit_config_widget.source_options
+        self.add_viewer(options, source_options)
 
     def save_session(self):
 
@@ -312,53 +315,21 @@ class EditConfigWindow(QMainWindow):
             self._finalize_editconfigwidget_set_path_scenario = -1
             return
         self._finalize_editconfigwidget_set_path_scenario = 2
-        self.ui.edit_config_widget.set_path(self._load_session_list[0]["path"])
+        self.ui.edit_config_widget.set_path(
+            self._load_session_list[0]["path"],
+            self._load_session_list[0].get("source_options"),
+        )
 
 
 class ExportModelsThread(QThread):
+    progress = pyqtSignal(int, int, str)  # done, total, model file name
+
     def run(self):
-        if cuda.is_available():
-            for model_name in AI_names:
-                if (
-                    Path(model_name + ".engine").exists()
-                    or Path(model_name + ".onnx").exists()
-                ):
-                    continue
-                step_model = YOLO(model_name + ".pt")
-                failed = False
-                try:
-                    step_model.export(
-                        format="engine",
-                        half=False,
-                        int8=False,
-                        dynamic=True,
-                        simplify=True,
-                        opset=17,
-                    )
-                except Exception as err:
-                    print(err)
-                    failed = True
-                if failed:
-                    step_model.export(
-                        format="onnx",
-                        half=False,
-                        int8=False,
-                        dynamic=True,
-                        simplify=True,
-                        opset=17,
-                    )
-            return
-        for model_name in AI_names:
-            if not Path(model_name + ".onnx").exists():
-                step_model = YOLO(model_name + ".pt")
-                step_model.export(
-                    format="onnx",
-                    half=False,
-                    int8=False,
-                    dynamic=True,
-                    simplify=True,
-                    opset=17,
-                )
+        export_stale_models(progress=self.emit_progress)
+
+    def emit_progress(self, done: int, total: int, model_key: str, error: str):
+        print_progress(done, total, model_key, error)
+        self.progress.emit(done, total, model_key)
 
 
 class StartPage(QMainWindow):
@@ -379,6 +350,7 @@ class StartPage(QMainWindow):
         self.view_edit_window = None
         self._exporting_thread = ExportModelsThread()
         self._exporting_thread.finished.connect(self.enable_update_models_button)
+        self._exporting_thread.progress.connect(self.show_export_progress)
         self._exporting_thread.start()
         self._view_frame_to_config_path = None
 
@@ -450,15 +422,14 @@ class StartPage(QMainWindow):
         return super().hide()
 
     def enable_update_models_button(self):
+        self.ui.button_update_models.setText("Update models")
         self.ui.button_update_models.setEnabled(True)
 
+    def show_export_progress(self, done: int, total: int, model_key: str):
+        self.ui.button_update_models.setText(f"Exported {model_key} ({done}/{total})")
+
     def update_models(self):
-        for path in Path("materials/trained_models").glob("*.onnx"):
-            path.unlink()
-            print(f"Deleted {path}")
-        for path in Path("materials/trained_models").glob("*.engine"):
-            path.unlink()
-            print(f"Deleted {path}")
+        """Models, whose .pt files changed since their export, are exported again"""
         self._exporting_thread.start()
         self.ui.button_update_models.setEnabled(False)
 
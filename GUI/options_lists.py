@@ -9,4 +9,10 @@ AI_options = [
     "Отслеживание пакетов"
 ]
 
-additional_options = ["Сохранять видео-результат", "Вести запись инцидентов"]
\ No newline at end of file
+additional_options = [
+    "Сохранять видео-результат",
+    "Вести запись инцидентов",
+    "Отрисовка кадра в потоке обработки",
+    "Обработка в отдельном процессе",
+]
+
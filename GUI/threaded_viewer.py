@@ -13,10 +13,17 @@ from items_manager import ItemsManager
 
 import sys
 import os
+from pathlib import Path
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from source.track_objects import AbstractTrackObject
+from source.session import (
+    scale_track_objects,
+    get_track_objects_scale,
+    get_additional_option,
+)
+from source.tracker import default_incidents_path
 
 
 class HidingButton(QPushButton):
@@ -74,6 +81,9 @@ class ThreadedViewer(QGraphicsView):
         self.setFrameStyle(0)
         self.items_manager = ItemsManager(self.scene)
         self.pixmap = None
+        self.image = None
+        self._image_buffer_token = None
+        self._release_buffer = None
 
     def showEvent(self, event):
         """Обновление масштабирования при показе виджета"""
@@ -121,8 +131,11 @@ class ThreadedViewer(QGraphicsView):
 
         return super().mousePressEvent(event)
 
-    def change_frame(self, frame, frame_info):
+    def change_frame(self, frame, frame_info, buffer_token=None):
         image = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
+        if not self.video_processor is None:
+            # frame may be mapped from the camera process, it's copied already
+            self.video_processor.release_buffer(buffer_token)
         height, width, channels = image.shape
         bytes_per_line = channels * width
         current_frame = QPixmap.fromImage(
@@ -150,6 +163,24 @@ class ThreadedViewer(QGraphicsView):
         )
         self.aspect_ratio = current_frame.height() / current_frame.width()
 
+    def change_image(self, image: QImage, buffer_token):
+        """Swap displayed image, already composited by VideoProcessingThread"""
+        if not self._release_buffer is None:
+            self._release_buffer(self._image_buffer_token)
+        self.image = image
+        self._image_buffer_token = buffer_token
+
+        if self.scene.sceneRect().size().toSize() != image.size():
+            self.scene.setSceneRect(0, 0, image.width(), image.height())
+            self.aspect_ratio = image.height() / image.width()
+            self.update_view()
+        self.viewport().update()
+
+    def drawBackground(self, painter, rect):
+        if self.image is None:
+            return super().drawBackground(painter, rect)
+        painter.drawImage(self.scene.sceneRect(), self.image)
+
     def close_on_button(self):
         self.button.hide()
         self.clear_thread()
@@ -168,13 +199,20 @@ class ThreadedViewer(QGraphicsView):
         if self.video_processor is None:
             return
 
-        try:
-            if self.video_processor.frame_processed:
-                self.video_processor.frame_processed.disconnect()
-            if self.video_processor.processing_complete:
-                self.video_processor.processing_complete.disconnect(self.clear_thread)
-        except Exception as e:
-            print(f"Ошибка при отключении сигналов: {e}")
+        # only one of frame_processed / frame_rendered is connected, disconnect() of a signal
+        # without connections raises TypeError
+        for signal in [
+            self.video_processor.frame_processed,
+            self.video_processor.frame_rendered,
+            self.video_processor.incidents_logged,
+            self.video_processor.processing_complete,
+        ]:
+            try:
+                signal.disconnect()
+            except TypeError:
+                pass
+            except Exception as e:
+                print(f"Ошибка при отключении сигналов: {e}")
 
         if self.video_processor.isRunning():
             self.video_processor.stop()
@@ -186,6 +224,11 @@ class ThreadedViewer(QGraphicsView):
                 self.video_processor.terminate()
                 self.video_processor.wait(1000)
 
+        if not self.image is None:
+            # keep the last image on screen, but give its buffer back
+            self.image = self.image.copy()
+            self._release_buffer(self._image_buffer_token)
+            self._image_buffer_token = None
         self.video_processor = None
 
     def start_video_thread(
@@ -194,11 +237,9 @@ class ThreadedViewer(QGraphicsView):
         shape: tuple[int],
         data: list[AbstractTrackObject],
         options: list[bool],
+        source_options: dict = None,
     ):
 
-        for track_object in data:
-            self.items_manager.add_static_item(track_object)
-
         self.video_processor = VideoProcessingThread(
             True,
             path=path,
@@ -206,10 +247,32 @@ class ThreadedViewer(QGraphicsView):
             data=data,
             options=options,
             parent=self,
+            source_options=source_options,
         )
         self.video_processor.setObjectName(
             f"VideoProcessingThread in ThreadedViewer id={self.row*10 + self.column}"
         )
-        self.video_processor.frame_processed.connect(self.change_frame)
+        if self.video_processor.render_in_worker:
+            # rooms, boxes and labels are drawn by the worker, scene stays empty
+            self._release_buffer = self.video_processor.release_buffer
+            self.setCacheMode(QGraphicsView.CacheModeFlag.CacheNone)
+            self.video_processor.frame_rendered.connect(self.change_image)
+        else:
+            # scene is in coordinates of decoded (maybe downscaled) frames
+            for track_object in scale_track_objects(
+                data, get_track_objects_scale(self.video_processor.source_options)
+            ):
+                self.items_manager.add_static_item(track_object)
+            self.video_processor.frame_processed.connect(self.change_frame)
+        if self.video_processor.in_separate_process and get_additional_option(options, 1):
+            self.video_processor.incidents_logged.connect(self.save_incidents)
         self.video_processor.processing_complete.connect(self.clear_thread)
         self.video_processor.start()
+
+    def save_incidents(self, incidents: list[str]):
+        """Incidents of a camera process go to the same file as incidents of in-process viewers"""
+        path = Path(default_incidents_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a") as file:
+            for incident in incidents:
+                file.write(incident + "\n")
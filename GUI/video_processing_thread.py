@@ -1,23 +1,36 @@
 from PyQt6.QtCore import QThread, pyqtSignal
+from PyQt6.QtGui import QImage
 import numpy as np
-from vidgear.gears import CamGear, WriteGear
+import cv2 as cv
 import time
-from pathlib import Path
-from urllib.parse import urlparse
+import multiprocessing as mp
+import queue
 
 import sys
 import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from source.tracker import Tracker
+from source.stream_pipeline import StreamPipeline
+from source.camera_process import run_camera
+from source.shared_frames import SharedFrameRing
+from source.session import (
+    get_source_options,
+    get_additional_option,
+    set_additional_option,
+)
+from source.video_stream import is_online_source
 from source.track_objects import AbstractTrackObject
-from options_lists import additional_options, AI_options
+from options_lists import AI_options
+from frame_buffer_pool import FrameBufferPool
 
 
 class VideoProcessingThread(QThread):
 
-    frame_processed = pyqtSignal(np.ndarray, dict)
+    # buffer token: None, index in buffer_pool or (SharedFrameRing, slot), see release_buffer
+    frame_processed = pyqtSignal(np.ndarray, dict, object)  # frame, frame_info, buffer token
+    frame_rendered = pyqtSignal(QImage, object)  # image, buffer token
+    incidents_logged = pyqtSignal(list)  # list[str] to save, only in separate process mode
     processing_complete = pyqtSignal()
 
     def __init__(
@@ -28,13 +41,22 @@ class VideoProcessingThread(QThread):
         data: list[AbstractTrackObject],
         options: list[bool],
         parent=...,
+        source_options: dict = None,
     ):
+        """
+        Args:
+            source_options: decoding options of the session entry, see source.session.default_source_options
+        """
         super().__init__(parent)
         self.path = path
         self.shape = shape
         self.data = data
         self.show = show
         self.options = options
+        self.source_options = get_source_options({"source_options": source_options})
+        self.render_in_worker = get_additional_option(options, 2)
+        self.in_separate_process = get_additional_option(options, 3)
+        self.buffer_pool = FrameBufferPool()
         self._is_running = True
 
     def stop(self):
@@ -51,37 +73,89 @@ class VideoProcessingThread(QThread):
         self.stop()
         return super().quit()
 
-    def run(self):
+    def emit_rendered(self, frame: np.ndarray):
+        """Convert composited BGR frame into a pooled RGB buffer and emit it as QImage
 
-        output_params = {
-            "-input_framerate": 25,
-            "-vcodec": "libx264",  # Кодек для MP4
-        }
-        if self.options[-2]:
-            writer = WriteGear(
-                output=str(Path(f"materials/out/{time.thread_time_ns()}.mp4")),
-                compression_mode=False,
-                **output_params,
+        Frame is dropped if GUI still holds every buffer of the pool
+        """
+        index, buffer = self.buffer_pool.acquire(frame.shape)
+        if index is None:
+            return
+        cv.cvtColor(frame, cv.COLOR_BGR2RGB, dst=buffer)
+        height, width, channels = buffer.shape
+        image = QImage(
+            buffer.data,
+            width,
+            height,
+            channels * width,
+            QImage.Format.Format_RGB888,
+        )
+        self.frame_rendered.emit(image, index)
+
+    def emit_frame(self, frame: np.ndarray, frame_info: dict):
+        if not self.show:
+            return
+        if self.render_in_worker:
+            self.emit_rendered(frame)
+        else:
+            self.frame_processed.emit(frame, frame_info, None)
+
+    def emit_shared(self, ring: SharedFrameRing, slot: int, seq: int, frame_info: dict):
+        """Emit frame mapped from the shared memory of the camera process without copying
+
+        Slot stays leased until the receiver calls release_buffer, the process doesn't write into it meanwhile
+        """
+        frame = ring.acquire(slot, seq)
+        if frame is None:  # overwritten before we got to it
+            return
+        token = (ring, slot)
+        if self.render_in_worker:
+            height, width, channels = frame.shape
+            image = QImage(
+                frame.data,
+                width,
+                height,
+                channels * width,
+                QImage.Format.Format_BGR888,
             )
+            self.frame_rendered.emit(image, token)
         else:
-            writer = None
+            self.frame_processed.emit(frame, frame_info, token)
 
-        valid_online_bases = {"http", "https", "rtsp", "rtmp", "ftp", "sftp", "mms"}
-        try:
-            parsed = urlparse(self.path)
-            is_online = (parsed.scheme in valid_online_bases) and (parsed.netloc != "")
-        except Exception:
-            is_online = False
+    def release_buffer(self, token):
+        """Return a buffer of an emitted frame, receiver must not use the frame after it"""
+        if token is None:
+            return
+        if isinstance(token, tuple):
+            ring, slot = token
+            ring.release(slot)
+        else:
+            self.buffer_pool.release(token)
+
+    def run(self):
+        if self.in_separate_process:
+            return self.run_in_process()
+
+        if get_additional_option(self.options, 0):
+            video_out_path = f"materials/out/{time.thread_time_ns()}.mp4"
+        else:
+            video_out_path = None
+
+        # files with batch_size are read ahead by their own pipeline, see StreamPipeline
+        batched = self.source_options["batch_size"] > 1 and not is_online_source(self.path)
+        pipeline = StreamPipeline(
+            self.path,
+            self.data,
+            options=self.options[: len(AI_options)],
+            video_out_path=video_out_path,
+            save_incidents=get_additional_option(self.options, 1),
+            shared_capture=not batched,
+            source_options=self.source_options,
+        )
 
         fps = 0.0
         try:
-            tracker = Tracker(
-                self.data,
-                video_out=writer,
-                options=self.options[: -len(additional_options)],
-                save_incidents=self.options[len(AI_options) + 1],
-            )
-            _video_cap = CamGear(source=(self.path), logging=True).start()
+            pipeline.open()
 
             frames_per_second = 0
             start_time = time.time_ns()
@@ -89,26 +163,13 @@ class VideoProcessingThread(QThread):
 
             while self._is_running:
 
-                frame = _video_cap.read()
-                if frame is None:
-                    if not is_online:
-                        break
-                    success = False
-                    for i in range(5):
-                        time.sleep(0.2)
-                        _video_cap.stop()
-                        _video_cap = CamGear(source=(self.path), logging=True).start()
-                        frame = _video_cap.read()
-                        if not frame is None:
-                            success = True
-                            break
-                    if not success:
-                        break
+                result = pipeline.step(render=self.show and self.render_in_worker)
+                if result is None:
+                    break
 
-                frame, frame_info = tracker.track_frame(frame)
+                frame, frame_info = result
                 frames_per_second += 1
-                if self.show:
-                    self.frame_processed.emit(frame, frame_info)
+                self.emit_frame(frame, frame_info)
 
                 diff_time = time.time_ns() - start_time
                 if diff_time >= 1000:
@@ -121,12 +182,86 @@ class VideoProcessingThread(QThread):
             raise err
 
         finally:
-            if not writer is None:
-                writer.close()
-                writer = None
             self.stop()
-            if not _video_cap is None:
-                _video_cap.stop()
-                _video_cap = None
-                print(f"Stopped VideoProcessingThread with [FPS] {fps:.2f}:", self.path)
+            pipeline.close()
+            print(f"Stopped VideoProcessingThread with [FPS] {fps:.2f}:", self.path)
+            self.processing_complete.emit()
+
+    def run_in_process(self):
+        """Capture, inference and counting run in a separate process (no shared GIL),
+        this thread only passes results to the GUI"""
+        context = mp.get_context("spawn")
+        events = context.Queue()
+        frames = context.Queue(maxsize=2)
+        frame_lock = context.Lock()
+        stop_event = context.Event()
+        entry = {
+            "path": self.path,
+            # incidents are sent back and saved by the viewer into the file of in-process viewers
+            "options": set_additional_option(self.options, 1, False),
+            "data": [track_object.get_dict() for track_object in self.data],
+            "source_options": self.source_options,
+        }
+        process = context.Process(
+            target=run_camera,
+            args=(0, entry, events, stop_event, "materials/out", 1.0),
+            kwargs={
+                "frames": frames if self.show else None,
+                "render": self.render_in_worker,
+                "frame_lock": frame_lock,
+            },
+            name=f"camera {self.path}",
+            daemon=True,
+        )
+        process.start()
+
+        fps = 0.0
+        ring = None
+        try:
+            while self._is_running:
+                try:
+                    frame_ref, frame_info = frames.get(timeout=0.5)
+                except queue.Empty:
+                    if not process.is_alive():
+                        break
+                else:
+                    # process recreates the ring if the frame size changes
+                    if ring is None or ring.name != frame_ref["ring"]["name"]:
+                        if not ring is None:
+                            ring.close()
+                            ring = None
+                        try:
+                            ring = SharedFrameRing.attach(frame_ref["ring"], frame_lock)
+                        except FileNotFoundError:  # already replaced by a newer ring
+                            continue
+                    self.emit_shared(
+                        ring, frame_ref["slot"], frame_ref["seq"], frame_info
+                    )
+
+                while True:
+                    try:
+                        kind, _, payload = events.get_nowait()
+                    except queue.Empty:
+                        break
+                    if kind == "status":
+                        fps = payload["fps"]
+                        sys.stdout.write(f"[FPS] {fps:.2f}\r")
+                    elif kind == "incidents":
+                        self.incidents_logged.emit(payload)
+                    elif kind == "error":
+                        print(payload)
+        finally:
+            self.stop()
+            stop_event.set()
+            process.join(3)
+            if process.is_alive():
+                process.kill()
+                process.join(1)
+            if not ring is None:
+                # unmapped after the GUI releases the displayed frame
+                ring.close()
+            print(
+                f"Stopped VideoProcessingThread process (exit code {process.exitcode}) with [FPS] {fps:.2f}:",
+                self.path,
+            )
             self.processing_complete.emit()
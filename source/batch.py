@@ -0,0 +1,271 @@
+"""Headless processing of recorded videos on a process pool, Qt is not imported
+
+Examples:
+    python -m source.batch "records/*.mp4" --config rooms.yaml --save-video
+    python -m source.batch --session session.yaml --out materials/out/reprocess
+    python -m source.batch --session session.yaml --batch-size 8
+    python -m source.batch --session session.yaml --save-detections
+"""
+
+import argparse
+import glob
+import os
+import sys
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import yaml
+
+from .device import set_cpu_threads
+from .tracker import AI_names
+from .session import (
+    load_yaml_list,
+    is_session,
+    build_track_objects,
+    find_session_entry,
+    get_source_options,
+)
+from .stream_pipeline import StreamPipeline
+
+
+model_keys = [Path(name).name for name in AI_names]
+
+
+def expand_video_paths(patterns: list[str]) -> list[str]:
+    """Expand globs (shell may not do it), keep order and drop duplicates"""
+    paths = []
+    for pattern in patterns:
+        matched = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matched:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def get_model_options(models: list[str]) -> list[bool]:
+    unknown = set(models) - set(model_keys)
+    if unknown:
+        raise ValueError(f"Unknown models: {', '.join(sorted(unknown))}")
+    return [key in models for key in model_keys]
+
+
+def build_jobs(
+    videos: list[str], yaml_path: str, models: list[str] = None
+) -> list[dict]:
+    """
+    Args:
+        videos: video paths, if empty - every video of the session is processed
+        yaml_path: config (list of DetectWindows) or session file
+        models: names of enabled models, default is options from session or every model
+
+    Returns:
+        jobs: list of dicts {"path", "data", "options"} and "source_options" for sessions
+    """
+    entries = load_yaml_list(yaml_path)
+    model_options = None if models is None else get_model_options(models)
+
+    jobs = []
+    if is_session(entries):
+        if len(videos) == 0:
+            videos = [str(entry["path"]) for entry in entries]
+        for path in videos:
+            entry = find_session_entry(entries, path)
+            if entry is None:
+                print(f"Skipped {path}: no entry in session {yaml_path}")
+                continue
+            options = model_options or list(entry["options"][: len(AI_names)])
+            jobs.append(
+                {
+                    "path": path,
+                    "data": entry["data"],
+                    "options": options,
+                    "source_options": get_source_options(entry),
+                }
+            )
+    else:
+        options = model_options or [True] * len(AI_names)
+        for path in videos:
+            jobs.append({"path": path, "data": entries, "options": options})
+    return jobs
+
+
+def get_output_names(jobs: list[dict]) -> list[str]:
+    names = []
+    for job in jobs:
+        name = Path(job["path"]).stem
+        candidate = name
+        i = 1
+        while candidate in names:
+            candidate = f"{name}_{i}"
+            i += 1
+        names.append(candidate)
+    return names
+
+
+def process_video(
+    job: dict,
+    out_dir: str,
+    name: str,
+    save_video: bool,
+    save_incidents: bool,
+    decode_stride: int = 1,
+    batch_size: int = None,
+    save_detections: bool = False,
+) -> dict:
+    """Runs in a worker process, returns throughput stats of the file
+
+    Args:
+        batch_size: frames per batch of models, overrides source options of the job
+        save_detections: save raw results of models into <name>.detections folder
+    """
+    out_dir = Path(out_dir)
+    source_options = job.get("source_options")
+    if not batch_size is None:
+        source_options = {**(source_options or {}), "batch_size": batch_size}
+    pipeline = StreamPipeline(
+        job["path"],
+        build_track_objects(job["data"]),
+        options=job["options"],
+        video_out_path=str(out_dir / f"{name}.mp4") if save_video else None,
+        save_incidents=save_incidents,
+        incidents_path=str(out_dir / f"{name}.incidents.txt"),
+        video_name=Path(job["path"]).name,
+        decode_stride=decode_stride,
+        source_options=source_options,
+        detection_store_path=(
+            str(out_dir / f"{name}.detections") if save_detections else None
+        ),
+    )
+    try:
+        pipeline.open()
+        pipeline.run()
+    except Exception as err:
+        return {**pipeline.get_stats(), "error": str(err)}
+    finally:
+        pipeline.close()
+    return pipeline.get_stats()
+
+
+def _init_worker(threads: int):
+    set_cpu_threads(threads)
+
+
+def run_batch(
+    jobs: list[dict],
+    out_dir: str,
+    workers: int = None,
+    save_video: bool = False,
+    save_incidents: bool = True,
+    decode_stride: int = 1,
+    batch_size: int = None,
+    save_detections: bool = False,
+) -> list[dict]:
+    cpu_count = os.cpu_count() or 1
+    workers = max(1, min(workers or cpu_count, len(jobs)))
+    threads = max(1, cpu_count // workers)
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    names = get_output_names(jobs)
+
+    stats = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads,),
+    ) as executor:
+        futures = {
+            executor.submit(
+                process_video,
+                job,
+                out_dir,
+                name,
+                save_video,
+                save_incidents,
+                decode_stride,
+                batch_size,
+                save_detections,
+            ): job
+            for job, name in zip(jobs, names)
+        }
+        for future in as_completed(futures):
+            try:
+                file_stats = future.result()
+            except Exception as err:  # worker died
+                file_stats = {"path": futures[future]["path"], "error": str(err)}
+            stats.append(file_stats)
+            if "error" in file_stats:
+                print(f"[FAILED] {file_stats['path']}: {file_stats['error']}")
+            else:
+                print(
+                    f"[DONE] {file_stats['path']}: {file_stats['frames']} frames, "
+                    f"{file_stats['seconds']} s, [FPS] {file_stats['fps']}"
+                )
+    return stats
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m source.batch",
+        description="Process recorded videos without GUI",
+    )
+    parser.add_argument("videos", nargs="*", help="video files or glob patterns")
+    yaml_group = parser.add_mutually_exclusive_group(required=True)
+    yaml_group.add_argument("--config", help="config with DetectWindows")
+    yaml_group.add_argument("--session", help="session file saved from GUI")
+    parser.add_argument("--out", default="materials/out/batch", help="output folder")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        choices=model_keys,
+        help="enabled models, default: session options or all models",
+    )
+    parser.add_argument("--workers", type=int, help="default: number of CPUs")
+    parser.add_argument("--save-video", action="store_true")
+    parser.add_argument("--no-incidents", action="store_true")
+    parser.add_argument(
+        "--save-detections",
+        action="store_true",
+        help="keep raw results of models to replay counting with other rooms, "
+        "see source.detection_store",
+    )
+    parser.add_argument(
+        "--stride",
+        type=int,
+        default=1,
+        help="process every N-th frame while nobody is near a room, default: every frame",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="run models on batches of N consecutive frames, counting is the same as frame by "
+        "frame. Default: batch_size of source options. Not used with --stride",
+    )
+    args = parser.parse_args(argv)
+
+    videos = expand_video_paths(args.videos)
+    if args.config and len(videos) == 0:
+        parser.error("videos are required with --config")
+
+    jobs = build_jobs(videos, args.config or args.session, args.models)
+    if len(jobs) == 0:
+        print("Nothing to process")
+        return 1
+
+    stats = run_batch(
+        jobs,
+        args.out,
+        workers=args.workers,
+        save_video=args.save_video,
+        save_incidents=not args.no_incidents,
+        decode_stride=args.stride,
+        batch_size=args.batch_size,
+        save_detections=args.save_detections,
+    )
+    with (Path(args.out) / "stats.yaml").open("w") as file:
+        yaml.safe_dump(stats, file, allow_unicode=True, sort_keys=False)
+
+    return int(any("error" in file_stats for file_stats in stats))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
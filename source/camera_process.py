@@ -0,0 +1,134 @@
+import multiprocessing as mp
+import os
+import queue
+import signal
+import time
+from datetime import datetime
+from pathlib import Path
+
+from .shared_frames import SharedFrameRing
+
+
+def _get_status(pipeline, state: str) -> dict:
+    """Payload of a status event, pid tells the owner which worker sent it"""
+    return {**pipeline.get_stats(), "state": state, "pid": os.getpid()}
+
+
+class _FrameSender:
+    """Sends processed frames to the owner: through a shared memory ring if frame_lock is given,
+    otherwise frames are pickled into the queue"""
+
+    def __init__(self, frames: mp.Queue, frame_lock=None, slots: int = 4):
+        self.frames = frames
+        self.frame_lock = frame_lock
+        self.slots = slots
+        self.ring = None
+
+    def send(self, frame, frame_info: dict):
+        """Frame is dropped if the owner doesn't keep up"""
+        if self.frames.full():
+            return
+        frame_ref = frame
+        if not self.frame_lock is None:
+            if self.ring is None or not self.ring.fits(frame):
+                if not self.ring is None:
+                    self.ring.close()
+                self.ring = SharedFrameRing.create(
+                    self.frame_lock, frame.shape, slots=self.slots
+                )
+            written = self.ring.write(frame)
+            if written is None:
+                return
+            slot, seq = written
+            frame_ref = {"ring": self.ring.describe(), "slot": slot, "seq": seq}
+        try:
+            self.frames.put_nowait((frame_ref, frame_info))
+        except queue.Full:
+            pass
+
+    def close(self):
+        # unread frames are not needed, don't block process exit on them
+        self.frames.cancel_join_thread()
+        if not self.ring is None:
+            self.ring.close()
+
+
+def run_camera(
+    index: int,
+    entry: dict,
+    events: mp.Queue,
+    stop_event,
+    out_dir: str = "materials/out",
+    status_interval: float = 5.0,
+    frames: mp.Queue = None,
+    render: bool = False,
+    frame_lock=None,
+):
+    """Target of a camera worker process: capture -> Tracker loop of one session entry
+
+    Args:
+        index: index of the entry inside the session, sent back with every event
+        entry: session entry {"path", "options", "data"}
+        events: queue for ("status", index, dict with "state" and "pid"), ("incidents", index, list[str]) and ("error", index, str) events
+        stop_event: multiprocessing.Event, set by the owner to stop the worker
+        out_dir: where incidents and videos are saved
+        status_interval: seconds between status events
+        frames: bounded queue for (frame, frame_info) of processed frames. If None: frames aren't sent.
+            Frames are dropped while the queue is full, so a slow consumer doesn't slow down processing
+        render: send fully composited frames, see Tracker.track_frame
+        frame_lock: multiprocessing.Lock. If given, frames are written into a SharedFrameRing and
+            the queue gets {"ring": ring.describe(), "slot", "seq"} instead of the frame
+    """
+    # owner decides when to stop, even if the whole process group is signaled
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    # heavy imports happen only inside worker processes
+    from .session import build_track_objects, get_source_options, get_additional_option
+    from .stream_pipeline import StreamPipeline
+
+    options = entry["options"]
+    name = f"{index}_{Path(str(entry['path'])).stem or 'stream'}"
+    started = datetime.now().strftime("%Y%m%d_%H%M%S")
+    save_video = get_additional_option(options, 0)
+
+    pipeline = StreamPipeline(
+        entry["path"],
+        build_track_objects(entry["data"]),
+        options=options,
+        video_out_path=(
+            str(Path(out_dir) / f"{name}_{started}.mp4") if save_video else None
+        ),
+        save_incidents=get_additional_option(options, 1),
+        incidents_path=str(Path(out_dir) / f"{name}_{started}.incidents.txt"),
+        video_name=str(entry["path"]),
+        collect_incidents=True,
+        source_options=get_source_options(entry),
+    )
+
+    sender = None if frames is None else _FrameSender(frames, frame_lock)
+
+    try:
+        pipeline.open()
+        events.put(("status", index, _get_status(pipeline, "running")))
+        last_status = time.monotonic()
+        while not stop_event.is_set():
+            result = pipeline.step(render=render and not frames is None)
+            if result is None:
+                break
+            if not sender is None:
+                sender.send(*result)
+            incidents = pipeline.pop_incidents()
+            if len(incidents) > 0:
+                events.put(("incidents", index, incidents))
+            if time.monotonic() - last_status >= status_interval:
+                last_status = time.monotonic()
+                events.put(("status", index, _get_status(pipeline, "running")))
+    except Exception as err:
+        events.put(("error", index, str(err)))
+        raise err
+    finally:
+        pipeline.close()
+        events.put(("status", index, _get_status(pipeline, "stopped")))
+        if not sender is None:
+            sender.close()
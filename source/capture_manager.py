@@ -0,0 +1,267 @@
+from collections import deque
+import json
+from pathlib import Path
+from urllib.parse import urlparse, urlunparse
+import threading
+import numpy as np
+
+from .video_stream import VideoStream, is_online_source
+
+
+def normalize_source(path) -> str:
+    """Same key for every spelling of a source: absolute path for files, url without trailing slash for streams"""
+    path = str(path)
+    if is_online_source(path):
+        parsed = urlparse(path)
+        return urlunparse(
+            parsed._replace(
+                scheme=parsed.scheme.lower(),
+                netloc=parsed.netloc.lower(),
+                path=parsed.path.rstrip("/"),
+            )
+        )
+    if path.isdigit():  # camera index
+        return path
+    return str(Path(path).expanduser().resolve())
+
+
+def get_capture_key(path, stream_options: dict) -> tuple:
+    options = {key: value for key, value in stream_options.items() if value}
+    if options.get("scale") == 1.0:
+        options.pop("scale")
+    return (normalize_source(path), json.dumps(options, sort_keys=True))
+
+
+class FrameRef:
+    """Decoded frame shared by every subscriber of a capture
+
+    Frame is read-only, copy it before drawing. It's dropped after every subscriber,
+    that got it, called release().
+    """
+
+    def __init__(
+        self, frame: np.ndarray, seq: int, refs: int, full_frame: np.ndarray = None
+    ):
+        self.frame = frame
+        self.full_frame = full_frame  # frame before downscaling, if the capture keeps it
+        self.seq = seq
+        self._refs = refs
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._refs == 0:
+                return
+            self._refs -= 1
+            if self._refs == 0:
+                self.frame = None
+                self.full_frame = None
+
+
+class Subscription:
+
+    def __init__(self, capture: "SharedCapture", max_queued: int = 2):
+        self.capture = capture
+        self.max_queued = max_queued
+        self.queue = deque()
+        self.closed = False
+
+    def read(self, timeout: float = None) -> FrameRef:
+        """Next frame, FrameRef.release() must be called after use
+
+        Returns:
+            None if the stream has ended, the subscription is closed or timeout expired
+        """
+        return self.capture._next(self, timeout)
+
+    def close(self):
+        self.capture.manager.unsubscribe(self)
+
+
+class SharedCapture:
+    """Decodes one source in a background thread and fans frames out to subscribers
+
+    Video files are decoded at the pace of the slowest subscriber, so every subscriber gets
+    every frame. Online streams never wait: a subscriber that doesn't keep up loses its oldest frames.
+    """
+
+    def __init__(
+        self, manager: "CaptureManager", key: tuple, path: str, stream_options: dict
+    ):
+        """
+        Args:
+            stream_options: scale, threads, keep_full_frame of VideoStream
+        """
+        self.manager = manager
+        self.key = key
+        self.path = path
+        self.stream_options = stream_options
+        self.is_online = is_online_source(path)
+        self.subscribers: list[Subscription] = []
+        self.condition = threading.Condition()
+        self.latest = None
+        self.frames = 0
+        self.ended = False
+        self._stopping = False
+        self._stream = None
+        self._thread = None
+
+    def is_joinable(self) -> bool:
+        """New subscriber of a video file would miss the beginning, so it gets its own capture"""
+        return not self.ended and (self.is_online or self.frames == 0)
+
+    def is_started(self) -> bool:
+        return not self._thread is None
+
+    @property
+    def frame_shape(self) -> tuple[int]:
+        """Shape of decoded frames, None if it isn't known"""
+        return None if self._stream is None else self._stream.frame_shape
+
+    def start(self):
+        self._stream = VideoStream(
+            self.path, logging=False, **self.stream_options
+        ).start()
+        self._thread = threading.Thread(
+            target=self._decode, name=f"SharedCapture {self.key[0]}", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _wait_for_subscribers(self):
+        """Video file: wait until every subscriber has a free place in its queue"""
+        while not self._stopping and any(
+            len(subscription.queue) >= subscription.max_queued
+            for subscription in self.subscribers
+        ):
+            self.condition.wait(0.5)
+
+    def _decode(self):
+        while not self._stopping:
+            if not self.is_online:
+                with self.condition:
+                    self._wait_for_subscribers()
+                if self._stopping:
+                    break
+
+            frame = self._stream.read()
+            if frame is None:
+                break
+            frame.flags.writeable = False
+            full_frame = self._stream.full_frame
+            if not full_frame is None:
+                full_frame.flags.writeable = False
+
+            with self.condition:
+                self.frames += 1
+                self.latest = frame
+                if len(self.subscribers) == 0:
+                    continue
+                frame_ref = FrameRef(
+                    frame, self.frames, len(self.subscribers), full_frame
+                )
+                for subscription in self.subscribers:
+                    if len(subscription.queue) >= subscription.max_queued:
+                        subscription.queue.popleft().release()
+                    subscription.queue.append(frame_ref)
+                self.condition.notify_all()
+
+        with self.condition:
+            self.ended = True
+            self.condition.notify_all()
+
+    def _next(self, subscription: Subscription, timeout: float = None) -> FrameRef:
+        with self.condition:
+            self.condition.wait_for(
+                lambda: len(subscription.queue) > 0 or self.ended or subscription.closed,
+                timeout,
+            )
+            if subscription.closed or len(subscription.queue) == 0:
+                return None
+            frame_ref = subscription.queue.popleft()
+            self.condition.notify_all()  # decoder may wait for a free place
+            return frame_ref
+
+    def add(self, subscription: Subscription):
+        with self.condition:
+            self.subscribers.append(subscription)
+
+    def remove(self, subscription: Subscription) -> int:
+        """Returns number of remaining subscribers"""
+        with self.condition:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+            subscription.closed = True
+            while len(subscription.queue) > 0:
+                subscription.queue.popleft().release()
+            self.condition.notify_all()
+            return len(self.subscribers)
+
+    def stop(self):
+        with self.condition:
+            self._stopping = True
+            self.condition.notify_all()
+        if not self._thread is None:
+            self._thread.join()
+        if not self._stream is None:
+            self._stream.stop()
+
+
+class CaptureManager:
+    """Opens every source once per process, no matter how many viewers show it"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.captures: dict[str, SharedCapture] = {}
+
+    def subscribe(
+        self, path: str, max_queued: int = 2, **stream_options
+    ) -> Subscription:
+        """Start receiving frames of the source, opens it if nobody else has
+
+        Args:
+            max_queued: frames kept for this subscriber, see SharedCapture
+            stream_options: decoding options of VideoStream, the source is opened once per set of options
+        """
+        key = get_capture_key(path, stream_options)
+        with self.lock:
+            capture = self.captures.get(key)
+            if capture is None or not capture.is_joinable():
+                capture = SharedCapture(self, key, path, stream_options)
+                self.captures[key] = capture
+            subscription = Subscription(capture, max_queued)
+            capture.add(subscription)
+            if not capture.is_started():
+                # after the first subscription, so its first frame isn't lost
+                try:
+                    capture.start()
+                except Exception as err:
+                    self.captures.pop(key)
+                    raise err
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Last unsubscribe closes the source"""
+        capture = subscription.capture
+        with self.lock:
+            if subscription.closed:
+                return
+            if capture.remove(subscription) > 0:
+                return
+            if self.captures.get(capture.key) is capture:
+                self.captures.pop(capture.key)
+        capture.stop()
+
+    def latest_frame(self, path: str, **stream_options) -> np.ndarray:
+        """Copy of the last frame of the source opened with stream_options, if it's already opened, otherwise None"""
+        with self.lock:
+            capture = self.captures.get(get_capture_key(path, stream_options))
+        if capture is None:
+            return None
+        with capture.condition:
+            if capture.latest is None:
+                return None
+            return capture.latest.copy()
+
+
+capture_manager = CaptureManager()
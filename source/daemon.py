@@ -0,0 +1,250 @@
+"""Long-running headless analytics for every camera of a session file
+
+Examples:
+    python -m source.daemon session.yaml
+    python -m source.daemon session.yaml --status /run/panocam/status.yaml
+
+Every session entry runs in its own supervised worker process. Crashed workers and
+dropped online streams are restarted with backoff, ended video files are not.
+SIGTERM / SIGINT stop all workers, so the daemon can run as a systemd service.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+import yaml
+
+from .camera_process import run_camera
+from .video_stream import is_online_source
+
+
+class CameraSupervisor:
+    supervisor_states = ("restarting", "finished")  # aren't overwritten by workers
+
+    def __init__(
+        self,
+        session: list[dict],
+        out_dir: str = "materials/out/daemon",
+        status_path: str = None,
+        status_interval: float = 5.0,
+        max_backoff: float = 60.0,
+    ):
+        """
+        Args:
+            session: entries {"path", "options", "data"} as saved by EditConfigWindow.save_session
+            out_dir: where workers save incidents and videos
+            status_path: YAML file with per-stream status, rewritten every status_interval seconds
+            max_backoff: max delay in seconds before restarting a crashed worker
+        """
+        self.session = session
+        self.out_dir = out_dir
+        self.status_path = status_path
+        self.status_interval = status_interval
+        self.max_backoff = max_backoff
+
+        self.context = mp.get_context("spawn")
+        self.events = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.processes = [None] * len(session)
+        self.restart_at = [0.0] * len(session)
+        self.status = [
+            {
+                "path": str(entry["path"]),
+                "state": "starting",
+                "pid": None,
+                "restarts": 0,
+                "frames": 0,
+                "fps": 0.0,
+                "incidents": 0,
+                "last_error": None,
+                "updated": None,
+            }
+            for entry in session
+        ]
+        self._stopping = False
+
+    def _start_worker(self, index: int):
+        process = self.context.Process(
+            target=run_camera,
+            args=(
+                index,
+                self.session[index],
+                self.events,
+                self.stop_event,
+                self.out_dir,
+                self.status_interval,
+            ),
+            name=f"camera-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        self.status[index]["pid"] = process.pid
+        self.status[index]["state"] = "starting"
+        self._log(index, f"started worker pid={process.pid}")
+
+    def _log(self, index: int, message: str):
+        print(
+            f"{datetime.now().strftime('%H:%M:%S')} :: CameraSupervisor :: "
+            f"[{index}] {self.status[index]['path']} :: {message}",
+            flush=True,
+        )
+
+    def _handle_event(self, event: tuple):
+        kind, index, payload = event
+        stream_status = self.status[index]
+        if kind == "status":
+            if payload.get("pid") != stream_status["pid"]:
+                return  # late event of a worker that has already exited
+            stream_status["frames"] = payload["frames"]
+            stream_status["fps"] = payload["fps"]
+            if not stream_status["state"] in self.supervisor_states:
+                stream_status["state"] = payload["state"]
+        elif kind == "incidents":
+            stream_status["incidents"] += len(payload)
+            for incident in payload:
+                self._log(index, f"incident: {incident}")
+        elif kind == "error":
+            stream_status["last_error"] = payload
+            self._log(index, f"error: {payload}")
+        stream_status["updated"] = datetime.now().isoformat(timespec="seconds")
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for index, process in enumerate(self.processes):
+            stream_status = self.status[index]
+            if process is None:
+                if stream_status["state"] == "restarting" and now >= self.restart_at[index]:
+                    self._start_worker(index)
+                continue
+            if process.is_alive():
+                continue
+
+            process.join()
+            self.processes[index] = None
+            stream_status["pid"] = None
+            ended = process.exitcode == 0
+            if ended and not is_online_source(stream_status["path"]):
+                stream_status["state"] = "finished"
+                self._log(index, "video file is processed")
+                continue
+
+            backoff = min(self.max_backoff, 2 ** stream_status["restarts"])
+            stream_status["restarts"] += 1
+            stream_status["state"] = "restarting"
+            self.restart_at[index] = now + backoff
+            self._log(
+                index,
+                f"worker exited with code {process.exitcode}, restart in {backoff} s",
+            )
+
+    def write_status(self):
+        if self.status_path is None:
+            return
+        path = Path(self.status_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("w") as file:
+            yaml.safe_dump(
+                {
+                    "pid": os.getpid(),
+                    "updated": datetime.now().isoformat(timespec="seconds"),
+                    "streams": self.status,
+                },
+                file,
+                allow_unicode=True,
+                sort_keys=False,
+            )
+        os.replace(tmp_path, path)
+
+    def stop(self, *_):
+        self._stopping = True
+        self.stop_event.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for index in range(len(self.session)):
+            self._start_worker(index)
+
+        last_status = 0.0
+        while not self._stopping:
+            try:
+                # blocking wait keeps the supervisor idle between events
+                self._handle_event(self.events.get(timeout=1.0))
+                while True:
+                    self._handle_event(self.events.get_nowait())
+            except queue.Empty:
+                pass
+            if not self._stopping:
+                self._check_workers()
+            if time.monotonic() - last_status >= self.status_interval:
+                last_status = time.monotonic()
+                self.write_status()
+            if all(stream["state"] == "finished" for stream in self.status):
+                break
+
+        self.shutdown()
+
+    def shutdown(self, timeout: float = 10.0):
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                self._log(index, "worker did not stop in time, killing")
+                process.kill()
+                process.join(1.0)
+            self.status[index]["state"] = "stopped"
+            self.status[index]["pid"] = None
+
+        while True:
+            try:
+                self._handle_event(self.events.get_nowait())
+            except queue.Empty:
+                break
+        self.write_status()
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m source.daemon",
+        description="Run analytics for every camera of a session without GUI",
+    )
+    parser.add_argument("session", help="session file saved from GUI")
+    parser.add_argument("--out", default="materials/out/daemon", help="output folder")
+    parser.add_argument(
+        "--status",
+        default="materials/out/daemon/status.yaml",
+        help="per-stream status file",
+    )
+    parser.add_argument("--status-interval", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    with Path(args.session).open("r") as file:
+        session = yaml.safe_load(file) or []
+    if len(session) == 0:
+        print(f"No cameras in {args.session}")
+        return 1
+
+    supervisor = CameraSupervisor(
+        session,
+        out_dir=args.out,
+        status_path=args.status,
+        status_interval=args.status_interval,
+    )
+    supervisor.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""Raw per-frame results of models in a chunked columnar store, counting of rooms can be replayed
+from it without inference, e.g. after DetectWindows were moved
+
+Layout of a store folder:
+    meta.yaml               models, class names, scale of track objects, frames and chunks
+    00000/frame_time.npy    (F,) float64 unix time of every processed frame of the chunk
+    00000/frame.npy         (N,) int32 frame index of every box
+    00000/model.npy         (N,) uint8 index in meta["models"]
+    00000/xyxy.npy          (N, 4) float32 in coordinates of processed frames
+    00000/class.npy         (N,) uint16 index in meta["classes"]
+    00000/conf.npy          (N,) float16
+    00000/track_id.npy      (N,) int32, -1 for models without tracking
+    00000/closed_rooms.npy  (R, 2) int32 (frame, room_id) of rooms with closed curtains
+
+Examples:
+    python -m source.detection_store materials/out/batch/cam1.detections --config rooms_v2.yaml
+    python -m source.detection_store materials/out/batch/cam1.detections --session session.yaml --out cam1.incidents.txt
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import yaml
+
+from .detections import Detections
+from .instrument_manager import InstrumentManager
+from .session import (
+    load_yaml_list,
+    is_session,
+    build_track_objects,
+    find_session_entry,
+    scale_track_objects,
+)
+
+columns = ["frame", "model", "xyxy", "class", "conf", "track_id"]
+
+
+class DetectionStoreWriter:
+    """Appends results of Tracker frames, a chunk is written when chunk_frames are collected"""
+
+    def __init__(self, path: str, meta: dict = None, chunk_frames: int = 10000):
+        """
+        Args:
+            path: store folder, it's cleared
+            meta: stored as is, e.g. {"video_name", "people_model", "track_objects_scale"}
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        for old_file in self.path.glob("*/*.npy"):
+            old_file.unlink()
+        self.meta = {
+            "version": 1,
+            **(meta or {}),
+            "models": [],
+            "classes": [],
+            "curtains": False,
+            "frames": 0,
+            "chunks": 0,
+        }
+        self.chunk_frames = chunk_frames
+        self._model_indices = {}
+        self._class_indices = {}
+        self._reset_chunk()
+
+    def _reset_chunk(self):
+        self._times = []
+        self._columns = {column: [] for column in columns}
+        self._closed_rooms = []
+
+    def _index(self, indices: dict, values: list, value: str) -> int:
+        if not value in indices:
+            indices[value] = len(values)
+            values.append(value)
+        return indices[value]
+
+    def add_frame(
+        self,
+        frame_time: float,
+        detections: dict[str, Detections],
+        closed_rooms: list[int] = None,
+    ):
+        """
+        Args:
+            frame_time: unix time of the frame
+            detections: model file name -> detections, None values are skipped (curtains)
+            closed_rooms: room ids with closed curtains, None if curtains aren't classified
+        """
+        frame = self.meta["frames"]
+        self._times.append(frame_time)
+        for name, model_detections in detections.items():
+            if model_detections is None or len(model_detections) == 0:
+                continue
+            count = len(model_detections)
+            model = self._index(self._model_indices, self.meta["models"], Path(name).name)
+            self._columns["frame"].append(np.full(count, frame, dtype=np.int32))
+            self._columns["model"].append(np.full(count, model, dtype=np.uint8))
+            self._columns["xyxy"].append(np.asarray(model_detections.xyxy, dtype=np.float32))
+            self._columns["class"].append(
+                np.array(
+                    [
+                        self._index(self._class_indices, self.meta["classes"], str(class_name))
+                        for class_name in model_detections.classes
+                    ],
+                    dtype=np.uint16,
+                )
+            )
+            self._columns["conf"].append(np.asarray(model_detections.confs, dtype=np.float16))
+            if model_detections.ids is None:
+                ids = np.full(count, -1, dtype=np.int32)
+            else:
+                ids = np.asarray(model_detections.ids, dtype=np.int32)
+            self._columns["track_id"].append(ids)
+        if not closed_rooms is None:
+            self.meta["curtains"] = True
+            self._closed_rooms.extend((frame, room_id) for room_id in closed_rooms)
+        self.meta["frames"] += 1
+        if len(self._times) >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        if len(self._times) == 0:
+            return
+        chunk = self.path / f"{self.meta['chunks']:05d}"
+        chunk.mkdir(exist_ok=True)
+        np.save(chunk / "frame_time.npy", np.array(self._times, dtype=np.float64))
+        empty = {
+            "frame": np.zeros(0, dtype=np.int32),
+            "model": np.zeros(0, dtype=np.uint8),
+            "xyxy": np.zeros((0, 4), dtype=np.float32),
+            "class": np.zeros(0, dtype=np.uint16),
+            "conf": np.zeros(0, dtype=np.float16),
+            "track_id": np.zeros(0, dtype=np.int32),
+        }
+        for column in columns:
+            values = self._columns[column]
+            np.save(
+                chunk / f"{column}.npy",
+                np.concatenate(values) if len(values) > 0 else empty[column],
+            )
+        np.save(
+            chunk / "closed_rooms.npy",
+            np.array(self._closed_rooms, dtype=np.int32).reshape(-1, 2),
+        )
+        self.meta["chunks"] += 1
+        self._reset_chunk()
+        self.save_meta()
+
+    def save_meta(self):
+        with (self.path / "meta.yaml").open("w") as file:
+            yaml.safe_dump(self.meta, file, allow_unicode=True, sort_keys=False)
+
+    def close(self):
+        self.flush()
+        self.save_meta()
+
+
+class DetectionStore:
+    """Memory-mapped chunks of a store, see DetectionStoreWriter"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        with (self.path / "meta.yaml").open("r") as file:
+            self.meta = yaml.safe_load(file)
+
+    def __len__(self):
+        return self.meta["frames"]
+
+    def get_chunk(self, index: int) -> dict[str, np.ndarray]:
+        """Columns of the chunk and "frame_time", "closed_rooms" """
+        chunk = self.path / f"{index:05d}"
+        return {
+            column: np.load(chunk / f"{column}.npy", mmap_mode="r")
+            for column in [*columns, "frame_time", "closed_rooms"]
+        }
+
+    def iter_frames(self, model: str):
+        """Yields (frame, frame_time, chunk, rows of the model on the frame in the chunk,
+        closed room ids or None)
+
+        Args:
+            model: model key, e.g. "yolo11n-pose"
+        """
+        model_index = (
+            self.meta["models"].index(model) if model in self.meta["models"] else -1
+        )
+        frame = 0
+        for index in range(self.meta["chunks"]):
+            chunk = self.get_chunk(index)
+            rows = np.flatnonzero(np.asarray(chunk["model"]) == model_index)
+            frames = np.asarray(chunk["frame"])[rows]
+            times = np.asarray(chunk["frame_time"])
+            closed = np.asarray(chunk["closed_rooms"])
+            first = frame
+            bounds = np.searchsorted(frames, np.arange(first, first + len(times) + 1))
+            closed_bounds = np.searchsorted(
+                closed[:, 0], np.arange(first, first + len(times) + 1)
+            )
+            for i, frame_time in enumerate(times):
+                closed_rooms = None
+                if self.meta["curtains"]:
+                    closed_rooms = closed[closed_bounds[i] : closed_bounds[i + 1], 1]
+                yield frame, frame_time, chunk, rows[bounds[i] : bounds[i + 1]], closed_rooms
+                frame += 1
+
+
+def find_detection_store(path: str, root: str = "materials/out") -> str:
+    """The latest store saved for the video file or stream under root, None if there is none"""
+    stores = []
+    for meta_path in Path(root).glob("**/*.detections/meta.yaml"):
+        try:
+            with meta_path.open("r") as file:
+                stored_path = str(yaml.safe_load(file).get("path", ""))
+        except (OSError, yaml.YAMLError, AttributeError):
+            continue
+        if stored_path == str(path) or Path(stored_path).resolve() == Path(str(path)).resolve():
+            stores.append(meta_path)
+    if len(stores) == 0:
+        return None
+    return str(max(stores, key=lambda meta_path: meta_path.stat().st_mtime).parent)
+
+
+def replay(
+    store: DetectionStore,
+    data: list,
+    incidents_path: str = None,
+    video_name: str = None,
+) -> tuple[InstrumentManager, float]:
+    """Count people of stored frames in DetectWindows of data, like Tracker does with models
+
+    Args:
+        data: track objects in full resolution coordinates, they are scaled like in StreamPipeline
+
+    Returns:
+        (manager after the last frame, frames per second of the replay)
+    """
+    manager = InstrumentManager(
+        incidents_path=incidents_path,
+        video_name=video_name or store.meta.get("video_name"),
+        collect_incidents=incidents_path is None,
+    )
+    manager.load_data(
+        scale_track_objects(data, store.meta.get("track_objects_scale", 1.0))
+    )
+    start = time.perf_counter()
+    for _, frame_time, chunk, rows, closed_rooms in store.iter_frames(
+        store.meta["people_model"]
+    ):
+        ids = np.asarray(chunk["track_id"])[rows]
+        xyxy = np.asarray(chunk["xyxy"])[rows].astype(int)
+        # the same integer centers as Tracker.consume_detections
+        ids_points = [
+            (int(id), ((x1 + x2) // 2, (y1 + y2) // 2))
+            for id, (x1, y1, x2, y2) in zip(ids, xyxy)
+            if id >= 0
+        ]
+        manager.frame_time = datetime.fromtimestamp(float(frame_time))
+        manager.update_counting(
+            ids_points, None if closed_rooms is None else set(closed_rooms.tolist())
+        )
+    seconds = time.perf_counter() - start
+    return manager, len(store) / seconds if seconds > 0 else 0.0
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m source.detection_store",
+        description="Replay counting of rooms from stored detections without inference",
+    )
+    parser.add_argument("store", help="folder saved with --save-detections of source.batch")
+    yaml_group = parser.add_mutually_exclusive_group(required=True)
+    yaml_group.add_argument("--config", help="config with DetectWindows")
+    yaml_group.add_argument("--session", help="session file saved from GUI")
+    parser.add_argument("--out", help="incidents file, default: print incidents")
+    args = parser.parse_args(argv)
+
+    store = DetectionStore(args.store)
+    entries = load_yaml_list(args.config or args.session)
+    if is_session(entries):
+        entry = find_session_entry(entries, store.meta.get("video_name", ""))
+        if entry is None:
+            print(f"No entry of {store.meta.get('video_name')} in {args.session}")
+            return 1
+        entries = entry["data"]
+
+    manager, fps = replay(store, build_track_objects(entries), incidents_path=args.out)
+    manager.close()
+    for incident in manager.pop_incidents():
+        print(incident)
+    print(f"Replayed {len(store)} frames, [FPS] {fps:.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class Detections:
+    """Boxes of one model on one frame, detached from ultralytics results
+
+    Args:
+        xyxy: (N, 4) float boxes in frame coordinates
+        ids: (N,) track ids, None if the model was not tracking
+        classes: class name of every box
+        confs: (N,) confidences
+    """
+
+    def __init__(
+        self,
+        xyxy: np.ndarray = None,
+        ids: np.ndarray = None,
+        classes: list[str] = None,
+        confs: np.ndarray = None,
+    ):
+        self.xyxy = np.zeros((0, 4), dtype=np.float32) if xyxy is None else xyxy
+        self.ids = ids
+        self.classes = classes or []
+        self.confs = np.zeros(len(self.xyxy), dtype=np.float32) if confs is None else confs
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    @classmethod
+    def from_result(cls, result) -> "Detections":
+        """
+        Args:
+            result: ultralytics Results of one frame, Detections of OnnxDetector are returned as they are
+        """
+        if isinstance(result, Detections):
+            return result
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls()
+        class_ids = boxes.cls.cpu().numpy().astype(int)
+        return cls(
+            xyxy=boxes.xyxy.cpu().numpy(),
+            ids=None if boxes.id is None else boxes.id.cpu().numpy().astype(int),
+            classes=[result.names[class_id] for class_id in class_ids],
+            confs=boxes.conf.cpu().numpy(),
+        )
+
+    def int_boxes(self) -> list[list[list[int]]]:
+        """[[x1, y1], [x2, y2]] of every box"""
+        return [
+            [[int(x1), int(y1)], [int(x2), int(y2)]] for x1, y1, x2, y2 in self.xyxy
+        ]
@@ -0,0 +1,47 @@
+import ctypes
+import os
+import sys
+from functools import lru_cache
+
+
+def cuda_available() -> bool:
+    """torch.cuda.is_available() without importing torch, CUDA driver is asked for devices directly
+
+    torch is used once something has imported it: a CPU-only build of torch can't use a GPU,
+    that the driver reports.
+    """
+    if "torch" in sys.modules:
+        return sys.modules["torch"].cuda.is_available()
+    return _driver_has_devices()
+
+
+@lru_cache(maxsize=1)
+def _driver_has_devices() -> bool:
+    for library in ["libcuda.so.1", "libcuda.so", "nvcuda.dll"]:
+        try:
+            driver = ctypes.CDLL(library)
+        except OSError:
+            continue
+        count = ctypes.c_int(0)
+        if driver.cuInit(0) != 0 or driver.cuDeviceGetCount(ctypes.byref(count)) != 0:
+            return False
+        return count.value > 0
+    return False
+
+
+def get_device() -> str:
+    return "cuda" if cuda_available() else "cpu"
+
+
+def set_cpu_threads(threads: int):
+    """Limit threads of OpenCV, torch and OpenMP/MKL of this process, e.g. in a worker of a pool
+
+    torch is usually imported later by the first model, its thread pool reads the environment then.
+    """
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    import cv2 as cv
+
+    cv.setNumThreads(threads)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
@@ -0,0 +1,139 @@
+import hashlib
+import json
+from pathlib import Path
+import cv2 as cv
+import numpy as np
+
+cache_dir = "materials/dewarp_cache"
+
+
+def _perspective_rays(view: dict) -> np.ndarray:
+    """Unit rays (h, w, 3) of a pinhole view, z is the optical axis of the fisheye lens"""
+    width, height = view["width"], view["height"]
+    focal = (width / 2) / np.tan(np.radians(view.get("fov", 90)) / 2)
+    u, v = np.meshgrid(
+        np.arange(width, dtype=np.float64) - (width - 1) / 2,
+        np.arange(height, dtype=np.float64) - (height - 1) / 2,
+    )
+    rays = np.stack([u, v, np.full_like(u, focal)], axis=-1)
+
+    yaw = np.radians(view.get("yaw", 0))  # around the lens axis
+    pitch = np.radians(view.get("pitch", 0))  # away from the lens axis
+    rotate_pitch = np.array(
+        [
+            [1, 0, 0],
+            [0, np.cos(pitch), -np.sin(pitch)],
+            [0, np.sin(pitch), np.cos(pitch)],
+        ]
+    )
+    rotate_yaw = np.array(
+        [
+            [np.cos(yaw), -np.sin(yaw), 0],
+            [np.sin(yaw), np.cos(yaw), 0],
+            [0, 0, 1],
+        ]
+    )
+    rays = rays @ (rotate_yaw @ rotate_pitch).T
+    return rays / np.linalg.norm(rays, axis=-1, keepdims=True)
+
+
+def _panorama_rays(view: dict) -> np.ndarray:
+    """Unit rays (h, w, 3) of a 360 degrees strip around the lens axis"""
+    width, height = view["width"], view["height"]
+    min_angle = np.radians(view.get("min_angle", 20))  # from the lens axis, bottom row
+    max_angle = np.radians(view.get("max_angle", 90))  # top row
+    phi = np.linspace(0, 2 * np.pi, width, endpoint=False)
+    theta = np.linspace(max_angle, min_angle, height)
+    phi, theta = np.meshgrid(phi, theta)
+    return np.stack(
+        [np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)],
+        axis=-1,
+    )
+
+
+def build_maps(frame_size: tuple[int], params: dict) -> tuple[np.ndarray]:
+    """Fixed-point remap tables for an equidistant fisheye frame, views are placed side by side
+
+    Args:
+        frame_size: (width, height) of source frames
+        params: {"fov": lens field of view in degrees, "center": [x, y] and "radius" as fractions
+            of the frame, "views": [{"type": "perspective" | "panorama", "width", "height", ...}]}
+    """
+    width, height = frame_size
+    center_x, center_y = params.get("center", [0.5, 0.5])
+    center_x, center_y = center_x * width, center_y * height
+    radius = params.get("radius", 0.5) * min(width, height)
+    half_fov = np.radians(params.get("fov", 180)) / 2
+
+    map_x, map_y = [], []
+    views = params.get("views") or [{"type": "perspective", "width": 1280, "height": 720}]
+    out_height = max(view["height"] for view in views)
+    for view in views:
+        if view.get("type", "perspective") == "panorama":
+            rays = _panorama_rays(view)
+        else:
+            rays = _perspective_rays(view)
+        theta = np.arccos(np.clip(rays[..., 2], -1, 1))
+        phi = np.arctan2(rays[..., 1], rays[..., 0])
+        r = radius * theta / half_fov
+        view_x = (center_x + r * np.cos(phi)).astype(np.float32)
+        view_y = (center_y + r * np.sin(phi)).astype(np.float32)
+        # lower views are padded with pixels outside of the frame, remap fills them with black
+        padding = ((0, out_height - view["height"]), (0, 0))
+        map_x.append(np.pad(view_x, padding, constant_values=-1))
+        map_y.append(np.pad(view_y, padding, constant_values=-1))
+
+    return cv.convertMaps(
+        np.hstack(map_x), np.hstack(map_y), cv.CV_16SC2, nninterpolation=False
+    )
+
+
+def get_cache_path(frame_size: tuple[int], params: dict) -> Path:
+    key = json.dumps({"frame_size": list(frame_size), **params}, sort_keys=True)
+    return Path(cache_dir) / f"{hashlib.sha1(key.encode()).hexdigest()}.npz"
+
+
+def load_maps(frame_size: tuple[int], params: dict) -> tuple[np.ndarray]:
+    """Maps from the disk cache, they are built and saved if the camera parameters are new"""
+    path = get_cache_path(frame_size, params)
+    if path.exists():
+        try:
+            with np.load(path) as cached:
+                return cached["map1"], cached["map2"]
+        except Exception as err:
+            print(f"Broken dewarp cache {path}, rebuilding: {err}")
+    map1, map2 = build_maps(frame_size, params)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.stem + ".tmp.npz")
+    np.savez(tmp_path, map1=map1, map2=map2)
+    tmp_path.replace(path)
+    return map1, map2
+
+
+class Dewarper:
+    """Turns fisheye frames into perspective or panorama views with one cv.remap call per frame"""
+
+    def __init__(self, params: dict):
+        """
+        Args:
+            params: see build_maps
+        """
+        self.params = params
+        self._frame_size = None
+        self._maps = None
+
+    def _set_frame_size(self, frame_size: tuple[int]):
+        if self._frame_size != frame_size:
+            self._maps = load_maps(frame_size, self.params)
+            self._frame_size = frame_size
+
+    def get_output_shape(self, frame_size: tuple[int]) -> tuple[int]:
+        """Shape of dewarped frames of (width, height) input, maps are prepared for them"""
+        self._set_frame_size(frame_size)
+        return (*self._maps[0].shape[:2], 3)
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        if frame is None:
+            return None
+        self._set_frame_size((frame.shape[1], frame.shape[0]))
+        return cv.remap(frame, *self._maps, cv.INTER_LINEAR)
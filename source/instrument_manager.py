@@ -7,7 +7,24 @@ import numpy as np
 from datetime import datetime
 import cv2 as cv
 from pathlib import Path
-from ultralytics import YOLO
+
+
+def format_incident(
+    act_datetime: datetime,
+    room_id: int,
+    incident_id: int,
+    incident_name: str,
+    level: IncidentLevel,
+    video_name: str,
+) -> str:
+    """Line of the incidents file"""
+    return f"{act_datetime.date()} {str(act_datetime.time())[:-4]} RoomID:{room_id} EventID:{incident_id} {incident_name} [{level.value}] {video_name}"
+
+
+def get_incident_name(level: IncidentLevel, contain: int) -> str:
+    if level == IncidentLevel.CLOSED_EMPTY:
+        return "Room is empty and closed"
+    return "People inside: " + str(contain)
 
 
 class InstrumentManager:
@@ -19,22 +36,30 @@ class InstrumentManager:
         incidents_path: str = None,
         video_name: str = None,
         initialize_curtains_model: bool = False,
+        collect_incidents: bool = False,
     ):
         """
         Args:
             config_path (str): from where lines will be loaded. You also can load data lated with load_data() method
             incidents_path (str): file where logged incidents will be saved. If None: won't be saved
             video_name (str): video's name, that will be used in logs
+            collect_incidents (bool): keep logged incidents until pop_incidents() is called
         """
 
         self.incident_id = 1
+        self.video_name = video_name or "video"
+        self.collect_incidents = collect_incidents
+        self.pending_incidents = []
+        self.frame_time = None  # time of the current frame, if it isn't now (strided file decoding)
+        self.full_frame = None  # current frame before downscaling, curtains are cropped from it
+        self.last_points = []  # ids_points of the last update
+        self.lost_track_frames = 30  # after them a lost track doesn't come back, see Tracker
 
         if not incidents_path is None:
             path = Path(incidents_path)
             if not path.parent.exists():
-                path.parent.mkdir()
+                path.parent.mkdir(parents=True)
             self.incidents_file = path.open("w")
-            self.video_name = video_name or "video"
         else:
             self.incidents_file = None
 
@@ -46,6 +71,8 @@ class InstrumentManager:
                 path = path + ".engine"
             else:
                 path = path + ".onnx"
+            from ultralytics import YOLO
+
             self.curtains_model = YOLO(path, task="classify")
 
         if config_path is None:
@@ -55,6 +82,11 @@ class InstrumentManager:
             data = yaml.safe_load(file)
         self.load_data(data)
 
+    def close(self):
+        if not self.incidents_file is None:
+            self.incidents_file.close()
+            self.incidents_file = None
+
     def load_data(self, data: list[DetectWindow]):
         self.objs = {obj.room_id: obj for obj in data}
 
@@ -62,6 +94,7 @@ class InstrumentManager:
         self.objs[detect_window.room_id] = detect_window
 
     def _update(self, im: np.ndarray, ids_points: list[tuple[int, tuple[float]]]):
+        self.last_points = ids_points
         if not self.curtains_model is None:
             for region, id in self.get_detect_frames(im):
                 self.objs[id].update(ids_points, self.curtains_model, region)
@@ -69,25 +102,52 @@ class InstrumentManager:
             for obj in self.objs.values():
                 obj.update(ids_points, None, None)
 
+    def update_counting(
+        self, ids_points: list[tuple[int, tuple[float]]], closed_rooms: set[int] = None
+    ):
+        """Counting of a frame without drawing and curtains inference, see detection_store.replay
+
+        Args:
+            closed_rooms: ids of rooms with closed curtains, None - every room is open
+        """
+        self.last_points = ids_points
+        for obj in self.objs.values():
+            obj.update(ids_points, None, None)
+            if not closed_rooms is None:
+                obj.is_closed = obj.room_id in closed_rooms
+        if not self.incidents_file is None or self.collect_incidents:
+            self.write_incidents()
+
     def write_incidents(self):
 
         for obj in self.objs.values():
             room_id, incident_levels = obj.get_incident()
-            act_datetime = datetime.now()
+            act_datetime = self.frame_time or datetime.now()
             if obj.contain == 0 and obj.is_closed:
-                incident_name = "Room is empty and closed"
                 incident_levels[1] = IncidentLevel.CLOSED_EMPTY
             if incident_levels[0] == incident_levels[1]:
                 continue
-            if incident_levels[1] != IncidentLevel.CLOSED_EMPTY:
-                incident_name = "People inside: "
-                incident_name += str(obj.contain)
 
-            self.incidents_file.write(
-                f"{act_datetime.date()} {str(act_datetime.time())[:-4]} RoomID:{room_id} EventID:{self.incident_id} {incident_name} [{incident_levels[1].value}] {self.video_name}\n"
+            incident = format_incident(
+                act_datetime,
+                room_id,
+                self.incident_id,
+                get_incident_name(incident_levels[1], obj.contain),
+                incident_levels[1],
+                self.video_name,
             )
+            if not self.incidents_file is None:
+                self.incidents_file.write(incident + "\n")
+            if self.collect_incidents:
+                self.pending_incidents.append(incident)
             self.incident_id += 1
 
+    def pop_incidents(self) -> list[str]:
+        """Returns incidents logged since the previous call, see collect_incidents"""
+        incidents = self.pending_incidents
+        self.pending_incidents = []
+        return incidents
+
     def draw_elements(self, im: np.ndarray) -> np.ndarray:
         frame_out = im.copy()
         for obj in self.objs.values():
@@ -110,7 +170,7 @@ class InstrumentManager:
             if obj.is_closed and obj.contain == 0:
                 incident_level = IncidentLevel.CLOSED_EMPTY
                 break
-        if not self.incidents_file is None:
+        if not self.incidents_file is None or self.collect_incidents:
             self.write_incidents()
 
         lamp_color = (0, 255, 73)  # green
@@ -153,11 +213,34 @@ class InstrumentManager:
         return t
 
     def get_detect_frames(self, frame):
+        scale = 1.0
+        if not self.full_frame is None:
+            scale = self.full_frame.shape[1] / frame.shape[1]
+            frame = self.full_frame
 
         for obj in self.objs.values():
             if obj is None:
                 continue
-            yield self._perspective_correct_quadrilateral(frame, obj.xy_s), obj.room_id
+            points = np.array(obj.xy_s) * scale
+            yield self._perspective_correct_quadrilateral(frame, points), obj.room_id
+
+    def needs_dense_sampling(self, stride: int = 1) -> bool:
+        """Someone is near a DetectWindow, every frame matters for crossing detection
+
+        Args:
+            stride: frames that would be skipped otherwise. The attention band of a window is
+                sized for one frame step, a person can move stride times further before the next
+                sampled frame, so the band is widened as much
+        """
+        if any(obj.has_people_nearby(self.lost_track_frames) for obj in self.objs.values()):
+            return True
+        if stride <= 1:
+            return False
+        return any(
+            obj.is_near(point, obj.attention_band * stride)
+            for obj in self.objs.values()
+            for _, point in self.last_points
+        )
 
     def get_detect_windows_states(self) -> list[tuple[bool, int]]:
         return [(not obj.is_closed, obj.room_id) for obj in self.objs.values()]
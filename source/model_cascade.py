@@ -0,0 +1,161 @@
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .detections import Detections
+
+if TYPE_CHECKING:
+    from .instrument_manager import InstrumentManager
+
+# conditions of a rule, every model is referred by its file name, e.g. "cash_register"
+#   {"detected": model}                      - the model found something on this frame
+#   {"overlaps": [model, model], "margin": 0.1} - boxes of the models intersect, boxes of the
+#                                              first model are expanded by margin of their size
+#   {"near_windows": True}                   - someone is near a DetectWindow
+#   {"all": [conditions]}, {"any": [conditions]}
+condition_keys = ["detected", "overlaps", "near_windows", "all", "any"]
+
+
+def get_condition_models(condition: dict) -> list[str]:
+    """Model keys, results of which the condition needs"""
+    if "all" in condition or "any" in condition:
+        return [
+            key
+            for nested in condition.get("all", condition.get("any"))
+            for key in get_condition_models(nested)
+        ]
+    if "detected" in condition:
+        return [condition["detected"]]
+    if "overlaps" in condition:
+        return list(condition["overlaps"])
+    return []
+
+
+def boxes_overlap(first: np.ndarray, second: np.ndarray, margin: float = 0.0) -> bool:
+    """Any box of first intersects any box of second, boxes are (N, 4) xyxy"""
+    if len(first) == 0 or len(second) == 0:
+        return False
+    size = np.concatenate([first[:, 2:] - first[:, :2]] * 2, axis=1)
+    first = first + size * margin * np.array([-1, -1, 1, 1])
+    x1 = np.maximum(first[:, None, 0], second[None, :, 0])
+    y1 = np.maximum(first[:, None, 1], second[None, :, 1])
+    x2 = np.minimum(first[:, None, 2], second[None, :, 2])
+    y2 = np.minimum(first[:, None, 3], second[None, :, 3])
+    return bool(((x2 > x1) & (y2 > y1)).any())
+
+
+class ModelCascade:
+    """Runs a model on a frame only if its rule holds for results of other models on the frame
+
+    Example of rules (source option "model_cascade"):
+        bills: {all: [{detected: cash_register}, {overlaps: [yolo11n-pose, cash_register]}]}
+        bags: {near_windows: true}
+
+    Models are ordered so the ones a rule depends on run first. A skipped model gives no
+    detections, so rules depending on it don't hold either.
+    """
+
+    def __init__(self, rules: dict, model_names: list[str]):
+        """
+        Args:
+            rules: {model key: condition}, see condition_keys
+            model_names: model file names in the default order, see tracker.AI_names
+        """
+        self.model_names = list(model_names)
+        names = {Path(name).name: name for name in self.model_names}
+        self.conditions = {}
+        for key, condition in (rules or {}).items():
+            self.check_condition(condition, names)
+            if not key in names:
+                raise ValueError(f"Unknown model in model_cascade: {key}")
+            self.conditions[names[key]] = self.resolve(condition, names)
+        self.order = self.sort_models()
+        self.run = {name: 0 for name in self.conditions}
+        self.skipped = {name: 0 for name in self.conditions}
+
+    def check_condition(self, condition: dict, names: dict):
+        if not isinstance(condition, dict) or len(set(condition) & set(condition_keys)) != 1:
+            raise ValueError(f"Condition needs one of {condition_keys}: {condition}")
+        unknown = set(get_condition_models(condition)) - set(names)
+        if unknown:
+            raise ValueError(f"Unknown models in model_cascade: {', '.join(sorted(unknown))}")
+        for nested in condition.get("all", condition.get("any", [])):
+            self.check_condition(nested, names)
+
+    def resolve(self, condition: dict, names: dict) -> dict:
+        """Condition with model keys replaced by model file names"""
+        if "all" in condition or "any" in condition:
+            key = "all" if "all" in condition else "any"
+            return {key: [self.resolve(nested, names) for nested in condition[key]]}
+        if "detected" in condition:
+            return {"detected": names[condition["detected"]]}
+        if "overlaps" in condition:
+            return {
+                "overlaps": [names[key] for key in condition["overlaps"]],
+                "margin": condition.get("margin", 0.0),
+            }
+        return dict(condition)
+
+    def sort_models(self) -> list[str]:
+        """Model names with dependencies of rules first, otherwise in the default order"""
+        dependencies = {
+            name: set(get_condition_models(self.conditions.get(name, {})))
+            for name in self.model_names
+        }
+        order = []
+        visiting = set()
+
+        def visit(name: str):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"model_cascade has a cycle with {Path(name).name}")
+            visiting.add(name)
+            for dependency in sorted(dependencies[name], key=self.model_names.index):
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.model_names:
+            visit(name)
+        return order
+
+    def should_run(
+        self, name: str, results: dict[str, Detections], manager: "InstrumentManager"
+    ) -> bool:
+        """
+        Args:
+            results: detections of the models, that already ran on this frame
+            manager: for near_windows condition
+        """
+        if not name in self.conditions:
+            return True
+        if self.evaluate(self.conditions[name], results, manager):
+            self.run[name] += 1
+            return True
+        self.skipped[name] += 1
+        return False
+
+    def evaluate(
+        self, condition: dict, results: dict[str, Detections], manager: "InstrumentManager"
+    ) -> bool:
+        if "all" in condition:
+            return all(self.evaluate(nested, results, manager) for nested in condition["all"])
+        if "any" in condition:
+            return any(self.evaluate(nested, results, manager) for nested in condition["any"])
+        if "detected" in condition:
+            return len(results.get(condition["detected"], ())) > 0
+        if "overlaps" in condition:
+            first, second = [results.get(name, Detections()) for name in condition["overlaps"]]
+            return boxes_overlap(first.xyxy, second.xyxy, condition["margin"])
+        if "near_windows" in condition:
+            return manager.needs_dense_sampling() == bool(condition["near_windows"])
+        return True
+
+    def get_stats(self) -> dict:
+        """{model key: {"run", "skipped"}} frames of gated models"""
+        return {
+            Path(name).name: {"run": self.run[name], "skipped": self.skipped[name]}
+            for name in self.conditions
+        }
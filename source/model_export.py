@@ -0,0 +1,240 @@
+"""Export of trained models to ONNX/TensorRT, only models changed since the last export are exported
+
+materials/trained_models/export_manifest.yaml keeps the hash of every .pt file, export options and
+library versions of its export. Stale models are exported in parallel worker processes.
+
+Examples:
+    python -m source.model_export
+    python -m source.model_export --force tags
+"""
+
+import argparse
+import hashlib
+import multiprocessing as mp
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from importlib import metadata
+from pathlib import Path
+from typing import Callable
+import yaml
+
+from .device import cuda_available, get_device, set_cpu_threads
+from .tracker import AI_names, base
+
+manifest_path = base + "export_manifest.yaml"
+export_options = {
+    "half": False,
+    "int8": False,
+    "dynamic": True,
+    "simplify": True,
+    "opset": 17,
+}
+versioned_packages = ["ultralytics", "torch", "onnx", "onnxslim", "tensorrt"]
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_versions() -> dict:
+    versions = {}
+    for package in versioned_packages:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def load_manifest() -> dict:
+    if not Path(manifest_path).exists():
+        return {}
+    with Path(manifest_path).open("r") as file:
+        return yaml.safe_load(file) or {}
+
+
+def save_manifest(manifest: dict):
+    tmp_path = Path(manifest_path + ".tmp")
+    with tmp_path.open("w") as file:
+        yaml.safe_dump(manifest, file, sort_keys=False)
+    tmp_path.replace(manifest_path)
+
+
+def get_exported_path(model_name: str) -> Path:
+    """Existing export of the model, .engine is preferred like in load_model"""
+    for suffix in [".engine", ".onnx"]:
+        if Path(model_name + suffix).exists():
+            return Path(model_name + suffix)
+    return None
+
+
+def get_export_record(model_name: str, device: str, versions: dict) -> dict:
+    return {
+        "pt_hash": file_hash(model_name + ".pt"),
+        "device": device,
+        "options": dict(export_options),
+        "versions": dict(versions),
+    }
+
+
+def get_stale_models(force: list[str] = None) -> tuple[list[str], dict]:
+    """Models, whose .pt file, export options or library versions changed since their export
+
+    Args:
+        force: model file names to export anyway
+
+    Returns:
+        (stale model names, manifest with records of up to date models)
+    """
+    device = get_device()
+    versions = get_versions()
+    manifest = load_manifest()
+    stale = []
+    for model_name in AI_names:
+        model_key = Path(model_name).name
+        if not Path(model_name + ".pt").exists():
+            continue
+        record = get_export_record(model_name, device, versions)
+        exported = get_exported_path(model_name)
+        entry = manifest.get(model_key)
+        if entry is None and not exported is None and model_key not in (force or []):
+            # exported before the manifest existed, trusted if it's newer than the weights
+            if exported.stat().st_mtime >= Path(model_name + ".pt").stat().st_mtime:
+                manifest[model_key] = {**record, "file": exported.name}
+                continue
+        if (
+            model_key in (force or [])
+            or entry is None
+            or exported is None
+            or entry.get("file") != exported.name
+            or any(entry.get(key) != value for key, value in record.items())
+        ):
+            stale.append(model_name)
+    return stale, manifest
+
+
+def _init_worker(threads: int):
+    # exports run side by side, every one of them gets its share of the CPU
+    set_cpu_threads(threads)
+
+
+def export_model(model_name: str, engine: bool) -> str:
+    """Export in a worker process
+
+    Args:
+        engine: try TensorRT first, ONNX is exported if it fails
+
+    Returns:
+        exported file name
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(model_name + ".pt")
+    if engine and not cuda_available():
+        engine = False  # the driver sees a GPU, but torch is a CPU-only build
+    if engine:
+        try:
+            return Path(model.export(format="engine", **export_options)).name
+        except Exception as err:
+            print(f"TensorRT export of {model_name} failed, exporting ONNX: {err}")
+    return Path(model.export(format="onnx", **export_options)).name
+
+
+def export_stale_models(
+    workers: int = None,
+    force: list[str] = None,
+    progress: Callable[[int, int, str, str], None] = None,
+) -> dict:
+    """Export models changed since their last export and update the manifest
+
+    Args:
+        workers: number of export processes, default is 1 with CUDA (engine builds use the whole GPU)
+            and number of CPUs otherwise
+        force: model file names to export anyway
+        progress: called with (done, total, model file name, error or None) after every export
+
+    Returns:
+        {model file name: exported file name or "error: ..."}
+    """
+    stale, manifest = get_stale_models(force)
+    save_manifest(manifest)
+    if len(stale) == 0:
+        return {}
+
+    device = get_device()
+    versions = get_versions()
+    if workers is None:
+        workers = 1 if device == "cuda" else os.cpu_count() or 1
+    workers = max(1, min(workers, len(stale)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    for model_name in stale:
+        # outdated exports mustn't be loaded if the new export fails
+        for suffix in [".engine", ".onnx", ".int8.onnx"]:
+            Path(model_name + suffix).unlink(missing_ok=True)
+
+    results = {}
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads,),
+    ) as executor:
+        futures = {
+            executor.submit(export_model, model_name, device == "cuda"): model_name
+            for model_name in stale
+        }
+        for future in as_completed(futures):
+            model_name = futures[future]
+            model_key = Path(model_name).name
+            error = None
+            try:
+                exported = future.result()
+                manifest[model_key] = {
+                    **get_export_record(model_name, device, versions),
+                    "file": exported,
+                }
+                save_manifest(manifest)
+                results[model_key] = exported
+            except Exception as err:
+                error = str(err)
+                manifest.pop(model_key, None)
+                save_manifest(manifest)
+                results[model_key] = f"error: {error}"
+            if not progress is None:
+                progress(len(results), len(stale), model_key, error)
+    return results
+
+
+def print_progress(done: int, total: int, model_key: str, error: str):
+    if error is None:
+        print(f"[{done}/{total}] {model_key} exported")
+    else:
+        print(f"[{done}/{total}] {model_key} failed: {error}")
+
+
+def main(argv: list[str] = None) -> int:
+    model_keys = [Path(name).name for name in AI_names]
+    parser = argparse.ArgumentParser(
+        prog="python -m source.model_export",
+        description="Export models changed since their last export",
+    )
+    parser.add_argument(
+        "--force", nargs="+", choices=model_keys, default=[], help="export anyway"
+    )
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(argv)
+
+    results = export_stale_models(args.workers, args.force, print_progress)
+    if len(results) == 0:
+        print("Every model is up to date")
+    return int(any(result.startswith("error") for result in results.values()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
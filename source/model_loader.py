@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Callable
+
+
+class ModelLoader:
+    """Loads and warms up models one by one on a background thread, in the given order
+
+    Every model is handed over with on_ready as soon as it's warmed up, so inference can start
+    with the first model while the others are still loading.
+    """
+
+    def __init__(
+        self,
+        model_names: list[str],
+        load: Callable[[str], object],
+        warm_up: Callable[[object, str], None],
+        on_ready: Callable[[str, object], None],
+    ):
+        """
+        Args:
+            model_names: models in order of loading
+            load: returns the model by its name
+            warm_up: runs the model on dummy input, so the first real frame doesn't pay initialization
+            on_ready: receives (name, model) of every loaded model
+        """
+        self.model_names = model_names
+        self.load = load
+        self.warm_up = warm_up
+        self.on_ready = on_ready
+        self.ready = {name: threading.Event() for name in model_names}
+        self.stats = {name: {} for name in model_names}  # name -> {"load", "warm_up"} seconds
+        self.errors = {}
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        for name in self.model_names:
+            if self.stopped:
+                break
+            start = time.time()
+            try:
+                model = self.load(name)
+                loaded = time.time()
+                self.warm_up(model, name)
+            except Exception as err:
+                print(f"Failed to load {name}: {err}")
+                self.errors[name] = str(err)
+                self.ready[name].set()
+                continue
+            self.stats[name] = {
+                "load": round(loaded - start, 3),
+                "warm_up": round(time.time() - loaded, 3),
+            }
+            self.on_ready(name, model)
+            self.ready[name].set()
+        for event in self.ready.values():  # stopped, nobody should wait for the rest
+            event.set()
+
+    def wait(self, names: list[str] = None, timeout: float = None) -> bool:
+        """Block until models are loaded or failed
+
+        Args:
+            names: default is every model
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        for name in names or self.model_names:
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            if not self.ready[name].wait(remaining):
+                return False
+        return True
@@ -0,0 +1,113 @@
+import cv2 as cv
+import numpy as np
+
+from .detections import Detections
+
+
+class BoxPropagator:
+    """Moves tracked boxes between detector runs
+
+    Every box is shifted by the median sparse optical flow (Lucas-Kanade) of corners inside it.
+    Boxes without enough tracked corners keep the constant velocity of their last detections.
+    """
+
+    def __init__(self, scale: float = 0.5, max_points: int = 300, min_points: int = 3):
+        """
+        Args:
+            scale: flow is computed on a downscaled gray frame
+            max_points: corners per frame for all boxes together
+            min_points: tracked corners of a box to trust its flow
+        """
+        self.scale = scale
+        self.max_points = max_points
+        self.min_points = min_points
+        self.detections = None
+        self.velocities = {}  # id -> (dx, dy) per frame from the last two detections
+        self._detected_centers = {}
+        self._gray = None
+        self._frames_since_detection = 0
+        self.detected = 0
+        self.predicted = 0
+
+    def _to_gray(self, frame: np.ndarray) -> np.ndarray:
+        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+        if self.scale != 1.0:
+            gray = cv.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv.INTER_AREA)
+        return gray
+
+    def reset(self, frame: np.ndarray, detections: Detections):
+        """Detector result of the frame, velocities are measured from the previous detection"""
+        centers = {}
+        if not detections.ids is None:
+            centers = {
+                int(id): (xyxy[:2] + xyxy[2:]) / 2
+                for id, xyxy in zip(detections.ids, detections.xyxy)
+            }
+        frames = self._frames_since_detection + 1
+        self.velocities = {
+            id: (center - self._detected_centers[id]) / frames
+            for id, center in centers.items()
+            if id in self._detected_centers
+        }
+        self._detected_centers = centers
+        self.detections = detections
+        self._gray = self._to_gray(frame)
+        self._frames_since_detection = 0
+        self.detected += 1
+
+    def has_tracks(self) -> bool:
+        return not self.detections is None
+
+    def predict(self, frame: np.ndarray) -> Detections:
+        """Boxes of the last detection moved to the frame"""
+        gray = self._to_gray(frame)
+        detections = self.detections
+        self._frames_since_detection += 1
+        self.predicted += 1
+        if len(detections) == 0:
+            self._gray = gray
+            return detections
+
+        boxes = detections.xyxy * self.scale
+        mask = np.zeros(gray.shape, dtype=np.uint8)
+        for x1, y1, x2, y2 in boxes.astype(int):
+            mask[max(0, y1) : max(0, y2), max(0, x1) : max(0, x2)] = 255
+        corners = cv.goodFeaturesToTrack(
+            self._gray, self.max_points, qualityLevel=0.01, minDistance=3, mask=mask
+        )
+
+        shifts = np.full((len(boxes), 2), np.nan, dtype=np.float32)
+        if not corners is None:
+            moved, status, _ = cv.calcOpticalFlowPyrLK(
+                self._gray, gray, corners, None, winSize=(15, 15), maxLevel=2
+            )
+            good = status.reshape(-1) == 1
+            points = corners.reshape(-1, 2)[good]
+            flow = moved.reshape(-1, 2)[good] - points
+            for i, (x1, y1, x2, y2) in enumerate(boxes):
+                inside = (
+                    (points[:, 0] >= x1)
+                    & (points[:, 0] <= x2)
+                    & (points[:, 1] >= y1)
+                    & (points[:, 1] <= y2)
+                )
+                if inside.sum() >= self.min_points:
+                    shifts[i] = np.median(flow[inside], axis=0) / self.scale
+
+        ids = detections.ids if not detections.ids is None else [None] * len(boxes)
+        for i, id in enumerate(ids):
+            if np.isnan(shifts[i, 0]):
+                shifts[i] = self.velocities.get(None if id is None else int(id), (0.0, 0.0))
+
+        height, width = frame.shape[:2]
+        xyxy = detections.xyxy + np.hstack([shifts, shifts])
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, width)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, height)
+        self.detections = Detections(
+            xyxy=xyxy.astype(np.float32),
+            ids=detections.ids,
+            classes=detections.classes,
+            confs=detections.confs,
+        )
+        self._gray = gray
+        return self.detections
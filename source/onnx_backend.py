@@ -0,0 +1,287 @@
+"""Detectors exported to ONNX, run by ONNX Runtime directly without ultralytics predictor
+
+Examples:
+    python -m source.onnx_backend bills --video records/cam1.mp4 --frames 50
+"""
+
+import argparse
+import ast
+import sys
+import cv2 as cv
+import numpy as np
+
+from .detections import Detections
+from .preprocess import letterbox, unletterbox
+
+# names of onnxruntime.GraphOptimizationLevel values
+graph_optimization_levels = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def create_session(
+    path: str,
+    device: str = "cpu",
+    intra_op_threads: int = 0,
+    inter_op_threads: int = 0,
+    graph_optimization: str = "all",
+    memory_arena: bool = True,
+) -> "onnxruntime.InferenceSession":
+    """
+    Args:
+        intra_op_threads, inter_op_threads: 0 - ONNX Runtime default
+        graph_optimization: one of graph_optimization_levels
+        memory_arena: keep freed CPU buffers for the next run instead of returning them to the system
+    """
+    import onnxruntime as ort  # like torch, imported only when processing starts
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.graph_optimization_level = getattr(
+        ort.GraphOptimizationLevel, graph_optimization_levels[graph_optimization]
+    )
+    options.enable_cpu_mem_arena = memory_arena
+
+    providers = ["CPUExecutionProvider"]
+    if device == "cuda" and "CUDAExecutionProvider" in ort.get_available_providers():
+        providers.insert(0, "CUDAExecutionProvider")
+    return ort.InferenceSession(path, sess_options=options, providers=providers)
+
+
+def non_max_suppression(
+    output: np.ndarray, conf: float, iou: float, max_det: int = 300
+) -> tuple[np.ndarray]:
+    """Per class NMS of raw YOLO output like ultralytics non_max_suppression without multi_label
+
+    Args:
+        output: (4 + classes, anchors) of one image, boxes are (cx, cy, w, h)
+
+    Returns:
+        (xyxy (N, 4), confs (N,), class_ids (N,))
+    """
+    scores = output[4:]
+    class_ids = scores.argmax(axis=0)
+    confs = scores[class_ids, np.arange(scores.shape[1])]
+    candidates = confs > conf
+    if not candidates.any():
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, np.float32), np.zeros(0, int)
+
+    cx, cy, w, h = output[:4, candidates]
+    xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    confs, class_ids = confs[candidates], class_ids[candidates]
+    keep = cv.dnn.NMSBoxesBatched(
+        np.stack([xyxy[:, 0], xyxy[:, 1], w, h], axis=1).tolist(),
+        confs.astype(float).tolist(),
+        class_ids.tolist(),
+        conf,
+        iou,
+    )
+    keep = np.array(keep, dtype=int).reshape(-1)[:max_det]
+    return xyxy[keep].astype(np.float32), confs[keep], class_ids[keep]
+
+
+class OnnxDetector:
+    """Detection model on ONNX Runtime with the predict interface that Tracker and TiledInference use
+
+    Results are Detections instead of ultralytics Results, frames are letterboxed with NumPy/OpenCV
+    and boxes are returned in frame coordinates. Tensors from PreprocessCache are accepted as they are,
+    boxes of them stay in the letterboxed input.
+    """
+
+    def __init__(self, path: str, device: str = "cpu", **session_options):
+        """
+        Args:
+            path: .onnx file exported by ultralytics, detect task
+            session_options: see create_session
+        """
+        self.path = path
+        self.session = create_session(path, device=device, **session_options)
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        task = metadata.get("task", "detect")
+        if task != "detect":
+            raise ValueError(f"{path}: ONNX Runtime backend supports detect task only, not {task}")
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        imgsz = ast.literal_eval(metadata.get("imgsz", "[640, 640]"))
+        self.imgsz = (imgsz, imgsz) if isinstance(imgsz, int) else tuple(imgsz)
+        self.end2end = metadata.get("end2end", "False") == "True"
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        # like ultralytics, frames of dynamic shape models are padded only to the stride
+        self.dynamic_shape = not isinstance(model_input.shape[2], int)
+        self.stride = None
+        if self.dynamic_shape:
+            self.stride = int(metadata.get("stride", 32))
+        self.input_type = np.float16 if "float16" in model_input.type else np.float32
+
+    def run(self, blob: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: blob.astype(self.input_type, copy=False)})[0]
+
+    def postprocess(self, output: np.ndarray, conf: float, iou: float, max_det: int) -> Detections:
+        if self.end2end:  # (max_det, 6): x1, y1, x2, y2, conf, class
+            output = output[output[:, 4] > conf][:max_det]
+            xyxy, confs, class_ids = output[:, :4], output[:, 4], output[:, 5].astype(int)
+        else:
+            xyxy, confs, class_ids = non_max_suppression(output, conf, iou, max_det)
+        return Detections(
+            xyxy=xyxy.astype(np.float32),
+            classes=[self.names.get(int(class_id), str(class_id)) for class_id in class_ids],
+            confs=confs.astype(np.float32),
+        )
+
+    def predict_blob(self, blob: np.ndarray, conf: float, iou: float, max_det: int) -> list[Detections]:
+        if len(blob) > 1 and not self.dynamic_batch:
+            outputs = [self.run(blob[i : i + 1])[0] for i in range(len(blob))]
+        else:
+            outputs = self.run(blob)
+        return [self.postprocess(output, conf, iou, max_det) for output in outputs]
+
+    def predict(
+        self,
+        source,
+        conf: float = 0.25,
+        iou: float = 0.7,
+        max_det: int = 300,
+        imgsz: int | tuple[int] = None,
+        **kwargs,
+    ) -> list[Detections]:
+        """
+        Args:
+            source: BGR frame, list of frames or (B, 3, h, w) tensor from PreprocessCache
+            imgsz: input size of frames instead of the exported one, only for dynamic shape models
+            kwargs: other ultralytics predict arguments (stream, verbose, device), ignored
+        """
+        if hasattr(source, "cpu"):  # torch.Tensor
+            return self.predict_blob(source.cpu().numpy(), conf, iou, max_det)
+
+        size = self.imgsz
+        if not imgsz is None:
+            size = (imgsz, imgsz) if isinstance(imgsz, int) else tuple(imgsz)
+            if size != self.imgsz and not self.dynamic_shape:
+                raise ValueError(
+                    f"{self.path} is exported with static input {self.imgsz}, imgsz {size} can't be used"
+                )
+
+        frames = source if isinstance(source, list) else [source]
+        stride = self.stride if len({frame.shape for frame in frames}) == 1 else None
+        images, transforms = [], []
+        for frame in frames:
+            image, ratio, pad = letterbox(frame, size, stride)
+            images.append(image)
+            transforms.append((ratio, pad, frame.shape))
+        blob = cv.dnn.blobFromImages(images, scalefactor=1 / 255, swapRB=True)
+
+        results = self.predict_blob(blob, conf, iou, max_det)
+        return [
+            unletterbox(detections, ratio, pad, shape)
+            for detections, (ratio, pad, shape) in zip(results, transforms)
+        ]
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N, M) IoU of xyxy boxes"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def match_detections(
+    actual: Detections, expected: Detections, min_iou: float
+) -> list[tuple[int, int, float]]:
+    """One to one matches (actual index, expected index, IoU) of boxes of the same class,
+    boxes of actual are matched in order of confidence"""
+    if len(actual) == 0 or len(expected) == 0:
+        return []
+    overlap = box_iou(actual.xyxy, expected.xyxy)
+    same_class = np.array(actual.classes)[:, None] == np.array(expected.classes)[None, :]
+    overlap[~same_class] = 0
+    matches = []
+    for i in np.argsort(-actual.confs):
+        j = int(overlap[i].argmax())
+        if overlap[i, j] >= min_iou:
+            matches.append((int(i), j, float(overlap[i, j])))
+            overlap[:, j] = 0
+    return matches
+
+
+def check_parity(
+    model_name: str, frames: list[np.ndarray], min_iou: float = 0.9, **predict_args
+) -> dict:
+    """Compare detections of ONNX Runtime backend with ultralytics predict on the same frames
+
+    Args:
+        model_name: path to the model without extension, like tracker.AI_names
+        min_iou: boxes of the same class with at least this IoU are matched
+
+    Returns:
+        {"ultralytics", "onnxruntime": number of boxes, "matched", "mean_iou", "max_conf_error", "passed"}
+    """
+    from ultralytics import YOLO
+
+    reference = YOLO(model_name + ".onnx")
+    detector = OnnxDetector(model_name + ".onnx")
+    report = {"ultralytics": 0, "onnxruntime": 0, "matched": 0, "mean_iou": 1.0, "max_conf_error": 0.0}
+    ious = []
+    for frame in frames:
+        expected = Detections.from_result(
+            next(iter(reference.predict(frame, stream=True, verbose=False, **predict_args)))
+        )
+        actual = detector.predict(frame, **predict_args)[0]
+        report["ultralytics"] += len(expected)
+        report["onnxruntime"] += len(actual)
+        for i, j, overlap in match_detections(actual, expected, min_iou):
+            ious.append(overlap)
+            report["max_conf_error"] = max(
+                report["max_conf_error"], float(abs(actual.confs[i] - expected.confs[j]))
+            )
+    report["matched"] = len(ious)
+    if len(ious) > 0:
+        report["mean_iou"] = float(np.mean(ious))
+    total = max(report["ultralytics"], report["onnxruntime"])
+    report["passed"] = total == 0 or report["matched"] >= 0.98 * total
+    return report
+
+
+def main(argv: list[str] = None) -> int:
+    from .tracker import base
+
+    parser = argparse.ArgumentParser(
+        prog="python -m source.onnx_backend",
+        description="Check that ONNX Runtime backend gives the same detections as ultralytics",
+    )
+    parser.add_argument("model", help="model file name in materials/trained_models, e.g. bills")
+    parser.add_argument("--video", required=True)
+    parser.add_argument("--frames", type=int, default=50, help="number of frames to compare")
+    parser.add_argument("--conf", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    capture = cv.VideoCapture(args.video)
+    frames = []
+    while len(frames) < args.frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    if len(frames) == 0:
+        print(f"Can't read frames from {args.video}")
+        return 1
+
+    report = check_parity(base + args.model, frames, conf=args.conf)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import cv2 as cv
+import numpy as np
+from typing import TYPE_CHECKING
+
+from .detections import Detections
+
+if TYPE_CHECKING:
+    import torch
+
+
+def letterbox(
+    frame: np.ndarray, size: tuple[int], stride: int = None
+) -> tuple[np.ndarray, float, tuple[int]]:
+    """Resize with unchanged aspect ratio and pad to size, like ultralytics LetterBox
+
+    Args:
+        size: (height, width) of the model input
+        stride: pad only to a multiple of stride (LetterBox(auto=True)), for models with dynamic input shape
+
+    Returns:
+        (image, ratio, (pad_x, pad_y))
+    """
+    height, width = frame.shape[:2]
+    new_height, new_width = size
+    ratio = min(new_height / height, new_width / width)
+    unpad_width, unpad_height = round(width * ratio), round(height * ratio)
+    pad_x, pad_y = new_width - unpad_width, new_height - unpad_height
+    if not stride is None:
+        pad_x, pad_y = pad_x % stride, pad_y % stride
+    pad_x, pad_y = pad_x / 2, pad_y / 2
+
+    if (width, height) != (unpad_width, unpad_height):
+        frame = cv.resize(frame, (unpad_width, unpad_height), interpolation=cv.INTER_LINEAR)
+    top, left = round(pad_y - 0.1), round(pad_x - 0.1)
+    image = cv.copyMakeBorder(
+        frame,
+        top,
+        round(pad_y + 0.1),
+        left,
+        round(pad_x + 0.1),
+        cv.BORDER_CONSTANT,
+        value=(114, 114, 114),
+    )
+    return image, ratio, (left, top)
+
+
+class PreprocessCache:
+    """Model input tensors of the current frame, built once per input size and shared by every model
+
+    Letterbox, BGR -> RGB, normalization and HWC -> CHW are done by one resize and one blobFromImage
+    instead of once per model.
+    """
+
+    def __init__(self, device: str = "cpu"):
+        self.device = device
+        self.frame = None
+        self.inputs = {}
+        self.built = 0
+        self.reused = 0
+
+    def set_frame(self, frame: np.ndarray):
+        self.frame = frame
+        self.inputs = {}
+
+    def get(
+        self, size: tuple[int], stride: int = None
+    ) -> tuple["torch.Tensor", float, tuple[int]]:
+        """
+        Args:
+            size: (height, width) of the model input
+            stride: see letterbox
+
+        Returns:
+            (tensor (1, 3, h, w) in 0..1, ratio, (pad_x, pad_y)) for boxes conversion back to the frame
+        """
+        key = (tuple(size), stride)
+        if key in self.inputs:
+            self.reused += 1
+            return self.inputs[key]
+
+        import torch
+
+        image, ratio, pad = letterbox(self.frame, size, stride)
+        blob = cv.dnn.blobFromImage(image, scalefactor=1 / 255, swapRB=True)
+        tensor = torch.from_numpy(blob).to(self.device)
+        self.inputs[key] = (tensor, ratio, pad)
+        self.built += 1
+        return self.inputs[key]
+
+
+def get_input_size(model, default: int = 640) -> tuple[int]:
+    """(height, width) input of the model, models are exported with the default image size"""
+    imgsz = getattr(model, "imgsz", None)  # OnnxDetector
+    predictor = getattr(model, "predictor", None)
+    if not predictor is None:
+        imgsz = getattr(predictor, "imgsz", None)
+    if imgsz is None:
+        imgsz = getattr(model, "overrides", {}).get("imgsz") or default
+    if isinstance(imgsz, int):
+        return (imgsz, imgsz)
+    return tuple(imgsz)
+
+
+def unletterbox(
+    detections: Detections, ratio: float, pad: tuple[float], frame_shape: tuple[int]
+) -> Detections:
+    """Move boxes from the letterboxed input into frame coordinates"""
+    if len(detections) == 0:
+        return detections
+    pad_x, pad_y = pad
+    xyxy = (detections.xyxy - np.array([pad_x, pad_y, pad_x, pad_y])) / ratio
+    height, width = frame_shape[:2]
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, width)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, height)
+    detections.xyxy = xyxy.astype(np.float32)
+    return detections
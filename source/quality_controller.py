@@ -0,0 +1,148 @@
+import time
+
+from .tracker import AI_names
+
+# knobs of a quality level, level 0 is full quality
+full_quality = {
+    "tiling": True,  # tiled inference of small object detectors
+    "model_stride": 1,  # non-critical models run on every N-th frame, their last result is reused
+    "input_size": None,  # inference input size of non-critical models, None - exported size
+    "people_input_size": None,  # inference input size of the people model
+    "decode_stride": 1,  # only every N-th frame is processed, multiplies decode stride of files
+}
+
+
+def build_levels(model_names: list[str], tiled: bool) -> list[dict]:
+    """Quality levels from full to lowest, non-critical models are degraded before people
+
+    Args:
+        model_names: enabled models
+        tiled: some models run on tiles
+    """
+    non_critical = [
+        name for name in model_names if not name in (AI_names[0], AI_names[2])
+    ]
+    steps = []
+    if tiled:
+        steps.append({"tiling": False})
+    if len(non_critical) > 0:
+        steps += [{"model_stride": 2}, {"input_size": 480}, {"model_stride": 4}]
+    steps.append({"decode_stride": 2})
+    if AI_names[0] in model_names:
+        steps.append({"people_input_size": 480})
+    if len(non_critical) > 0:
+        steps.append({"input_size": 320, "model_stride": 8})
+    if AI_names[0] in model_names:
+        steps.append({"people_input_size": 320})
+    steps.append({"decode_stride": 3})
+
+    levels = [dict(full_quality)]
+    for step in steps:
+        levels.append({**levels[-1], **step})
+    return levels
+
+
+class QualityController:
+    """Holds the target FPS of a stream by moving along quality levels
+
+    Processing time of frames is smoothed, the level goes down when it's over the budget for
+    degrade_after seconds and up when there is headroom for upgrade_after seconds. The wait before
+    an upgrade doubles if the previous upgrade had to be reverted, so the level doesn't oscillate.
+    """
+
+    def __init__(
+        self,
+        target_fps: float,
+        levels: list[dict],
+        name: str = "",
+        smoothing: float = 0.1,
+        degrade_after: float = 2.0,
+        upgrade_after: float = 10.0,
+        headroom: float = 0.7,
+    ):
+        """
+        Args:
+            levels: see build_levels
+            name: stream name for the log
+            smoothing: weight of a new frame time in the moving average
+            headroom: upgrade only if frames take less than this part of the budget
+        """
+        self.budget = 1.0 / target_fps
+        self.target_fps = target_fps
+        self.levels = levels
+        self.name = name
+        self.smoothing = smoothing
+        self.degrade_after = degrade_after
+        self.base_upgrade_after = upgrade_after
+        self.upgrade_after = upgrade_after
+        self.headroom = headroom
+
+        self.level = 0
+        self.frame_time = None
+        self.over_since = None
+        self.under_since = None
+        self.last_upgrade = None
+        self.history = []  # decisions: {"time", "from", "to", "fps", "reason"}
+
+    def get_settings(self) -> dict:
+        return self.levels[self.level]
+
+    def update(self, frame_time: float, now: float = None) -> dict:
+        """
+        Args:
+            frame_time: processing time of the last frame in seconds
+
+        Returns:
+            settings of the new level or None if the level is unchanged
+        """
+        now = time.monotonic() if now is None else now
+        if self.frame_time is None:
+            self.frame_time = frame_time
+        else:
+            self.frame_time += self.smoothing * (frame_time - self.frame_time)
+
+        # with decode stride of the level only every N-th frame has to be processed in time
+        budget = self.budget * self.get_settings()["decode_stride"]
+        if self.frame_time > budget:
+            self.under_since = None
+            self.over_since = self.over_since or now
+            if now - self.over_since >= self.degrade_after and self.level < len(self.levels) - 1:
+                if not self.last_upgrade is None and now - self.last_upgrade < 2 * self.upgrade_after:
+                    self.upgrade_after *= 2  # the upgrade didn't fit the budget
+                return self.change(self.level + 1, "over budget")
+        elif self.frame_time < budget * self.headroom:
+            self.over_since = None
+            self.under_since = self.under_since or now
+            if now - self.under_since >= self.upgrade_after and self.level > 0:
+                self.last_upgrade = now
+                return self.change(self.level - 1, "headroom")
+        else:
+            self.over_since = None
+            self.under_since = None
+            if not self.last_upgrade is None and now - self.last_upgrade > 10 * self.upgrade_after:
+                self.upgrade_after = self.base_upgrade_after  # the level is stable
+        return None
+
+    def change(self, level: int, reason: str) -> dict:
+        fps = 1.0 / self.frame_time if self.frame_time > 0 else 0.0
+        decision = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "from": self.level,
+            "to": level,
+            "fps": round(fps, 2),
+            "reason": reason,
+        }
+        self.history.append(decision)
+        changes = {
+            key: value
+            for key, value in self.levels[level].items()
+            if self.levels[self.level][key] != value
+        }
+        print(
+            f"[QUALITY] {self.name}: level {self.level} -> {level} ({reason}, "
+            f"{fps:.1f} of {self.target_fps} FPS): {changes}"
+        )
+        self.level = level
+        self.over_since = None
+        self.under_since = None
+        return self.get_settings()
@@ -0,0 +1,244 @@
+"""Static INT8 quantization of exported ONNX detectors for CPU-only servers
+
+Calibration frames are sampled from recordings of our cameras. A quantized model is kept as
+<model>.int8.onnx (load_model uses it without CUDA) only if its detections on a held-out clip
+agree with the FP32 model within the tolerance.
+
+Examples:
+    python -m source.quantization --calibration "records/*.mp4" --holdout records/check.mp4
+    python -m source.quantization --calibration "records/*.mp4" --holdout records/check.mp4 --models bills tags --tolerance 0.01
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+import cv2 as cv
+import numpy as np
+import yaml
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quant_pre_process,
+    quantize_static,
+)
+
+from .batch import expand_video_paths
+from .onnx_backend import OnnxDetector, match_detections
+from .preprocess import letterbox
+from .tracker import AI_names, base
+
+# pose and classification models have other outputs, they aren't checked by OnnxDetector
+quantizable_keys = [Path(name).name for name in AI_names if not name in (AI_names[0], AI_names[2])]
+calibration_methods = {
+    "minmax": CalibrationMethod.MinMax,
+    "percentile": CalibrationMethod.Percentile,
+    "entropy": CalibrationMethod.Entropy,
+}
+report_path = base + "int8_report.yaml"
+
+
+def sample_frames(paths: list[str], count: int) -> list[np.ndarray]:
+    """count frames evenly spread over all videos"""
+    lengths = []
+    for path in paths:
+        capture = cv.VideoCapture(path)
+        lengths.append(max(0, int(capture.get(cv.CAP_PROP_FRAME_COUNT))))
+        capture.release()
+    total = sum(lengths)
+    if total == 0:
+        return []
+
+    frames = []
+    for path, length in zip(paths, lengths):
+        per_video = max(1, round(count * length / total)) if length > 0 else 0
+        capture = cv.VideoCapture(path)
+        for position in np.linspace(0, length - 1, per_video, dtype=int):
+            capture.set(cv.CAP_PROP_POS_FRAMES, int(position))
+            ret, frame = capture.read()
+            if ret:
+                frames.append(frame)
+        capture.release()
+    return frames
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """Feeds frames to the calibrator preprocessed like OnnxDetector does"""
+
+    def __init__(self, frames: list[np.ndarray], input_name: str, imgsz: tuple[int], stride: int):
+        self.frames = frames
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.stride = stride
+        self.index = 0
+
+    def get_next(self) -> dict:
+        if self.index >= len(self.frames):
+            return None
+        image, _, _ = letterbox(self.frames[self.index], self.imgsz, self.stride)
+        self.index += 1
+        return {
+            self.input_name: cv.dnn.blobFromImage(image, scalefactor=1 / 255, swapRB=True)
+        }
+
+    def rewind(self):
+        self.index = 0
+
+
+def quantize_model(
+    model_path: str,
+    output_path: str,
+    frames: list[np.ndarray],
+    method: str = "minmax",
+):
+    """QDQ INT8 model with per-channel weights and activation ranges from frames"""
+    reference = OnnxDetector(model_path)
+    prepared_path = str(Path(output_path).with_suffix(".prep.onnx"))
+    try:
+        quant_pre_process(model_path, prepared_path, skip_symbolic_shape=True)
+        quantize_static(
+            prepared_path,
+            output_path,
+            FrameCalibrationReader(
+                frames, reference.input_name, reference.imgsz, reference.stride
+            ),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=calibration_methods[method],
+        )
+    finally:
+        Path(prepared_path).unlink(missing_ok=True)
+
+
+def evaluate(
+    model_path: str, quantized_path: str, frames: list[np.ndarray], min_iou: float = 0.5
+) -> dict:
+    """Agreement of the quantized model with the FP32 one, FP32 detections are the reference
+
+    Returns:
+        {"boxes": number of FP32 boxes, "f1", "delta": 1 - f1, "fp32_ms", "int8_ms", "speedup"}
+    """
+    fp32 = OnnxDetector(model_path)
+    int8 = OnnxDetector(quantized_path)
+    expected_total, actual_total, matched = 0, 0, 0
+    times = {"fp32": 0.0, "int8": 0.0}
+    for frame in frames:
+        start = time.perf_counter()
+        expected = fp32.predict(frame)[0]
+        times["fp32"] += time.perf_counter() - start
+        start = time.perf_counter()
+        actual = int8.predict(frame)[0]
+        times["int8"] += time.perf_counter() - start
+
+        expected_total += len(expected)
+        actual_total += len(actual)
+        matched += len(match_detections(actual, expected, min_iou))
+
+    if expected_total + actual_total == 0:
+        f1 = 1.0
+    else:
+        f1 = 2 * matched / (expected_total + actual_total)
+    frames_count = max(1, len(frames))
+    fp32_ms = 1000 * times["fp32"] / frames_count
+    int8_ms = 1000 * times["int8"] / frames_count
+    return {
+        "boxes": expected_total,
+        "f1": round(f1, 4),
+        "delta": round(1 - f1, 4),
+        "fp32_ms": round(fp32_ms, 1),
+        "int8_ms": round(int8_ms, 1),
+        "speedup": round(fp32_ms / int8_ms, 2) if int8_ms > 0 else None,
+    }
+
+
+def quantize_models(
+    model_keys: list[str],
+    calibration_frames: list[np.ndarray],
+    holdout_frames: list[np.ndarray],
+    tolerance: float = 0.02,
+    method: str = "minmax",
+) -> dict:
+    """Quantize models and switch over those within tolerance
+
+    Returns:
+        report {model key: evaluate() result and "accepted" or "error"}
+    """
+    report = {}
+    for model_key in model_keys:
+        model_path = base + model_key + ".onnx"
+        quantized_path = base + model_key + ".int8.onnx"
+        candidate_path = base + model_key + ".int8.tmp.onnx"
+        if not Path(model_path).exists():
+            report[model_key] = {"error": f"{model_path} is not exported"}
+            print(f"[SKIPPED] {model_key}: {model_path} is not exported")
+            continue
+        try:
+            quantize_model(model_path, candidate_path, calibration_frames, method)
+            result = evaluate(model_path, candidate_path, holdout_frames)
+        except Exception as err:
+            Path(candidate_path).unlink(missing_ok=True)
+            report[model_key] = {"error": str(err)}
+            print(f"[FAILED] {model_key}: {err}")
+            continue
+
+        result["accepted"] = result["delta"] <= tolerance
+        if result["accepted"]:
+            Path(candidate_path).replace(quantized_path)
+        else:
+            Path(candidate_path).unlink()
+            Path(quantized_path).unlink(missing_ok=True)  # quantized with older calibration
+        report[model_key] = result
+        print(
+            f"[{'INT8' if result['accepted'] else 'FP32'}] {model_key}: delta {result['delta']}, "
+            f"{result['fp32_ms']} -> {result['int8_ms']} ms"
+        )
+    return report
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m source.quantization",
+        description="Quantize exported detectors to INT8 for CPU inference",
+    )
+    parser.add_argument(
+        "--calibration", nargs="+", required=True, help="recordings or glob patterns for calibration"
+    )
+    parser.add_argument("--holdout", nargs="+", required=True, help="clips for accuracy check")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        choices=quantizable_keys,
+        default=quantizable_keys,
+        help="default: every detector",
+    )
+    parser.add_argument("--frames", type=int, default=200, help="number of calibration frames")
+    parser.add_argument("--holdout-frames", type=int, default=100)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.02,
+        help="max allowed 1 - F1 of INT8 detections against FP32 ones",
+    )
+    parser.add_argument("--method", choices=list(calibration_methods), default="minmax")
+    args = parser.parse_args(argv)
+
+    calibration_frames = sample_frames(expand_video_paths(args.calibration), args.frames)
+    holdout_frames = sample_frames(expand_video_paths(args.holdout), args.holdout_frames)
+    if len(calibration_frames) == 0 or len(holdout_frames) == 0:
+        print("Can't read calibration or holdout frames")
+        return 1
+
+    report = quantize_models(
+        args.models, calibration_frames, holdout_frames, args.tolerance, args.method
+    )
+    with Path(report_path).open("w") as file:
+        yaml.safe_dump(report, file, sort_keys=False)
+    return int(any("error" in result for result in report.values()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
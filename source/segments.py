@@ -0,0 +1,403 @@
+"""Parallel processing of a long recording: the file is split into segments at keyframes, every
+segment runs in its own process and results are merged into one incident timeline
+
+Every segment starts reading `overlap` seconds before its start, so tracks and people near rooms
+are known at the boundary. Crossings of rooms are counted only by the segment, that owns their
+time, and are replayed in video time order, so room counts and incidents are the same as with
+processing of the whole file in one Tracker. Track ids of neighbouring segments are matched
+by boxes in the overlap.
+
+Examples:
+    python -m source.segments records/night.mp4 --config rooms.yaml --workers 32
+    python -m source.segments records/night.mp4 --session session.yaml --overlap 20 --start "2026-10-18 20:00:00"
+"""
+
+import argparse
+import bisect
+import os
+import sys
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+import yaml
+import cv2 as cv
+
+from .tracker import AI_names
+from .track_objects import IncidentLevel
+from .instrument_manager import format_incident, get_incident_name
+from .onnx_backend import box_iou
+from .session import build_track_objects
+from .stream_pipeline import StreamPipeline
+from .batch import (
+    model_keys,
+    expand_video_paths,
+    build_jobs,
+    get_output_names,
+    _init_worker,
+)
+
+
+def build_keyframe_index(path: str) -> tuple[list[float], float]:
+    """Keyframe times and duration of a video file in seconds, packets are only demuxed"""
+    capture = cv.VideoCapture(str(path))
+    if not capture.isOpened():
+        raise RuntimeError(f"Can't open video file: {path}")
+    capture.set(cv.CAP_PROP_FORMAT, -1)  # raw packets, nothing is decoded
+    fps = capture.get(cv.CAP_PROP_FPS) or 25.0
+    keyframes = []
+    duration = 0.0
+    index = 0
+    while capture.grab():
+        position = capture.get(cv.CAP_PROP_POS_MSEC) / 1000
+        if position <= 0 and index > 0:
+            position = index / fps
+        if capture.get(cv.CAP_PROP_LRF_HAS_KEY_FRAME):
+            keyframes.append(position)
+        duration = max(duration, position + 1 / fps)
+        index += 1
+    capture.release()
+    return sorted(keyframes) or [0.0], duration
+
+
+def split_segments(
+    keyframes: list[float], duration: float, count: int, overlap: float
+) -> list[dict]:
+    """
+    Args:
+        count: wanted number of segments, short files get less of them
+        overlap: seconds read before the start of a segment
+
+    Returns:
+        [{"index", "read_start", "start", "end"}] in seconds, end of the last segment is None
+    """
+
+    def keyframe_before(time: float) -> float:
+        return keyframes[max(0, bisect.bisect_right(keyframes, time) - 1)]
+
+    starts = [0.0]
+    for i in range(1, count):
+        start = keyframe_before(duration * i / count)
+        # a segment is longer than the overlap, otherwise it only repeats the previous one
+        if start - starts[-1] > overlap:
+            starts.append(start)
+    return [
+        {
+            "index": i,
+            "read_start": 0.0 if i == 0 else keyframe_before(start - overlap),
+            "start": start,
+            "end": starts[i + 1] if i + 1 < len(starts) else None,
+        }
+        for i, start in enumerate(starts)
+    ]
+
+
+def process_segment(job: dict, segment: dict, tail_from: float = None) -> dict:
+    """Runs in a worker process
+
+    Args:
+        segment: see split_segments
+        tail_from: read start of the next segment, tracks are kept from it for id stitching
+
+    Returns:
+        {"index", "frames", "seconds", "events", "head_tracks", "tail_tracks"}. Events are frames
+        with crossings or a curtains change: (time, room_id, [(track id, +1/-1)], is_closed),
+        tracks are {time in ms: [(track id, xyxy)]} of the overlaps
+    """
+    pipeline = StreamPipeline(
+        job["path"],
+        build_track_objects(job["data"]),
+        options=job["options"],
+        video_name=Path(job["path"]).name,
+        source_options=job.get("source_options"),
+        segment=(segment["read_start"], segment["end"]),
+    )
+    events, head_tracks, tail_tracks = [], {}, {}
+    try:
+        pipeline.open()
+        windows = list(pipeline.tracker.manager.objs.values())
+        for window in windows:
+            window.crossing_log = []
+        closed = {}
+        while not pipeline.step() is None:
+            time = pipeline.stream.position_msec / 1000
+            people = pipeline.tracker.last_detections.get(AI_names[0])
+            tracks = []
+            if not people is None and not people.ids is None:
+                tracks = [
+                    (int(id), [float(v) for v in xyxy])
+                    for id, xyxy in zip(people.ids, people.xyxy)
+                ]
+            if time < segment["start"]:
+                head_tracks[round(time * 1000)] = tracks
+            if not tail_from is None and time >= tail_from:
+                tail_tracks[round(time * 1000)] = tracks
+
+            for window in windows:
+                crossings = [(int(id), delta) for id, delta in window.crossing_log]
+                window.crossing_log.clear()
+                if time < segment["start"]:
+                    continue  # counted by the previous segment
+                if len(crossings) > 0 or closed.get(window.room_id) != window.is_closed:
+                    events.append((time, window.room_id, crossings, window.is_closed))
+                    closed[window.room_id] = window.is_closed
+    finally:
+        pipeline.close()
+    stats = pipeline.get_stats()
+    return {
+        "index": segment["index"],
+        "frames": stats["frames"],
+        "seconds": stats["seconds"],
+        "events": events,
+        "head_tracks": head_tracks,
+        "tail_tracks": tail_tracks,
+    }
+
+
+def match_track_ids(
+    tail_tracks: dict, head_tracks: dict, min_iou: float = 0.5
+) -> dict[int, int]:
+    """{id of the next segment: id of the previous one}, ids vote with boxes of common frames"""
+    votes = {}
+    for time, head in head_tracks.items():
+        tail = tail_tracks.get(time, [])
+        if len(head) == 0 or len(tail) == 0:
+            continue
+        iou = box_iou(
+            np.array([xyxy for _, xyxy in head], dtype=np.float32),
+            np.array([xyxy for _, xyxy in tail], dtype=np.float32),
+        )
+        for i, j in zip(*np.nonzero(iou >= min_iou)):
+            key = (head[i][0], tail[j][0])
+            votes[key] = votes.get(key, 0) + 1
+
+    matches = {}
+    used = set()
+    for (head_id, tail_id), _ in sorted(votes.items(), key=lambda item: -item[1]):
+        if head_id in matches or tail_id in used:
+            continue
+        matches[head_id] = tail_id
+        used.add(tail_id)
+    return matches
+
+
+def merge_segments(
+    results: list[dict], video_start: datetime, video_name: str
+) -> tuple[list[dict], list[dict]]:
+    """Replay crossings of every segment in video time order like DetectWindow and
+    InstrumentManager do frame by frame
+
+    Returns:
+        (crossings, incidents) of the timeline, track ids are global for the file
+    """
+    results = sorted(results, key=lambda result: result["index"])
+    mappings = []
+    next_id = 1
+    for i, result in enumerate(results):
+        mapping = {}
+        if i > 0:
+            previous = mappings[-1]
+            for head_id, tail_id in match_track_ids(
+                results[i - 1]["tail_tracks"], result["head_tracks"]
+            ).items():
+                if tail_id in previous:
+                    mapping[head_id] = previous[tail_id]
+        result["stitched_ids"] = len(mapping)
+        ids = {id for tracks in result["head_tracks"].values() for id, _ in tracks}
+        ids |= {id for tracks in result["tail_tracks"].values() for id, _ in tracks}
+        ids |= {id for _, _, crossings, _ in result["events"] for id, _ in crossings}
+        for id in sorted(ids - set(mapping)):
+            mapping[id] = next_id
+            next_id += 1
+        mappings.append(mapping)
+
+    contain, levels = {}, {}
+    crossings, incidents = [], []
+    for result, mapping in zip(results, mappings):
+        for time, room_id, frame_crossings, is_closed in result["events"]:
+            for id, delta in frame_crossings:
+                contain[room_id] = max(contain.get(room_id, 0) + delta, 0)
+                crossings.append(
+                    {
+                        "time": round(time, 3),
+                        "room_id": room_id,
+                        "track_id": mapping[id],
+                        "direction": "in" if delta > 0 else "out",
+                        "contain": contain[room_id],
+                    }
+                )
+            people = contain.get(room_id, 0)
+            if people == 0 and is_closed:
+                level = IncidentLevel.CLOSED_EMPTY
+            else:
+                level = IncidentLevel(int(people > 1) + int(people > 2))
+            if level == levels.get(room_id, IncidentLevel.NO_INCIDENT):
+                continue
+            levels[room_id] = level
+            incidents.append(
+                {
+                    "time": round(time, 3),
+                    "room_id": room_id,
+                    "level": level.value,
+                    "text": format_incident(
+                        video_start + timedelta(seconds=time),
+                        room_id,
+                        len(incidents) + 1,
+                        get_incident_name(level, people),
+                        level,
+                        video_name,
+                    ),
+                }
+            )
+    return crossings, incidents
+
+
+def process_recording(
+    job: dict,
+    out_dir: str,
+    name: str,
+    workers: int = None,
+    segment_count: int = None,
+    overlap: float = 10.0,
+    video_start: datetime = None,
+) -> dict:
+    """Process segments of the file in parallel, save merged incidents and timeline
+
+    Args:
+        job: see batch.build_jobs
+        segment_count: default is the number of workers
+        video_start: time of the first frame, default is modification time of the file minus its
+            duration (the file is modified last when its recording ends)
+    """
+    path = job["path"]
+    cpu_count = os.cpu_count() or 1
+    workers = max(1, workers or cpu_count)
+    started = datetime.now()
+
+    keyframes, duration = build_keyframe_index(path)
+    if video_start is None:
+        video_start = datetime.fromtimestamp(Path(path).stat().st_mtime - duration)
+    segments = split_segments(keyframes, duration, segment_count or workers, overlap)
+    print(
+        f"{path}: {duration:.0f} s, {len(keyframes)} keyframes, {len(segments)} segments"
+    )
+    # segments share the CPU, torch of every worker is limited before its first model is loaded
+    workers = min(workers, len(segments))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(max(1, cpu_count // workers),),
+    ) as executor:
+        futures = [
+            executor.submit(
+                process_segment,
+                job,
+                segment,
+                segments[i + 1]["read_start"] if i + 1 < len(segments) else None,
+            )
+            for i, segment in enumerate(segments)
+        ]
+        results = [future.result() for future in futures]
+
+    crossings, incidents = merge_segments(results, video_start, Path(path).name)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with (out_dir / f"{name}.incidents.txt").open("w") as file:
+        file.writelines(incident["text"] + "\n" for incident in incidents)
+    seconds = (datetime.now() - started).total_seconds()
+    frames = sum(result["frames"] for result in results)
+    stats = {
+        "path": str(path),
+        "duration": round(duration, 3),
+        "frames": frames,
+        "seconds": round(seconds, 3),
+        "fps": round(frames / seconds, 2) if seconds > 0 else 0.0,
+        "incidents": len(incidents),
+    }
+    timeline = {
+        **stats,
+        "video_start": str(video_start),
+        "segments": [
+            {
+                **segment,
+                "frames": result["frames"],
+                "seconds": result["seconds"],
+                "stitched_ids": result["stitched_ids"],
+            }
+            for segment, result in zip(segments, results)
+        ],
+        "crossings": crossings,
+        "incidents": incidents,
+    }
+    with (out_dir / f"{name}.timeline.yaml").open("w") as file:
+        yaml.safe_dump(timeline, file, allow_unicode=True, sort_keys=False)
+    return stats
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m source.segments",
+        description="Process long recordings in parallel segments without GUI",
+    )
+    parser.add_argument("videos", nargs="*", help="video files or glob patterns")
+    yaml_group = parser.add_mutually_exclusive_group(required=True)
+    yaml_group.add_argument("--config", help="config with DetectWindows")
+    yaml_group.add_argument("--session", help="session file saved from GUI")
+    parser.add_argument("--out", default="materials/out/segments", help="output folder")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        choices=model_keys,
+        help="enabled models, default: session options or all models",
+    )
+    parser.add_argument("--workers", type=int, help="default: number of CPUs")
+    parser.add_argument("--segments", type=int, help="default: number of workers")
+    parser.add_argument(
+        "--overlap",
+        type=float,
+        default=10.0,
+        help="seconds read before every segment to pick up tracks, default: 10",
+    )
+    parser.add_argument(
+        "--start",
+        type=datetime.fromisoformat,
+        help="time of the first frame, e.g. '2026-10-18 20:00:00', default: file modification time minus its duration",
+    )
+    args = parser.parse_args(argv)
+
+    videos = expand_video_paths(args.videos)
+    if args.config and len(videos) == 0:
+        parser.error("videos are required with --config")
+
+    jobs = build_jobs(videos, args.config or args.session, args.models)
+    if len(jobs) == 0:
+        print("Nothing to process")
+        return 1
+
+    failed = False
+    for job, name in zip(jobs, get_output_names(jobs)):
+        try:
+            stats = process_recording(
+                job,
+                args.out,
+                name,
+                workers=args.workers,
+                segment_count=args.segments,
+                overlap=args.overlap,
+                video_start=args.start,
+            )
+        except Exception as err:
+            print(f"[FAILED] {job['path']}: {err}")
+            failed = True
+            continue
+        print(
+            f"[DONE] {stats['path']}: {stats['frames']} frames, {stats['seconds']} s, "
+            f"[FPS] {stats['fps']}, {stats['incidents']} incidents"
+        )
+    return int(failed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import yaml
+from pathlib import Path
+from .track_objects import AbstractTrackObject, get_track_object_from_dict
+from .tracker import AI_names
+
+# decoding of a session entry's source, stored under "source_options" key
+default_source_options = {
+    "scale": 1.0,  # frames are downscaled right after decoding
+    "threads": 0,  # FFmpeg decoding threads, 0 - FFmpeg default
+    "full_res_curtains": False,  # curtains are classified on full resolution crops
+    "tiled_models": [],  # small object detectors, that run on tiles, e.g. ["tags", "bills"]
+    "tile_size": 640,
+    "tile_overlap": 0.2,
+    "dewarp": None,  # fisheye parameters, see dewarp.build_maps
+    "onnxruntime_models": [],  # detectors, that run on ONNX Runtime without ultralytics, e.g. ["bags"]
+    "onnxruntime_options": {},  # their sessions: intra_op_threads, inter_op_threads, graph_optimization, memory_arena
+    "target_fps": None,  # processing quality is lowered to hold it, see quality_controller
+    "people_detection_interval": 1,  # people are detected on every N-th frame, moved by optical flow between
+    "batch_size": 1,  # files are processed in batches of consecutive frames, see Tracker.track_frames
+    "model_cascade": {},  # model key -> condition on other models' results to run it, see model_cascade
+}
+
+
+def is_session(data: list[dict]) -> bool:
+    """Session files (EditConfigWindow.save_session) store dicts with "path", "options" and "data" keys,
+    config files (EditConfigWidget.save_config) store track objects' dicts"""
+    return len(data) > 0 and all("data" in entry and "path" in entry for entry in data)
+
+
+def load_yaml_list(path: str) -> list[dict]:
+    with Path(path).open("r") as file:
+        data = yaml.safe_load(file)
+    return data or []
+
+
+def build_track_objects(data: list[dict]) -> list[AbstractTrackObject]:
+    """Construct track objects from config dicts, dicts themselves are not changed"""
+    return [get_track_object_from_dict(dict(obj)) for obj in data]
+
+
+def get_additional_option(options: list[bool], index: int) -> bool:
+    """
+    Args:
+        options: options of a session entry, AI options (one per AI_names) followed by additional options
+        index: index inside additional options of the GUI (save video, log incidents, ...)
+
+    Options saved by older versions may be shorter, missing options are False
+    """
+    full_index = len(AI_names) + index
+    return len(options) > full_index and bool(options[full_index])
+
+
+def set_additional_option(options: list[bool], index: int, value: bool) -> list[bool]:
+    """Copy of options with the additional option set, see get_additional_option"""
+    options = list(options)
+    full_index = len(AI_names) + index
+    options.extend([False] * (full_index + 1 - len(options)))
+    options[full_index] = value
+    return options
+
+
+def get_source_options(entry: dict) -> dict:
+    return {**default_source_options, **(entry.get("source_options") or {})}
+
+
+def get_stream_options(source_options: dict) -> dict:
+    """VideoStream parameters of source options"""
+    return {
+        "scale": source_options["scale"],
+        "threads": source_options["threads"],
+        "keep_full_frame": source_options["full_res_curtains"],
+        "dewarp": source_options["dewarp"],
+    }
+
+
+def get_track_objects_scale(source_options: dict) -> float:
+    """Track objects of dewarped sources are drawn on the dewarped views, their size doesn't depend on scale"""
+    if source_options.get("dewarp"):
+        return 1.0
+    return source_options.get("scale", 1.0)
+
+
+def scale_track_objects(
+    data: list[AbstractTrackObject], scale: float
+) -> list[AbstractTrackObject]:
+    """Copies of track objects in coordinates of frames decoded with scale,
+    track objects are always stored in coordinates of the full resolution"""
+    if scale == 1.0:
+        return data
+    scaled = []
+    for obj in data:
+        obj_dict = obj.get_dict()
+        for i in range(1, 5):
+            obj_dict[f"point{i}"] = [round(v * scale) for v in obj_dict[f"point{i}"]]
+        scaled.append(get_track_object_from_dict(obj_dict))
+    return scaled
+
+
+def find_session_entry(session: list[dict], path: str) -> dict:
+    """Returns session's entry for the video with the same file name or the only entry of the session"""
+    for entry in session:
+        if Path(str(entry["path"])).resolve() == Path(path).resolve():
+            return entry
+    for entry in session:
+        if Path(str(entry["path"])).name == Path(path).name:
+            return entry
+    if len(session) == 1:
+        return session[0]
+    return None
@@ -0,0 +1,175 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+
+# header columns of every slot
+_SEQ, _HEIGHT, _WIDTH, _CHANNELS, _STATE, _LEASES = range(6)
+_HEADER_COLUMNS = 6
+
+# slot states
+_FREE, _WRITING, _READY = range(3)
+
+
+class SharedFrameRing:
+    """Ring of frame slots in shared memory, written by one process and mapped by others
+
+    Every slot has a header with the sequence number of the frame inside, its shape, state
+    and the number of consumers that currently map it. Writer never overwrites a mapped slot,
+    if every slot is mapped the frame is dropped. Consumer checks the sequence number, so a
+    frame that was overwritten before the consumer got to it is dropped as well.
+
+    Only slot headers are changed under the lock, frame data is copied without it.
+    """
+
+    def __init__(
+        self,
+        shm: shared_memory.SharedMemory,
+        lock,
+        slots: int,
+        frame_bytes: int,
+        owner: bool,
+    ):
+        self.shm = shm
+        self.lock = lock
+        self.slots = slots
+        self.frame_bytes = frame_bytes
+        self.owner = owner
+        header_bytes = slots * _HEADER_COLUMNS * 8
+        self._header_buf = shm.buf[:header_bytes]
+        self._data = shm.buf[header_bytes:]
+        self.header = np.ndarray(
+            (slots, _HEADER_COLUMNS), dtype=np.int64, buffer=self._header_buf
+        )
+        self._unlinked = False
+        self._closed = False
+        self._close_requested = False
+        self._local_leases = 0
+        self._seq = 0
+        self._next_slot = 0
+
+    @classmethod
+    def create(cls, lock, frame_shape: tuple[int], slots: int = 4):
+        """
+        Args:
+            lock: multiprocessing.Lock shared with consumers
+            frame_shape: max shape of frames, that will be written
+        """
+        frame_bytes = int(np.prod(frame_shape))
+        shm = shared_memory.SharedMemory(
+            create=True, size=slots * (_HEADER_COLUMNS * 8 + frame_bytes)
+        )
+        ring = cls(shm, lock, slots, frame_bytes, owner=True)
+        ring.header[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, info: dict, lock):
+        """
+        Args:
+            info: describe() of the ring from the writer process
+        """
+        shm = shared_memory.SharedMemory(name=info["name"])
+        return cls(shm, lock, info["slots"], info["frame_bytes"], owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def describe(self) -> dict:
+        return {"name": self.name, "slots": self.slots, "frame_bytes": self.frame_bytes}
+
+    def fits(self, frame: np.ndarray) -> bool:
+        return frame.dtype == np.uint8 and frame.nbytes <= self.frame_bytes
+
+    def _slot_array(self, slot: int, shape: tuple[int]) -> np.ndarray:
+        offset = slot * self.frame_bytes
+        size = int(np.prod(shape))
+        return np.ndarray(
+            shape, dtype=np.uint8, buffer=self._data[offset : offset + size]
+        )
+
+    def write(self, frame: np.ndarray) -> tuple[int, int]:
+        """Copy frame into a free slot
+
+        Returns:
+            (slot, seq) to send to consumers or None if every slot is mapped by consumers
+        """
+        with self.lock:
+            for i in range(self.slots):
+                slot = (self._next_slot + i) % self.slots
+                if self.header[slot, _LEASES] == 0:
+                    break
+            else:
+                return None
+            self._seq += 1
+            seq = self._seq
+            self.header[slot, _STATE] = _WRITING
+            self.header[slot, _SEQ] = seq
+
+        self._slot_array(slot, frame.shape)[...] = frame
+
+        with self.lock:
+            height, width = frame.shape[:2]
+            channels = frame.shape[2] if frame.ndim == 3 else 1
+            self.header[slot, [_HEIGHT, _WIDTH, _CHANNELS]] = height, width, channels
+            self.header[slot, _STATE] = _READY
+        self._next_slot = (slot + 1) % self.slots
+        return slot, seq
+
+    def acquire(self, slot: int, seq: int) -> np.ndarray:
+        """Map frame of the slot without copying, release(slot) must be called after use
+
+        Returns:
+            read-only array or None if the frame was already overwritten
+        """
+        with self.lock:
+            if (
+                self.header[slot, _SEQ] != seq
+                or self.header[slot, _STATE] != _READY
+            ):
+                return None
+            self.header[slot, _LEASES] += 1
+            height, width, channels = self.header[slot, [_HEIGHT, _WIDTH, _CHANNELS]]
+        self._local_leases += 1
+
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        frame = self._slot_array(slot, tuple(int(v) for v in shape))
+        frame.flags.writeable = False
+        return frame
+
+    def release(self, slot: int):
+        if self._closed:
+            return
+        with self.lock:
+            if self.header[slot, _LEASES] > 0:
+                self.header[slot, _LEASES] -= 1
+        self._local_leases = max(0, self._local_leases - 1)
+        if self._close_requested and self._local_leases == 0:
+            self.close()
+
+    def close(self) -> bool:
+        """Unmap the ring, writer also removes it from the system
+
+        If frames from acquire() are not released yet, the ring is unmapped after the last release()
+
+        Returns:
+            True if the ring is unmapped now
+        """
+        if self._closed:
+            return True
+        if self.owner and not self._unlinked:
+            self.shm.unlink()
+            self._unlinked = True
+        if self._local_leases > 0:
+            self._close_requested = True
+            return False
+
+        self._closed = True
+        self.header = None
+        self._header_buf.release()
+        self._data.release()
+        try:
+            self.shm.close()
+        except BufferError:  # some acquired array is still referenced, mapping dies with it
+            pass
+        return True
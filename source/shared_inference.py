@@ -0,0 +1,100 @@
+from collections import OrderedDict
+import threading
+import numpy as np
+
+from .detections import Detections
+from .tracker import load_model, tracked_names
+
+
+class SharedInference:
+    """Models and their results for every Tracker of one shared capture
+
+    Every model is loaded once and runs once per frame, other Trackers get cached Detections.
+    People and TSDs are tracked by a single ByteTrack state, so track ids are the same in every viewer.
+    Their results are shared per frame regardless of the viewers' inference variants.
+    """
+
+    def __init__(self, history: int = 16):
+        """
+        Args:
+            history: how many frames of results are kept for Trackers that are behind
+        """
+        self.history = history
+        self.lock = threading.Lock()
+        self.models = {}  # (model_name, backend) -> model
+        self.model_locks: dict[str, threading.Lock] = {}
+        self.results: dict[str, OrderedDict[tuple, Detections]] = {}  # (seq, variant) -> result
+        self.computed = 0
+        self.reused = 0
+
+    def get_model(
+        self, model_name: str, backend: str = "ultralytics", session_options: dict = None
+    ):
+        """Options of the Tracker that loads the model first are used"""
+        with self.lock:
+            if not (model_name, backend) in self.models:
+                self.models[(model_name, backend)] = load_model(
+                    model_name, backend, session_options
+                )
+                self.model_locks.setdefault(model_name, threading.Lock())
+                self.results.setdefault(model_name, OrderedDict())
+            return self.models[(model_name, backend)]
+
+    def infer(self, tracker, model_name: str, seq: int, frame: np.ndarray) -> Detections:
+        """Detections of the model on frame seq, computed by the first Tracker that asks
+
+        Args:
+            tracker: Tracker that asks, runs the model if the result isn't cached
+        """
+        results = self.results[model_name]
+        if model_name in tracked_names:
+            # one ByteTrack state steps once per frame, whatever input size a viewer's quality level
+            # asks for; the first viewer's variant is used for everyone
+            key = (seq, None)
+        else:
+            key = (seq, tracker.get_inference_variant(model_name))
+        with self.model_locks[model_name]:
+            if key in results:
+                self.reused += 1
+                return results[key]
+
+            if model_name in tracked_names and len(results) > 0:
+                last_key = next(reversed(results))
+                if seq < last_key[0]:
+                    # ByteTrack can't go back in time, Tracker behind the others gets the latest tracks
+                    self.reused += 1
+                    return results[last_key]
+
+            model = self.models[(model_name, tracker.get_backend(model_name))]
+            detections = tracker.infer(model, model_name, frame)
+            self.computed += 1
+            results[key] = detections
+            while len(results) > self.history:
+                results.popitem(last=False)
+            return detections
+
+
+class InferenceRegistry:
+    """SharedInference of every shared capture, dropped with the last Tracker"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inferences = {}  # capture -> [SharedInference, users]
+
+    def acquire(self, capture) -> SharedInference:
+        with self.lock:
+            if not capture in self.inferences:
+                self.inferences[capture] = [SharedInference(), 0]
+            self.inferences[capture][1] += 1
+            return self.inferences[capture][0]
+
+    def release(self, capture):
+        with self.lock:
+            if not capture in self.inferences:
+                return
+            self.inferences[capture][1] -= 1
+            if self.inferences[capture][1] == 0:
+                self.inferences.pop(capture)
+
+
+inference_registry = InferenceRegistry()
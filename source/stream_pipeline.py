@@ -0,0 +1,365 @@
+from pathlib import Path
+from collections import deque
+from datetime import datetime, timedelta
+import numpy as np
+import time
+from typing import TYPE_CHECKING
+
+from .tracker import Tracker, AI_names
+from .track_objects import AbstractTrackObject
+from .video_stream import VideoStream, StridedFileReader, is_online_source
+from .capture_manager import capture_manager
+from .shared_inference import inference_registry
+from .quality_controller import QualityController, build_levels
+from .detection_store import DetectionStoreWriter
+from .session import (
+    default_source_options,
+    get_stream_options,
+    get_track_objects_scale,
+    scale_track_objects,
+)
+
+if TYPE_CHECKING:
+    from vidgear.gears import WriteGear
+
+
+def create_video_writer(output_path: str) -> "WriteGear":
+    from vidgear.gears import WriteGear
+
+    output_params = {
+        "-input_framerate": 25,
+        "-vcodec": "libx264",  # Кодек для MP4
+    }
+    return WriteGear(
+        output=str(Path(output_path)),
+        compression_mode=False,
+        **output_params,
+    )
+
+
+class StreamPipeline:
+    """Capture -> Tracker loop for a single source without any Qt dependency"""
+
+    def __init__(
+        self,
+        path: str,
+        data: list[AbstractTrackObject],
+        options: list[bool],
+        video_out_path: str = None,
+        save_incidents: bool = False,
+        incidents_path: str = None,
+        video_name: str = None,
+        verbose: bool = False,
+        collect_incidents: bool = False,
+        shared_capture: bool = False,
+        decode_stride: int = 1,
+        source_options: dict = None,
+        segment: tuple[float, float] = None,
+        video_start: datetime = None,
+        detection_store_path: str = None,
+    ):
+        """
+        Args:
+            path: video file or stream url
+            data: DetectWindows of the source
+            options: AI options, additional options after len(AI_names) are ignored
+            video_out_path: where to save annotated video. If None: won't be saved
+            incidents_path: file for incidents if save_incidents, see Tracker
+            collect_incidents: keep incidents for pop_incidents()
+            shared_capture: receive frames from capture_manager, so pipelines of this process
+                showing the same source decode it once and run every model on a frame once
+            decode_stride: for video files, process only every decode_stride-th frame while nobody
+                is near a DetectWindow. Skipped frames aren't converted into arrays, incidents get
+                video time instead of processing time. Not used with shared_capture
+            source_options: decoding options, see session.default_source_options. Track objects
+                are in full resolution (or dewarped view) coordinates and rescaled here.
+                With "target_fps" quality of processing is adjusted to hold it, see QualityController.
+                With "batch_size" frames of a file are read ahead and processed in batches, see
+                Tracker.track_frames. Not used with shared_capture and decode_stride
+            segment: (start, end) seconds of a video file to process, end is None for the end of
+                the file. Frames are read like with decode_stride, see source.segments
+            video_start: time of the first frame of a file, incidents of decode_stride and segment
+                get it plus video position. Default is when processing starts
+            detection_store_path: folder for raw results of models, counting can be replayed
+                from it with other DetectWindows, see source.detection_store
+        """
+        self.path = path
+        self.source_options = {**default_source_options, **(source_options or {})}
+        self.data = scale_track_objects(
+            data, get_track_objects_scale(self.source_options)
+        )
+        self.options = list(options[: len(AI_names)])
+        self.video_out_path = video_out_path
+        self.detection_store_path = detection_store_path
+        self.detection_store = None
+        self.save_incidents = save_incidents
+        self.incidents_path = incidents_path
+        self.video_name = video_name
+        self.verbose = verbose
+        self.collect_incidents = collect_incidents
+        self.shared_capture = shared_capture
+        self.decode_stride = max(1, decode_stride)
+        self.segment = segment
+        self.strided = (
+            (self.decode_stride > 1 or not segment is None)
+            and not shared_capture
+            and not is_online_source(path)
+        )
+        self.batch_size = max(1, self.source_options["batch_size"])
+        self.batched = (
+            self.batch_size > 1
+            and not shared_capture
+            and not self.strided
+            and not is_online_source(path)
+        )
+        self.pending = deque()  # processed frames of the current batch
+
+        self.tracker = None
+        self.stream = None
+        self.subscription = None
+        self.inference = None
+        self.seq = None
+        self.video_start = video_start
+        self.skipped = 0
+        self.quality = None
+        self.frame_step = 1  # decode stride of the quality level
+        self.full_frame = None
+        self.writer = None
+        self.frames = 0
+        self.start_time = None
+        self.end_time = None
+
+    def open(self):
+        if self.shared_capture:
+            self.subscription = capture_manager.subscribe(
+                self.path, **self.get_stream_options()
+            )
+            self.inference = inference_registry.acquire(self.subscription.capture)
+        elif self.strided:
+            self.stream = StridedFileReader(
+                self.path, **self.get_stream_options()
+            ).start()
+            if not self.segment is None and self.segment[0] > 0:
+                self.stream.seek(self.segment[0] * 1000)
+            self.video_start = self.video_start or datetime.now()
+        else:
+            self.stream = VideoStream(self.path, **self.get_stream_options()).start()
+        if not self.video_out_path is None:
+            Path(self.video_out_path).parent.mkdir(parents=True, exist_ok=True)
+            self.writer = create_video_writer(self.video_out_path)
+        if not self.detection_store_path is None:
+            self.detection_store = DetectionStoreWriter(
+                self.detection_store_path,
+                meta={
+                    "path": str(self.path),
+                    "video_name": self.video_name or Path(self.path).name,
+                    "people_model": Path(AI_names[0]).name,
+                    "track_objects_scale": get_track_objects_scale(self.source_options),
+                },
+            )
+        self.tracker = Tracker(
+            self.data,
+            video_out=self.writer,
+            options=self.options,
+            verbose=self.verbose,
+            save_incidents=self.save_incidents,
+            incidents_path=self.incidents_path,
+            video_name=self.video_name,
+            collect_incidents=self.collect_incidents,
+            inference=self.inference,
+            tiling={
+                "models": self.source_options["tiled_models"],
+                "tile_size": self.source_options["tile_size"],
+                "overlap": self.source_options["tile_overlap"],
+            },
+            onnxruntime_models=self.source_options["onnxruntime_models"],
+            onnxruntime_options=self.source_options["onnxruntime_options"],
+            detection_store=self.detection_store,
+            background_loading=True,
+            people_interval=self.source_options["people_detection_interval"],
+            cascade=self.source_options["model_cascade"],
+            frame_shape=self.get_frame_shape(),
+        )
+        if is_online_source(self.path):
+            # live streams are counted as soon as the first model (people) is ready,
+            # the other models join when they are loaded
+            self.tracker.wait_models(self.tracker.loader.model_names[:1])
+        else:
+            self.tracker.wait_models()  # every frame of a file gets every model
+        if self.source_options["target_fps"]:
+            self.quality = QualityController(
+                self.source_options["target_fps"],
+                build_levels(self.tracker.loader.model_names, len(self.tracker.tilers) > 0),
+                name=self.video_name or str(self.path),
+            )
+        self.start_time = time.time()
+        return self
+
+    def get_stream_options(self) -> dict:
+        return get_stream_options(self.source_options)
+
+    def get_frame_shape(self) -> tuple[int]:
+        """Shape of frames after scaling and dewarping, None if the source doesn't tell it"""
+        if not self.subscription is None:
+            return self.subscription.capture.frame_shape
+        return self.stream.frame_shape
+
+    def read(self) -> np.ndarray:
+        """Next frame, its sequence number in the shared capture is kept in self.seq"""
+        if self.strided:
+            frame = self.read_strided()
+            self.full_frame = self.stream.full_frame
+            return frame
+        if self.subscription is None:
+            frame = self.stream.read()
+            self.full_frame = self.stream.full_frame
+            return frame
+        frame_ref = self.subscription.read()
+        if frame_ref is None:
+            return None
+        # Tracker draws on the frame, shared one is read-only
+        frame = frame_ref.frame.copy()
+        self.full_frame = frame_ref.full_frame  # is only cropped
+        self.seq = frame_ref.seq
+        frame_ref.release()
+        return frame
+
+    def read_strided(self) -> np.ndarray:
+        """Sample densely while someone is near a DetectWindow, sparsely otherwise"""
+        stride = self.frame_step
+        if self.frames > 0 and not self.tracker.manager.needs_dense_sampling(
+            self.decode_stride * self.frame_step
+        ):
+            stride = self.decode_stride * self.frame_step
+        frame = self.stream.read(skip=stride - 1)
+        self.skipped = self.stream.grabbed
+        if (
+            not frame is None
+            and not self.segment is None
+            and not self.segment[1] is None
+            and self.stream.position_msec >= self.segment[1] * 1000
+        ):
+            return None  # the next segment starts here
+        if not frame is None:
+            self.tracker.manager.frame_time = self.video_start + timedelta(
+                milliseconds=self.stream.position_msec
+            )
+        return frame
+
+    def step(self, render: bool = False) -> tuple[np.ndarray, dict]:
+        """Read and process next frame
+
+        Returns:
+            (frame, frame_info) from Tracker.track_frame or None if the stream has ended
+        """
+        if self.batched:
+            return self.step_batch(render)
+        if not self.strided:
+            for _ in range(self.frame_step - 1):  # dropped by the quality level
+                if self.read() is None:
+                    return None
+                self.skipped += 1
+        frame = self.read()
+        if frame is None:
+            return None
+
+        start = time.perf_counter()
+        result = self.tracker.track_frame(
+            frame, render=render, seq=self.seq, full_frame=self.full_frame
+        )
+        self.frames += 1
+        if not self.quality is None:
+            settings = self.quality.update(time.perf_counter() - start)
+            if not settings is None:
+                self.set_quality(settings)
+        return result
+
+    def step_batch(self, render: bool = False) -> tuple[np.ndarray, dict]:
+        """Next processed frame, a batch of frames is read and processed when the previous one
+        is returned"""
+        if len(self.pending) > 0:
+            return self.pending.popleft()
+        frames, full_frames = [], []
+        while len(frames) < self.batch_size:
+            for _ in range(self.frame_step - 1):  # dropped by the quality level
+                if self.read() is None:
+                    break
+                self.skipped += 1
+            frame = self.read()
+            if frame is None:
+                break
+            frames.append(frame)
+            full_frames.append(self.full_frame)
+        if len(frames) == 0:
+            return None
+
+        start = time.perf_counter()
+        self.pending.extend(
+            self.tracker.track_frames(frames, render=render, full_frames=full_frames)
+        )
+        self.frames += len(frames)
+        if not self.quality is None:
+            settings = self.quality.update((time.perf_counter() - start) / len(frames))
+            if not settings is None:
+                self.set_quality(settings)
+        return self.pending.popleft()
+
+    def set_quality(self, settings: dict):
+        self.tracker.set_quality(settings)
+        self.frame_step = settings["decode_stride"]
+
+    def run(self, should_stop=None):
+        """Process the stream to the end or until should_stop() returns True"""
+        while should_stop is None or not should_stop():
+            if self.step() is None:
+                break
+
+    def pop_incidents(self) -> list[str]:
+        if self.tracker is None:
+            return []
+        return self.tracker.manager.pop_incidents()
+
+    def close(self):
+        self.end_time = time.time()
+        if not self.writer is None:
+            self.writer.close()
+            self.writer = None
+        if not self.detection_store is None:
+            self.detection_store.close()
+            self.detection_store = None
+        if not self.stream is None:
+            self.stream.stop()
+            self.stream = None
+        if not self.subscription is None:
+            inference_registry.release(self.subscription.capture)
+            self.inference = None
+            self.subscription.close()
+            self.subscription = None
+        if not self.tracker is None:
+            self.tracker.close()
+
+    def get_people_frames(self) -> dict:
+        """Frames with detected and predicted people, see Tracker.people_propagator"""
+        if self.tracker is None or self.tracker.people_propagator is None:
+            return None
+        propagator = self.tracker.people_propagator
+        return {"detected": propagator.detected, "predicted": propagator.predicted}
+
+    def get_stats(self) -> dict:
+        end_time = self.end_time or time.time()
+        seconds = end_time - self.start_time if self.start_time else 0.0
+        return {
+            "path": str(self.path),
+            "frames": self.frames,
+            "seconds": round(seconds, 3),
+            "fps": round(self.frames / seconds, 2) if seconds > 0 else 0.0,
+            "skipped": self.skipped,
+            "models": {} if self.tracker is None else self.tracker.get_model_stats(),
+            "people_frames": self.get_people_frames(),
+            "cascade": {} if self.tracker is None else self.tracker.cascade.get_stats(),
+            "quality": (
+                None
+                if self.quality is None
+                else {"level": self.quality.level, "decisions": self.quality.history}
+            ),
+        }
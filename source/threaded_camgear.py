@@ -1,5 +1,4 @@
 from PyQt6.QtCore import QThread, QObject, pyqtSignal, QMutex, QMutexLocker, QTimer
-from vidgear.gears import CamGear
 from typing import Any
 from datetime import datetime
 
@@ -47,6 +46,8 @@ class _CamWorker(QObject):
             options (dict): provides ability to alter Source Tweak Parameters.
         """
         try:
+            from vidgear.gears import CamGear  # deferred, the GUI starts without it
+
             self.camgear = CamGear(**cam_options)
         except Exception as err:
             self.error.emit(str(err))
@@ -0,0 +1,154 @@
+import cv2 as cv
+import numpy as np
+
+from .detections import Detections
+
+
+def make_tiles(
+    width: int, height: int, tile_size: int, overlap: float
+) -> list[tuple[int]]:
+    """Overlapping square tiles (x1, y1, x2, y2) covering the frame, edge tiles are shifted inside"""
+
+    def starts(length: int) -> list[int]:
+        if length <= tile_size:
+            return [0]
+        step = max(1, int(tile_size * (1 - overlap)))
+        values = list(range(0, length - tile_size, step))
+        values.append(length - tile_size)
+        return values
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def merge_tile_detections(
+    tile_detections: list[Detections], offsets: list[tuple[int]], iou: float = 0.5
+) -> Detections:
+    """Move boxes into frame coordinates and drop duplicates from overlapping tiles with per class NMS"""
+    xyxy, classes, confs = [], [], []
+    for detections, (x, y) in zip(tile_detections, offsets):
+        if len(detections) == 0:
+            continue
+        xyxy.append(detections.xyxy + np.array([x, y, x, y], dtype=detections.xyxy.dtype))
+        classes.extend(detections.classes)
+        confs.append(detections.confs)
+    if len(xyxy) == 0:
+        return Detections()
+
+    xyxy = np.concatenate(xyxy)
+    confs = np.concatenate(confs)
+    class_indices = {name: i for i, name in enumerate(dict.fromkeys(classes))}
+    keep = cv.dnn.NMSBoxesBatched(
+        [[float(x1), float(y1), float(x2 - x1), float(y2 - y1)] for x1, y1, x2, y2 in xyxy],
+        confs.astype(float).tolist(),
+        [class_indices[name] for name in classes],
+        0.0,
+        iou,
+    )
+    keep = np.array(keep, dtype=int).reshape(-1)
+    return Detections(
+        xyxy=xyxy[keep],
+        classes=[classes[i] for i in keep],
+        confs=confs[keep],
+    )
+
+
+class TiledInference:
+    """Runs a model on tiles of a large frame, so small objects aren't lost in the 640 letterbox
+
+    Only tiles that intersect a region of interest or have motion since the previous frame are processed.
+    """
+
+    def __init__(
+        self,
+        rois: list[tuple[int]],
+        tile_size: int = 640,
+        overlap: float = 0.2,
+        motion_threshold: int = 12,
+        motion_pixels: int = 2,
+    ):
+        """
+        Args:
+            rois: (x1, y1, x2, y2) regions that are always processed
+            motion_threshold: absolute difference of a gray pixel of the 1/8 frame, that counts as changed
+            motion_pixels: changed pixels of the 1/8 frame, that count as motion in a tile. A mean over
+                the tile would miss a small mover, it changes only a few pixels of it
+        """
+        self.rois = rois
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.motion_threshold = motion_threshold
+        self.motion_pixels = motion_pixels
+        self.tiles = []
+        self._shape = None
+        self._previous = None
+        self._batching = True
+
+    def _intersects_roi(self, tile: tuple[int]) -> bool:
+        x1, y1, x2, y2 = tile
+        return any(
+            x1 < rx2 and rx1 < x2 and y1 < ry2 and ry1 < y2
+            for rx1, ry1, rx2, ry2 in self.rois
+        )
+
+    def select_tiles(self, frame: np.ndarray) -> list[tuple[int]]:
+        height, width = frame.shape[:2]
+        if self._shape != (height, width):
+            self._shape = (height, width)
+            self.tiles = make_tiles(width, height, self.tile_size, self.overlap)
+            self._previous = None
+
+        # motion is checked on a small copy, it only has to find active tiles. Area averaging keeps
+        # small objects in it and suppresses noise of single pixels
+        factor = 8
+        gray = cv.cvtColor(
+            cv.resize(
+                frame,
+                (max(1, width // factor), max(1, height // factor)),
+                interpolation=cv.INTER_AREA,
+            ),
+            cv.COLOR_BGR2GRAY,
+        )
+        previous = self._previous
+        self._previous = gray
+        if not previous is None:
+            changed = (cv.absdiff(gray, previous) > self.motion_threshold).astype(np.uint8)
+
+        selected = []
+        for tile in self.tiles:
+            if self._intersects_roi(tile):
+                selected.append(tile)
+                continue
+            if previous is None:
+                selected.append(tile)
+                continue
+            x1, y1, x2, y2 = (v // factor for v in tile)
+            if cv.countNonZero(changed[y1:y2, x1:x2]) >= self.motion_pixels:
+                selected.append(tile)
+        return selected
+
+    def infer(self, model, frame: np.ndarray, **predict_args) -> Detections:
+        tiles = self.select_tiles(frame)
+        if len(tiles) == 0:
+            return Detections()
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+
+        results = None
+        if self._batching and len(crops) > 1:
+            try:
+                results = list(model.predict(crops, stream=True, **predict_args))
+            except Exception as err:  # exported with static batch size
+                print(f"Batched tiles failed, tiles will be processed one by one: {err}")
+                self._batching = False
+        if results is None:
+            results = []
+            for crop in crops:
+                results.extend(model.predict(crop, stream=True, **predict_args))
+
+        return merge_tile_detections(
+            [Detections.from_result(result) for result in results],
+            [(x1, y1) for x1, y1, _, _ in tiles],
+        )
@@ -4,17 +4,16 @@ from collections import deque
 from shapely import LineString, Polygon, Point
 from enum import Enum
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from GUI.graphic_items import AbstractActivatedIdGraphicsItem
 
 import sys
 import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from GUI.graphic_items import (
-    NgonItem,
-    AbstractActivatedIdGraphicsItem,
-)
-
 
 def get_track_object_from_dict(data: dict):
     obj_type = data.pop("type")
@@ -38,7 +37,7 @@ class AbstractTrackObject(ABC):
         pass
 
     @abstractmethod
-    def get_qt_graphic_item(self) -> AbstractActivatedIdGraphicsItem:
+    def get_qt_graphic_item(self) -> "AbstractActivatedIdGraphicsItem":
         pass
 
     @abstractmethod
@@ -91,6 +90,7 @@ class DetectWindow(AbstractTrackObject):
         )
 
         shift = accuracy // 2
+        self.attention_band = shift
 
         outer_attention_field = np.array(
             [
@@ -107,8 +107,10 @@ class DetectWindow(AbstractTrackObject):
         self.attention_polygon = Polygon(outer_attention_field)
 
         self.nearby = {}
+        self.missed = {}  # id of nearby -> processed frames since it was seen
         self.is_closed = False
         self.contain = 0
+        self.crossing_log = None  # (id, +1 in / -1 out) of crossings if it's a list
 
         self.incident_level = [IncidentLevel.NO_INCIDENT, IncidentLevel.NO_INCIDENT]
         self.intersected = False
@@ -152,6 +154,8 @@ class DetectWindow(AbstractTrackObject):
                     self.contain -= 1
                 elif prev - act == -2:
                     self.contain += 1
+                if abs(prev - act) == 2 and not self.crossing_log is None:
+                    self.crossing_log.append((id, (act - prev) // 2))
 
                 self.contain = max(self.contain, 0)
 
@@ -165,10 +169,15 @@ class DetectWindow(AbstractTrackObject):
     ):
         for id, point in ids_points:
             corr_point = Point(*point)
+            self.missed.pop(id, None)
             if not self.attention_polygon.contains(corr_point):
                 self.nearby.pop(id, None)
             else:
                 self.__update(id, corr_point)
+        seen = {id for id, _ in ids_points}
+        for id in self.nearby:
+            if not id in seen:
+                self.missed[id] = self.missed.get(id, 0) + 1
         self.incident_level[0] = self.incident_level[1]
         self.incident_level[1] = IncidentLevel(
             int(self.contain > 1) + int(self.contain > 2)
@@ -185,10 +194,21 @@ class DetectWindow(AbstractTrackObject):
 
         return region
 
+    def has_people_nearby(self, lost_track_frames: int) -> bool:
+        """Someone is in the attention polygon. A track lost there is still counted if it comes back,
+        but isn't waited for longer than lost_track_frames"""
+        return any(self.missed.get(id, 0) <= lost_track_frames for id in self.nearby)
+
+    def is_near(self, point: tuple[float], band: float) -> bool:
+        """point is closer than band to the room polygon"""
+        return self.exact_polygon.distance(Point(*point)) <= band
+
     def get_incident(self) -> tuple[int, tuple[IncidentLevel]]:
         return (self.room_id, self.incident_level)
 
     def get_qt_graphic_item(self):
+        from GUI.graphic_items import NgonItem  # Qt is imported only by GUI users
+
         data = []
         for x, y in self.xy_s:
             data.append(x)
@@ -1,13 +1,30 @@
 import cv2 as cv
-from ultralytics import YOLO
+import yaml
 from .instrument_manager import InstrumentManager
 import numpy as np
-from vidgear.gears import WriteGear
 from pathlib import Path
 from .track_objects import AbstractTrackObject
-from torch import cuda
+from .detections import Detections
+from .tiling import TiledInference
+from .preprocess import PreprocessCache, get_input_size, unletterbox
+from .onnx_backend import OnnxDetector
+from .model_loader import ModelLoader
+from .motion_prediction import BoxPropagator
+from .model_cascade import ModelCascade
+from .device import cuda_available, get_device
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+    from vidgear.gears import WriteGear
+    from .shared_inference import SharedInference
+    from .detection_store import DetectionStoreWriter
 
 base = "materials/trained_models/"
+default_incidents_path = "materials/out/Incident.txt"
+
 AI_names = [
     base + "yolo11n-pose",  # 0
     base + "TSD",  # 1
@@ -18,6 +35,50 @@ AI_names = [
     base + "tags",  # 6
     base + "bags",  # 7
 ]
+tracked_names = AI_names[:2]  # ByteTrack ids are kept between frames
+
+
+def get_track_buffer(tracker_name: str) -> int:
+    """Frames, during which a lost track can come back with its id (track_buffer of ByteTrack)"""
+    path = Path(tracker_name)
+    if path.exists():
+        with path.open("r") as file:
+            return int((yaml.safe_load(file) or {}).get("track_buffer", 30))
+    return 30  # default of ultralytics tracker configs
+
+
+def get_model_onnx_path(model_name: str) -> str:
+    """INT8 model on CPU if it passed the accuracy check of source.quantization"""
+    if not cuda_available() and Path(model_name + ".int8.onnx").exists():
+        return model_name + ".int8.onnx"
+    return model_name + ".onnx"
+
+
+def load_model(
+    model_name: str, backend: str = "ultralytics", session_options: dict = None
+) -> "YOLO | OnnxDetector":
+    """
+    Args:
+        backend: "ultralytics" or "onnxruntime", ONNX Runtime runs detectors that aren't tracked
+        session_options: ONNX Runtime options of the onnxruntime backend, see onnx_backend.create_session
+    """
+    if backend == "onnxruntime":
+        if model_name in tracked_names or model_name == AI_names[2]:
+            print(f"ONNX Runtime backend is not supported for {Path(model_name).name}")
+        else:
+            return OnnxDetector(
+                get_model_onnx_path(model_name),
+                device=get_device(),
+                **(session_options or {}),
+            )
+    from ultralytics import YOLO  # torch is imported only when processing starts
+
+    path = get_model_onnx_path(model_name)
+    if Path(model_name + ".engine").exists():
+        path = model_name + ".engine"
+    if model_name == AI_names[2]:
+        return YOLO(path, task="classify")
+    return YOLO(path)
 
 
 class Tracker:
@@ -25,56 +86,334 @@ class Tracker:
     def __init__(
         self,
         data: list[AbstractTrackObject],
-        video_out: WriteGear = None,
+        video_out: "WriteGear" = None,
         tracker_name: str = None,
         options: list[bool] = None,
         verbose: bool = False,
         save_incidents: bool = False,
+        incidents_path: str = None,
+        video_name: str = None,
+        collect_incidents: bool = False,
+        inference: "SharedInference" = None,
+        tiling: dict = None,
+        shared_preprocess: bool = True,
+        onnxruntime_models: list[str] = None,
+        onnxruntime_options: dict = None,
+        background_loading: bool = False,
+        frame_shape: tuple[int] = None,
+        people_interval: int = 1,
+        cascade: dict = None,
+        detection_store: "DetectionStoreWriter" = None,
     ):
         """
         Args:
             data: list of Borders and DetectWindows
             tracker_name: default is bytetrack.yaml
+            incidents_path: where to save incidents if save_incidents, default is materials/out/Incident.txt
+            video_name: video's name, that will be used in incidents
+            collect_incidents: keep incidents for InstrumentManager.pop_incidents()
+            inference: models and results shared by every Tracker of the same capture
+            tiling: {"models": model file names, "tile_size", "overlap"}. Listed small object detectors
+                run on overlapping tiles around DetectWindows and motion instead of the whole frame
+            shared_preprocess: letterbox the frame once per input size for every model, see PreprocessCache
+            onnxruntime_models: model file names, that run on ONNX Runtime directly, see OnnxDetector
+            onnxruntime_options: threads, graph optimization and memory arena of their sessions,
+                see onnx_backend.create_session
+            background_loading: load models on a background thread, people model first. A model is
+                skipped by track_frame until it's ready, see wait_models
+            frame_shape: expected shape of frames, models are warmed up on a dummy frame of it.
+                None - 720p
+            people_interval: run the people detector on every N-th frame and move tracks with optical
+                flow in between. Every frame is detected while someone is near a DetectWindow
+            cascade: rules, on which a model runs only if other models found something, see ModelCascade
+            detection_store: raw results of every frame are saved into it for replay of counting
         """
-        self.device = "cuda" if cuda.is_available() else "cpu"
+        self.device = get_device()
         print(f"Using device: {self.device}")
+        self.created = time.time()
+        self.frame_shape = frame_shape or (720, 1280, 3)
+        self.first_results = {}  # name -> seconds from creation to the first result
 
+        self.inference = inference
+        self.backends = {
+            base + model_key: "onnxruntime" for model_key in onnxruntime_models or []
+        }
+        self.onnxruntime_options = onnxruntime_options or {}
         self.models = []
+        load_names = []
         for option, model_name in zip(
             options, [*AI_names, *([None] * (len(options) - len(AI_names)))]
         ):
             if option and (not model_name is None):
-
-                path = model_name + ".onnx"
-                if Path(model_name + ".engine").exists():
-                    path = model_name + ".engine"
-                if model_name == AI_names[2]:
-                    self.models.append(YOLO(path, task="classify"))
-                else:
-                    self.models.append(YOLO(path))
+                load_names.append(model_name)
+                self.models.append(None)  # set by the loader when the model is ready
             elif model_name == AI_names[2]:
                 self.models.append("curtains")
             else:
                 self.models.append(None)
 
         self.video_out = video_out
+        self.detection_store = detection_store
         self.verbose = verbose
         self.tracker_name = tracker_name or "bytetrack.yaml"
         if save_incidents:
-            incidents_path = "materials/out/Incident.txt"
+            incidents_path = incidents_path or default_incidents_path
         else:
             incidents_path = None
         self.manager = InstrumentManager(
             incidents_path=incidents_path,
-            video_name="1",
+            video_name=video_name or "1",
             initialize_curtains_model=options[2],
+            collect_incidents=collect_incidents,
         )
         self.manager.load_data(data)
 
-    def get_model_result(
-        self, model, name, frame_in, frame_out
-    ) -> tuple[np.ndarray, list]:
+        self.preprocess = PreprocessCache(self.device) if shared_preprocess else None
+        self._raw_input_models = set()
+        self._unbatched_models = set()
+        self.batch_detections = {}  # name -> detections of the current frame from track_frames
+
+        # quality knobs, see set_quality
+        self.tiling_enabled = True
+        self.model_stride = 1
+        self.input_sizes = {}  # name -> inference input size
+        self.frame_index = 0
+        self.last_detections = {}
+        self.frame_detections = {}  # name -> detections of the current frame
+
+        self.cascade = ModelCascade(cascade, AI_names)
+
+        self.people_interval = max(1, people_interval)
+        self.people_propagator = BoxPropagator() if self.people_interval > 1 else None
+        # the people tracker runs once per people_interval frames
+        self.manager.lost_track_frames = (
+            get_track_buffer(self.tracker_name) * self.people_interval
+        )
+
+        self.tilers = {}
+        tiling = tiling or {}
+        rois = [
+            tuple(int(v) for v in obj.attention_polygon.bounds)
+            for obj in data
+            if hasattr(obj, "attention_polygon")
+        ]
+        for model_key in tiling.get("models", []):
+            model_name = base + model_key
+            if model_name in tracked_names or model_name == AI_names[2]:
+                # tracked models stay on the full frame, so ByteTrack ids don't depend on tiles
+                print(f"Tiled inference is not supported for {model_key}")
+                continue
+            self.tilers[model_name] = TiledInference(
+                rois,
+                tile_size=tiling.get("tile_size", 640),
+                overlap=tiling.get("overlap", 0.2),
+            )
+
+        # people are counted first, AI_names are ordered by importance
+        self.loader = ModelLoader(
+            load_names, self.load_model, self.warm_up_model, self.set_model
+        )
+        if background_loading:
+            self.loader.start()
+        else:
+            self.loader.run()
+
+    def load_model(self, name: str):
+        if self.inference is None:
+            model = load_model(name, self.get_backend(name), self.onnxruntime_options)
+        else:
+            model = self.inference.get_model(
+                name, self.get_backend(name), self.onnxruntime_options
+            )
+        self.confirm_device()
+        return model
+
+    def confirm_device(self):
+        """The device was chosen by the CUDA driver before torch was imported, torch itself can be
+        a CPU-only build"""
+        if self.device == "cuda" and not cuda_available():
+            print("CUDA isn't available to torch, using device: cpu")
+            self.device = "cpu"
+            if not self.preprocess is None:
+                self.preprocess.device = self.device
+
+    def warm_up_model(self, model, name: str):
+        """Run the model twice on a dummy frame of the expected shape, so ONNX Runtime/TensorRT
+        initialize and grow their memory before the first real frame"""
+        if self.inference is None:
+            self._warm_up(model, name)
+            return
+        with self.inference.model_locks[name]:  # the model is shared with other Trackers
+            self._warm_up(model, name)
+
+    def _warm_up(self, model, name: str):
+        if getattr(model, "warmed_up", False) or name == AI_names[2]:
+            return
+        frame = np.zeros(self.frame_shape, dtype=np.uint8)
+        predict_args = {"stream": True, "verbose": False, "device": self.device}
+        for _ in range(2):
+            if name in self.tilers:
+                tile_size = self.tilers[name].tile_size
+                list(model.predict(frame[:tile_size, :tile_size], **predict_args))
+                continue
+            preprocess = PreprocessCache(self.device)
+            preprocess.set_frame(frame)
+            tensor, _, _ = preprocess.get(get_input_size(model), stride=32)
+            try:
+                # predict doesn't change ByteTrack state of tracked models
+                list(model.predict(tensor, **predict_args))
+            except Exception:
+                list(model.predict(frame, **predict_args))
+        model.warmed_up = True
+
+    def set_quality(self, settings: dict):
+        """Apply a quality level, see quality_controller.full_quality for the knobs"""
+        self.tiling_enabled = settings["tiling"]
+        self.model_stride = settings["model_stride"]
+        self.input_sizes = {}
+        for name in self.loader.model_names:
+            size = settings["people_input_size" if name == AI_names[0] else "input_size"]
+            if not size is None and name != AI_names[2]:
+                self.input_sizes[name] = size
+
+    def get_quality_input_size(self, model, name: str) -> int:
+        """Input size of the quality level, None - the exported one. ONNX Runtime models exported
+        with static input shape keep it"""
+        if not name in self.input_sizes or not getattr(model, "dynamic_shape", True):
+            return None
+        return self.input_sizes[name]
+
+    def set_model(self, name: str, model):
+        self.models[AI_names.index(name)] = model
+
+    def wait_models(self, names: list[str] = None, timeout: float = None) -> bool:
+        """Block until models are loaded in the background
+
+        Args:
+            names: model names, default is every enabled model
+        """
+        if not names is None:
+            names = [name for name in names if name in self.loader.model_names]
+        return self.loader.wait(names, timeout)
+
+    def get_model_stats(self) -> dict:
+        """{model file name: {"load", "warm_up", "first_result"}} in seconds"""
+        stats = {}
+        for name in self.loader.model_names:
+            stats[Path(name).name] = {
+                **self.loader.stats[name],
+                "first_result": self.first_results.get(name),
+            }
+        return stats
+
+    def close(self):
+        self.loader.stop()
+        self.manager.close()
+
+    def infer(self, model, name: str, frame: np.ndarray) -> Detections:
+        """Run the model on the frame, people and TSDs are tracked with ByteTrack
+
+        Returns:
+            detections or None for models without inference on the full frame (curtains)
+        """
+        if name == AI_names[2]:
+            return None
+        run_model, model_args = self.get_run_args(model, name)
+        if name in self.tilers and self.tiling_enabled:
+            return self.tilers[name].infer(
+                model, frame, verbose=self.verbose, device=self.device, **model_args
+            )
+        model_args.update(stream=True, verbose=self.verbose, device=self.device)
+
+        if (
+            not self.preprocess is None
+            and frame is self.preprocess.frame
+            and not name in self._raw_input_models
+        ):
+            input_size = get_input_size(model)
+            if not self.get_quality_input_size(model, name) is None:
+                input_size = (self.input_sizes[name], self.input_sizes[name])
+            # models are exported with dynamic input shape, frames are padded only to the stride
+            tensor, ratio, pad = self.preprocess.get(input_size, stride=32)
+            try:
+                detections = [
+                    Detections.from_result(result)
+                    for result in run_model(tensor, **model_args)
+                ]
+                if len(detections) == 0:
+                    return Detections()
+                return unletterbox(detections[0], ratio, pad, frame.shape)
+            except Exception as err:
+                print(f"Shared preprocessing is disabled for {name}: {err}")
+                self._raw_input_models.add(name)
+
+        detections = [
+            Detections.from_result(result) for result in run_model(frame, **model_args)
+        ]
+        return detections[0] if len(detections) > 0 else Detections()
+
+    def get_run_args(self, model, name: str) -> tuple:
+        """(model.track or model.predict, arguments), people and TSDs are tracked with ByteTrack"""
+        if name in tracked_names:
+            return model.track, {"show": False, "persist": True}  # "tracker": self.tracker_name
+        if name in [AI_names[3], *AI_names[5:7]]:
+            return model.predict, {"conf": 0.25, "iou": 0.5}
+        return model.predict, {}
 
+    def get_batch_models(self) -> list[str]:
+        """Models, results of which don't depend on counting of previous frames, so they can run
+        on several frames at once. Tiled, gated, strided and propagated models run per frame.
+
+        Tracked models (people, TSDs) run per frame too: ultralytics track processes a list of frames
+        one by one anyway, and ByteTrack with persist=True would already be updated with the first
+        frames when the batch fails and the frames are run again"""
+        names = []
+        for name in self.cascade.order:
+            model = self.models[AI_names.index(name)]
+            if model is None or name == AI_names[2] or name in self._unbatched_models:
+                continue
+            if name in tracked_names:
+                continue
+            if name in self.cascade.conditions:
+                continue
+            if name in self.tilers and self.tiling_enabled:
+                continue
+            if self.model_stride > 1 and not name in (AI_names[0], AI_names[2]):
+                continue
+            if name == AI_names[0] and not self.people_propagator is None:
+                continue
+            names.append(name)
+        return names
+
+    def infer_batch(self, model, name: str, frames: list[np.ndarray]) -> list[Detections]:
+        """Run a not tracked model on consecutive frames at once, see get_batch_models
+
+        Returns:
+            detections of every frame or None if the model can't run on batches
+        """
+        run_model, model_args = self.get_run_args(model, name)
+        model_args.update(stream=True, verbose=self.verbose, device=self.device)
+        if not self.get_quality_input_size(model, name) is None:
+            model_args["imgsz"] = self.input_sizes[name]
+        try:
+            # the whole batch is done before counting, a failure leaves no partial results
+            detections = [
+                Detections.from_result(result) for result in run_model(frames, **model_args)
+            ]
+        except Exception as err:
+            print(f"Batched inference is disabled for {name}: {err}")
+            self._unbatched_models.add(name)
+            return None
+        if len(detections) != len(frames):
+            print(f"Batched inference is disabled for {name}: {len(detections)} results")
+            self._unbatched_models.add(name)
+            return None
+        return detections
+
+    def consume_detections(
+        self, name: str, detections: Detections, frame_out: np.ndarray
+    ) -> tuple[np.ndarray, dict]:
+        """Update counting of this Tracker with detections of the model"""
         data = {
             "people": [],
             "tsds": [],
@@ -86,113 +425,124 @@ class Tracker:
             "bags": [],
         }
         if name in [*AI_names[:2], AI_names[3], *AI_names[5:7]]:
-            args = {
-                "show": False,
-                "persist": True,
-            }  # "tracker": self.tracker_name
-            if name in [AI_names[3], *AI_names[5:7]]:
-                results = model.predict(
-                    frame_in,
-                    stream=True,
-                    conf=0.25,
-                    iou=0.5,
-                    verbose=self.verbose,
-                    device=self.device,
-                )
-            else:
-                results = model.track(
-                    frame_in,
-                    stream=True,
-                    device=self.device,
-                    verbose=self.verbose,
-                    **args,
-                )
+            boxes = detections.int_boxes()
+            if name == AI_names[0]:
+                data["people"] = boxes
+            if name == AI_names[1]:
+                data["tsds"] = boxes
+            if name == AI_names[3]:
+                data["bills"] = boxes
+            if name == AI_names[5]:
+                data["cash_registers"] = list(zip(boxes, detections.classes))
+            if name == AI_names[6]:
+                data["tags"] = boxes
 
-            for result in results:
-                people_count = 0
-                if name == AI_names[0]:
-                    point_update_pack = []
-                if result.boxes is not None and len(result.boxes) > 0:
-                    boxes = result.boxes
-                    ids = (
-                        result.boxes.id.cpu().numpy()
-                        if result.boxes.id is not None
-                        else None
-                    )
-
-                    if boxes is None:
-                        continue
-
-                    for i, box in enumerate(boxes):
-
-                        people_count += 1
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-
-                        if name == AI_names[0]:
-                            data["people"].append([[x1, y1], [x2, y2]])
-                        if name == AI_names[1]:
-                            data["tsds"].append([[x1, y1], [x2, y2]])
-                        if name == AI_names[3]:
-                            data["bills"].append([[x1, y1], [x2, y2]])
-                        if name == AI_names[5]:
-                            data["cash_registers"].append(
-                                ([[x1, y1], [x2, y2]], model.names[int(box.cls[0])])
-                            )
-                        if name == AI_names[6]:
-                            data["tags"].append([[x1, y1], [x2, y2]])
+            if name == AI_names[0]:
+                point_update_pack = []
+                if not detections.ids is None:
+                    for id, ((x1, y1), (x2, y2)) in zip(detections.ids, boxes):
                         center = ((x1 + x2) // 2, (y1 + y2) // 2)
-                        if ids is not None and name == AI_names[0]:
-                            point_update_pack.append((int(ids[i]), center))
-
-                if name == AI_names[0]:
-                    frame_out = self.manager.update_draw_incidents_lamp(
-                        frame_out, point_update_pack
-                    )
-                if name == AI_names[0]:
-                    frame_out = cv.putText(
-                        frame_out,
-                        f"{people_count} people",
-                        (10, 30),
-                        cv.FONT_HERSHEY_SIMPLEX,
-                        1,
-                        (255, 0, 0),
-                        2,
-                    )
+                        point_update_pack.append((int(id), center))
+                frame_out = self.manager.update_draw_incidents_lamp(
+                    frame_out, point_update_pack
+                )
+                frame_out = cv.putText(
+                    frame_out,
+                    f"{len(detections)} people",
+                    (10, 30),
+                    cv.FONT_HERSHEY_SIMPLEX,
+                    1,
+                    (255, 0, 0),
+                    2,
+                )
         elif name == AI_names[2]:
             data["curtains"].extend(
                 self.manager.get_detect_windows_states()  # (state, id)
             )  # state: {0: 'closed', 1: 'open'}
         elif name == AI_names[4]:
-            results = model.predict(
-                frame_in, stream=True, verbose=self.verbose, device=self.device
+            data["clothes"].append(
+                list(zip(detections.int_boxes(), detections.classes))
             )
-            res = []
-            for result in results:
-                for box in result.boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-
-                    cls_id = int(box.cls[0])
-                    cls_name = model.names[cls_id]
-                    res.append(([[x1, y1], [x2, y2]], cls_name))
-            data["clothes"].append(res)
         elif name == AI_names[7]:
-            results = model.predict(
-                frame_in, stream=True, verbose=self.verbose, device=self.device
-            )
-            for result in results:
-                boxes = result.boxes.xyxy.cpu().numpy()  # координаты [x1, y1, x2, y2]
-                confs = result.boxes.conf.cpu().numpy()  # уверенность
-                class_ids = (
-                    result.boxes.cls.cpu().numpy().astype(int)
-                )  # индексы классов
-                res = []
-                for i, (box, _, cls_id) in enumerate(zip(boxes, confs, class_ids)):
-                    x1, y1, x2, y2 = box
-                    cls_name = result.names[cls_id]
-                    res.append(([[x1, y1], [x2, y2]], cls_name))
-            data["bags"] = res
+            data["bags"] = [
+                ([[x1, y1], [x2, y2]], class_name)
+                for (x1, y1, x2, y2), class_name in zip(
+                    detections.xyxy, detections.classes
+                )
+            ]
         return frame_out, data
 
+    def get_backend(self, name: str) -> str:
+        return self.backends.get(name, "ultralytics")
+
+    def get_inference_variant(self, name: str):
+        """Results of Trackers with the same variant of the model are interchangeable"""
+        variant = ()
+        tiler = self.tilers.get(name)
+        if not tiler is None and self.tiling_enabled:
+            variant += (tuple(tiler.rois), tiler.tile_size, tiler.overlap)
+        if name in self.input_sizes:
+            variant += (self.input_sizes[name],)
+        if self.get_backend(name) != "ultralytics":
+            variant += (self.get_backend(name),)
+        return variant or None
+
+    def get_model_result(
+        self, model, name, frame_in, frame_out, seq: int = None
+    ) -> tuple[np.ndarray, dict]:
+        """
+        Args:
+            seq: sequence number of the frame in a shared capture, results of the model are
+                reused from other Trackers of the source if inference is set
+        """
+        if (
+            self.model_stride > 1
+            and not name in (AI_names[0], AI_names[2])
+            and self.frame_index % self.model_stride != 0
+            and name in self.last_detections
+        ):
+            # non-critical model is skipped on this frame, see set_quality
+            detections = self.last_detections[name]
+        elif name == AI_names[0] and not self.should_detect_people():
+            detections = self.people_propagator.predict(frame_in)
+        else:
+            if name in self.batch_detections:
+                detections = self.batch_detections[name]
+            elif self.inference is None or seq is None or name == AI_names[2]:
+                # curtains are classified per DetectWindow of this Tracker, nothing to share
+                detections = self.infer(model, name, frame_in)
+            else:
+                detections = self.inference.infer(self, name, seq, frame_in)
+            if name == AI_names[0] and not self.people_propagator is None:
+                self.people_propagator.reset(frame_in, detections)
+        self.frame_detections[name] = detections
+        if name != AI_names[2]:
+            self.last_detections[name] = detections
+        if name in self.loader.model_names and not name in self.first_results:
+            self.first_results[name] = round(time.time() - self.created, 3)
+            print(f"First result of {Path(name).name} after {self.first_results[name]} s")
+        return self.consume_detections(name, detections, frame_out)
+
+    def should_detect_people(self) -> bool:
+        """People detector runs on this frame, otherwise tracks are moved by people_propagator"""
+        if self.people_propagator is None or not self.people_propagator.has_tracks():
+            return True
+        # crossing of a DetectWindow edge is counted by exact positions
+        if self.manager.needs_dense_sampling(self.people_interval):
+            return True
+        return (self.frame_index - 1) % self.people_interval == 0
+
+    def store_frame(self):
+        closed_rooms = None
+        if not self.manager.curtains_model is None:
+            closed_rooms = [
+                obj.room_id for obj in self.manager.objs.values() if obj.is_closed
+            ]
+        frame_time = self.manager.frame_time or datetime.now()
+        self.detection_store.add_frame(
+            frame_time.timestamp(), self.frame_detections, closed_rooms
+        )
+
     def get_frame_to_writer(self, frame_in, frame_info: dict):
         frame_out = self.manager.draw_elements(frame_in)
         for key in ["people", "tsds", "bills", "tags"]:
@@ -226,10 +576,50 @@ class Tracker:
 
         return frame_out
 
+    def track_frames(
+        self,
+        frames: list[np.ndarray],
+        render: bool = False,
+        full_frames: list[np.ndarray] = None,
+    ) -> list[tuple[np.ndarray, dict]]:
+        """Process consecutive frames of a file, models run on all of them at once
+        (see get_batch_models), counting is updated frame by frame like with track_frame
+
+        Returns:
+            results of track_frame for every frame
+        """
+        full_frames = full_frames or [None] * len(frames)
+        batched = {}
+        for name in self.get_batch_models():
+            detections = self.infer_batch(self.models[AI_names.index(name)], name, frames)
+            if not detections is None:
+                batched[name] = detections
+        results = []
+        try:
+            for i, (frame, full_frame) in enumerate(zip(frames, full_frames)):
+                self.batch_detections = {name: batched[name][i] for name in batched}
+                results.append(self.track_frame(frame, render=render, full_frame=full_frame))
+        finally:
+            self.batch_detections = {}
+        return results
+
     def track_frame(
         self,
         frame: np.ndarray,
+        render: bool = False,
+        seq: int = None,
+        full_frame: np.ndarray = None,
     ):
+        """
+        Args:
+            render: if True, returned frame is fully composited (boxes, labels, rooms) like the saved video
+            seq: sequence number of the frame in a shared capture, see get_model_result
+            full_frame: frame before downscaling, curtains are classified on its crops
+        """
+        self.manager.full_frame = full_frame
+        if not self.preprocess is None:
+            self.preprocess.set_frame(frame)
+        self.frame_index += 1
         frame_out = frame
         frame_info = {
             "people": [],
@@ -241,17 +631,30 @@ class Tracker:
             "tags": [],
             "bags": [],
         }
-        for model, name in zip(self.models, AI_names):
+        self.frame_detections = {}
+        for name in self.cascade.order:
+            model = self.models[AI_names.index(name)]
             if model is None:
                 continue
-            frame_out, data = self.get_model_result(model, name, frame, frame_out)
+            if not self.cascade.should_run(name, self.frame_detections, self.manager):
+                self.last_detections.pop(name, None)  # isn't reused by model_stride later
+                continue
+            frame_out, data = self.get_model_result(
+                model, name, frame, frame_out, seq=seq
+            )
             for key in frame_info.keys():
                 frame_info[key].extend(data[key])
 
         frame_info["border_counts"] = self.manager.get_border_counts()
+        if not self.detection_store is None:
+            self.store_frame()
 
-        if not self.video_out is None:
+        frame_to_writer = None
+        if render or not self.video_out is None:
             frame_to_writer = self.get_frame_to_writer(frame_out.copy(), frame_info)
+        if not self.video_out is None:
             self.video_out.write(frame_to_writer)
 
+        if render:
+            return frame_to_writer, frame_info
         return frame_out, frame_info
@@ -0,0 +1,141 @@
+import numpy as np
+import shapely
+
+from .detection_store import DetectionStore
+from .session import scale_track_objects
+from .track_objects import DetectWindow, IncidentLevel
+
+
+class TrajectoryIndex:
+    """People tracks of a detection store with a grid of their points, so counting of one
+    DetectWindow is evaluated only on points near it (editor's what-if counts)
+
+    Counting is the same as DetectWindow.update: a crossing is a step between two consecutive
+    points of a track inside the attention polygon, which are on different sides of the room
+    polygon. A point outside the attention polygon breaks the track.
+    """
+
+    def __init__(self, store: DetectionStore, cell_size: int = 32):
+        """
+        Args:
+            cell_size: grid cell in pixels of processed frames
+        """
+        self.store = store
+        self.scale = store.meta.get("track_objects_scale", 1.0)
+        self.cell_size = cell_size
+
+        frames, rows, ids, centers = [], [], [], []
+        people = store.meta.get("people_model")
+        model_index = (
+            store.meta["models"].index(people) if people in store.meta["models"] else -1
+        )
+        row_offset = 0
+        for index in range(store.meta["chunks"]):
+            chunk = store.get_chunk(index)
+            selected = np.flatnonzero(
+                (np.asarray(chunk["model"]) == model_index)
+                & (np.asarray(chunk["track_id"]) >= 0)
+            )
+            xyxy = np.asarray(chunk["xyxy"])[selected].astype(int)
+            frames.append(np.asarray(chunk["frame"])[selected])
+            rows.append(selected + row_offset)
+            ids.append(np.asarray(chunk["track_id"])[selected])
+            # the same integer centers as Tracker.consume_detections
+            centers.append((xyxy[:, :2] + xyxy[:, 2:]) // 2)
+            row_offset += len(chunk["model"])
+
+        # points of a track are consecutive, in frame order
+        ids = np.concatenate(ids) if len(ids) > 0 else np.zeros(0, dtype=np.int32)
+        order = np.argsort(ids, kind="stable")
+        self.ids = ids[order]
+        self.frames = np.concatenate(frames)[order] if len(frames) > 0 else self.ids
+        self.rows = np.concatenate(rows)[order] if len(rows) > 0 else self.ids
+        self.points = (
+            np.concatenate(centers)[order] if len(centers) > 0 else np.zeros((0, 2), int)
+        )
+
+        cells = np.maximum(self.points // cell_size, 0)
+        self.columns = int(cells[:, 0].max()) + 1 if len(cells) > 0 else 1
+        cell_keys = cells[:, 1] * self.columns + cells[:, 0]
+        self.cell_order = np.argsort(cell_keys, kind="stable")
+        self.cell_keys = cell_keys[self.cell_order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_points_near(self, bounds: tuple[float]) -> np.ndarray:
+        """Indices of points in grid cells of bounds (x1, y1, x2, y2), in track order"""
+        if len(self.ids) == 0:
+            return np.zeros(0, dtype=int)
+        x1, y1, x2, y2 = [max(0, int(v // self.cell_size)) for v in bounds]
+        x2 = min(x2, self.columns - 1)
+        parts = []
+        for row in range(y1, y2 + 1):
+            first, last = np.searchsorted(
+                self.cell_keys,
+                [row * self.columns + x1, row * self.columns + x2 + 1],
+            )
+            parts.append(self.cell_order[first:last])
+        if len(parts) == 0:
+            return np.zeros(0, dtype=int)
+        return np.sort(np.concatenate(parts))
+
+    def get_crossings(self, window: DetectWindow) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Args:
+            window: in coordinates of processed frames
+
+        Returns:
+            (frames, +1 in / -1 out) of crossings in the order DetectWindow counts them
+        """
+        near = self.get_points_near(window.attention_polygon.bounds)
+        if len(near) < 2:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        x, y = self.points[near, 0], self.points[near, 1]
+        attention = shapely.contains_xy(window.attention_polygon, x, y)
+        inside = shapely.contains_xy(window.exact_polygon, x, y)
+
+        # the previous point of the track is in the attention polygon, points that aren't
+        # near the window are outside of it
+        has_previous = (
+            (np.diff(near) == 1)
+            & (self.ids[near[1:]] == self.ids[near[:-1]])
+            & attention[:-1]
+        )
+        crossing = has_previous & attention[1:] & (inside[1:] != inside[:-1])
+        steps = near[1:][crossing]
+        order = np.lexsort((self.rows[steps], self.frames[steps]))
+        deltas = np.where(inside[1:][crossing], 1, -1)
+        return self.frames[steps][order], deltas[order]
+
+    def count(self, window: DetectWindow) -> dict:
+        """What-if counting of the window over the stored frames, curtains are treated as open
+
+        Args:
+            window: in full resolution coordinates like rooms of configs
+
+        Returns:
+            {"in", "out", "contain", "max_contain", "incidents"}
+        """
+        window = scale_track_objects([window], self.scale)[0]
+        frames, deltas = self.get_crossings(window)
+        contain = 0
+        max_contain = 0
+        level = IncidentLevel.NO_INCIDENT
+        incidents = 0
+        for i, (frame, delta) in enumerate(zip(frames, deltas)):
+            contain = max(contain + int(delta), 0)
+            max_contain = max(max_contain, contain)
+            if i + 1 < len(frames) and frames[i + 1] == frame:
+                continue  # incidents are written once per frame
+            new_level = IncidentLevel(int(contain > 1) + int(contain > 2))
+            if new_level != level:
+                level = new_level
+                incidents += 1
+        return {
+            "in": int((deltas > 0).sum()),
+            "out": int((deltas < 0).sum()),
+            "contain": contain,
+            "max_contain": max_contain,
+            "incidents": incidents,
+        }
@@ -0,0 +1,221 @@
+from urllib.parse import urlparse
+import numpy as np
+import cv2 as cv
+import time
+
+from .dewarp import Dewarper
+
+
+valid_online_bases = {"http", "https", "rtsp", "rtmp", "ftp", "sftp", "mms"}
+
+
+def open_capture(source: str, threads: int = 0) -> cv.VideoCapture:
+    """cv.VideoCapture with FFmpeg decoding in threads, 0 - FFmpeg default
+
+    The thread count is read by FFmpeg only while opening the codec, so it's passed with the
+    open parameters (setting CAP_PROP_N_THREADS later is ignored)
+    """
+    if threads <= 0:
+        return cv.VideoCapture(source)
+    return cv.VideoCapture(source, cv.CAP_FFMPEG, [cv.CAP_PROP_N_THREADS, threads])
+
+
+def get_dewarper(params: dict) -> Dewarper:
+    return None if not params else Dewarper(params)
+
+
+def get_frame_shape(
+    capture: cv.VideoCapture, scale: float, dewarper: Dewarper
+) -> tuple[int]:
+    """Shape of frames after downscaling and dewarping, None if the capture doesn't know its size"""
+    width = int(capture.get(cv.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv.CAP_PROP_FRAME_HEIGHT))
+    if width <= 0 or height <= 0:
+        return None
+    if scale != 1.0:
+        width, height = round(width * scale), round(height * scale)
+    if not dewarper is None:
+        return dewarper.get_output_shape((width, height))
+    return (height, width, 3)
+
+
+def downscale(frame: np.ndarray, scale: float) -> np.ndarray:
+    if frame is None or scale == 1.0:
+        return frame
+    return cv.resize(frame, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+
+
+def is_online_source(path: str) -> bool:
+    try:
+        parsed = urlparse(str(path))
+        return (parsed.scheme in valid_online_bases) and (parsed.netloc != "")
+    except Exception:
+        return False
+
+
+class VideoStream:
+    """CamGear wrapper, that reconnects to online sources when they stop sending frames"""
+
+    def __init__(
+        self,
+        source: str,
+        reconnect_attempts: int = 5,
+        logging: bool = True,
+        scale: float = 1.0,
+        threads: int = 0,
+        keep_full_frame: bool = False,
+        dewarp: dict = None,
+        **cam_options,
+    ):
+        """
+        Args:
+            source: path to video file or stream url
+            reconnect_attempts: how many times to reopen online source before giving up
+            scale: frames are downscaled right after decoding, before anything else touches them
+            threads: FFmpeg decoding threads, 0 - FFmpeg default
+            keep_full_frame: keep the last frame before downscaling in full_frame, not with dewarp
+            dewarp: fisheye parameters, frames are replaced by dewarped views, see dewarp.build_maps
+            cam_options: other CamGear parameters
+        """
+        self.source = source
+        self.is_online = is_online_source(source)
+        self.reconnect_attempts = reconnect_attempts
+        self.scale = scale
+        self.threads = threads
+        self.keep_full_frame = keep_full_frame and scale != 1.0 and not dewarp
+        self.full_frame = None
+        self.dewarper = get_dewarper(dewarp)
+        self.cam_options = {"logging": logging, **cam_options}
+        self.frame_shape = None  # shape of returned frames, known after start
+        self._cap = None
+
+    def start(self):
+        from vidgear.gears import CamGear  # is_online_source() is used by light processes
+
+        cap = CamGear(source=self.source, **self.cam_options)
+        if (
+            self.threads > 0
+            and isinstance(self.source, str)
+            and not self.cam_options.get("stream_mode")
+        ):
+            # CamGear sets CAP_PROP_* options only after opening, decoding threads are lost,
+            # so its capture is replaced by one opened with them
+            cap.stream.release()
+            cap.stream = open_capture(self.source, self.threads)
+            if not self.is_online:
+                cap.stream.grab()  # CamGear has already queued the first frame
+        self.frame_shape = get_frame_shape(cap.stream, self.scale, self.dewarper)
+        self._cap = cap.start()
+        return self
+
+    def read(self) -> np.ndarray:
+        """Returns None if the stream has ended"""
+        frame = self._read()
+        if self.keep_full_frame:
+            self.full_frame = frame
+        frame = downscale(frame, self.scale)
+        if not self.dewarper is None:
+            frame = self.dewarper.apply(frame)
+        return frame
+
+    def _read(self) -> np.ndarray:
+        frame = self._cap.read()
+        if not frame is None or not self.is_online:
+            return frame
+
+        for _ in range(self.reconnect_attempts):
+            time.sleep(0.2)
+            self._cap.stop()
+            self.start()
+            frame = self._cap.read()
+            if not frame is None:
+                return frame
+        return None
+
+    def stop(self):
+        if not self._cap is None:
+            self._cap.stop()
+            self._cap = None
+
+
+class StridedFileReader:
+    """Reads a video file with cv.VideoCapture, skipped frames are only grabbed
+
+    grab() still decodes the packet (codecs need reference frames), but skips the conversion
+    into a BGR array and its copy, which is the major part of read() for small models.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        scale: float = 1.0,
+        threads: int = 0,
+        keep_full_frame: bool = False,
+        dewarp: dict = None,
+    ):
+        """
+        Args:
+            scale, threads, keep_full_frame, dewarp: see VideoStream
+        """
+        self.source = source
+        self.scale = scale
+        self.threads = threads
+        self.keep_full_frame = keep_full_frame and scale != 1.0 and not dewarp
+        self.full_frame = None
+        self.dewarper = get_dewarper(dewarp)
+        self._cap = None
+        self.frame_shape = None  # shape of returned frames, known after start
+        self.fps = 0.0
+        self.index = -1  # index of the last returned frame
+        self.grabbed = 0  # frames skipped without retrieve
+
+    def start(self):
+        self._cap = open_capture(str(self.source), self.threads)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Can't open video file: {self.source}")
+        self.fps = self._cap.get(cv.CAP_PROP_FPS) or 0.0
+        self.frame_shape = get_frame_shape(self._cap, self.scale, self.dewarper)
+        return self
+
+    def read(self, skip: int = 0) -> np.ndarray:
+        """
+        Args:
+            skip: how many frames to skip before the returned one
+
+        Returns:
+            frame or None if the file has ended
+        """
+        for _ in range(skip):
+            if not self._cap.grab():
+                return None
+            self.index += 1
+            self.grabbed += 1
+        success, frame = self._cap.read()
+        if not success:
+            return None
+        self.index += 1
+        if self.keep_full_frame:
+            self.full_frame = frame
+        frame = downscale(frame, self.scale)
+        if not self.dewarper is None:
+            frame = self.dewarper.apply(frame)
+        return frame
+
+    def seek(self, msec: float):
+        """Continue from the frame at the time, seeking is fast to keyframes"""
+        self._cap.set(cv.CAP_PROP_POS_MSEC, msec)
+        if self.fps > 0:
+            self.index = round(msec * self.fps / 1000) - 1
+
+    @property
+    def position_msec(self) -> float:
+        """Presentation time of the last returned frame"""
+        position = self._cap.get(cv.CAP_PROP_POS_MSEC)
+        if position <= 0 and self.fps > 0:
+            position = self.index * 1000 / self.fps
+        return position
+
+    def stop(self):
+        if not self._cap is None:
+            self._cap.release()
+            self._cap = None
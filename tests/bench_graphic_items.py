@@ -0,0 +1,124 @@
+"""Repaint benchmark of NgonItem and TrackGraphicItem geometry caching
+
+Renders a scene of rooms and moving tracks offscreen, once with the cached items of
+GUI/graphic_items.py and once with items, that rebuild their geometry on every
+boundingRect/shape/paint call like before the caching.
+
+Examples:
+    python tests/bench_graphic_items.py
+    python tests/bench_graphic_items.py --rooms 12 --tracks 40 --frames 300
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root / "GUI"))
+
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QImage, QPainter
+from PyQt6.QtWidgets import QApplication, QGraphicsScene
+
+from graphic_items import NgonItem, TrackGraphicItem
+
+
+class RebuildingNgonItem(NgonItem):
+    """Sorts points and builds the path on every call, as NgonItem did without the cache"""
+
+    def boundingRect(self):
+        self._update_geometry()
+        return super().boundingRect()
+
+    def shape(self):
+        self._update_geometry()
+        return super().shape()
+
+    def paint(self, painter, option, widget=None):
+        self._update_geometry()
+        return super().paint(painter, option, widget)
+
+
+class RebuildingTrackGraphicItem(TrackGraphicItem):
+    """Computes the bounding rect on every call and repositions on every setRect"""
+
+    def boundingRect(self):
+        self._update_bounding_rect()
+        return super().boundingRect()
+
+    def setRect(self, x1: int, y1: int, x2: int, y2: int):
+        self.p1 = None  # the unchanged rectangle isn't skipped
+        return super().setRect(x1, y1, x2, y2)
+
+
+def build_scene(ngon_class, track_class, rooms: int, tracks: int, size: tuple[int]):
+    width, height = size
+    rng = random.Random(0)
+    scene = QGraphicsScene(0, 0, width, height)
+    for id in range(rooms):
+        x, y = rng.randrange(0, width - 200), rng.randrange(0, height - 200)
+        points = [x, y, x + 180, y + 10, x + 190, y + 170, x + 5, y + 160]
+        scene.addItem(ngon_class(id, 4, *points))
+    items = []
+    for _ in range(tracks):
+        x, y = rng.randrange(0, width - 80), rng.randrange(0, height - 160)
+        item = track_class(x, y, x + 60, y + 150, parent=None)
+        scene.addItem(item)
+        items.append(item)
+    return scene, items
+
+
+def measure(ngon_class, track_class, args) -> float:
+    """Milliseconds per rendered frame"""
+    size = (args.width, args.height)
+    scene, tracks = build_scene(ngon_class, track_class, args.rooms, args.tracks, size)
+    image = QImage(*size, QImage.Format.Format_RGB32)
+    target = QRectF(0, 0, *size)
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for frame in range(args.frames):
+        # half of the people stand still, the others move a bit every frame
+        for i, item in enumerate(tracks):
+            if i % 2 == 0:
+                continue
+            dx, dy = rng.randint(-3, 3), rng.randint(-3, 3)
+            x1, y1 = item.p1
+            x2, y2 = item.p2
+            item.setRect(x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+        painter = QPainter(image)
+        scene.render(painter, target, target)
+        painter.end()
+    return (time.perf_counter() - start) / args.frames * 1000
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="python tests/bench_graphic_items.py",
+        description="Compare repaints of cached and rebuilding graphic items",
+    )
+    parser.add_argument("--rooms", type=int, default=8)
+    parser.add_argument("--tracks", type=int, default=20)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication([])
+    measure(NgonItem, TrackGraphicItem, args)  # warm up Qt
+    rebuilding = measure(RebuildingNgonItem, RebuildingTrackGraphicItem, args)
+    cached = measure(NgonItem, TrackGraphicItem, args)
+    print(
+        f"{args.rooms} rooms, {args.tracks} tracks, {args.frames} frames of "
+        f"{args.width}x{args.height}"
+    )
+    print(f"rebuilding: {rebuilding:.3f} ms/frame")
+    print(f"cached:     {cached:.3f} ms/frame ({rebuilding / cached:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Round trip of source.detection_store and replay of counting from it"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from source.detection_store import DetectionStore, DetectionStoreWriter, replay
+from source.detections import Detections
+from source.instrument_manager import InstrumentManager
+from source.track_objects import DetectWindow, get_track_object_from_dict
+
+people_model = "models/yolo11n-pose"
+start_time = 1767600000.0
+
+
+def room(room_id: int, x1: int, y1: int, x2: int, y2: int) -> DetectWindow:
+    return get_track_object_from_dict(
+        DetectWindow(room_id, [x1, y1], [x2, y1], [x2, y2], [x1, y2]).get_dict()
+    )
+
+
+def walk_people(frames: int, people: int, rng: np.random.Generator) -> list[Detections]:
+    """People walking around a 320x240 frame. Every one is lost for a while sometimes or jumps
+    far away like an id switch of the tracker, so tracks leave rooms without crossing the band"""
+    positions = rng.uniform([20, 20], [300, 220], (people, 2))
+    velocities = rng.normal(0, 3, (people, 2))
+    result = []
+    for _ in range(frames):
+        velocities = np.clip(velocities + rng.normal(0, 0.7, (people, 2)), -5, 5)
+        positions = np.clip(positions + velocities, 10, [310, 230])
+        jumped = rng.random(people) < 0.03
+        positions[jumped] = rng.uniform([20, 20], [300, 220], (int(jumped.sum()), 2))
+        visible = rng.random(people) > 0.1
+        centers = positions[visible]
+        result.append(
+            Detections(
+                xyxy=np.hstack([centers - [10, 25], centers + [10, 25]]).astype(np.float32),
+                ids=np.flatnonzero(visible) + 1,
+                classes=["person"] * int(visible.sum()),
+                confs=rng.uniform(0.3, 1.0, int(visible.sum())).astype(np.float32),
+            )
+        )
+    return result
+
+
+def write_store(path: Path, people: list[Detections], scale: float = 1.0, **writer_args):
+    writer = DetectionStoreWriter(
+        str(path),
+        meta={
+            "path": "records/cam1.mp4",
+            "video_name": "cam1.mp4",
+            "people_model": Path(people_model).name,
+            "track_objects_scale": scale,
+        },
+        **writer_args,
+    )
+    for i, detections in enumerate(people):
+        writer.add_frame(start_time + i / 25, {people_model: detections})
+    writer.close()
+    return DetectionStore(str(path))
+
+
+def test_round_trip(tmp_path):
+    bills = Detections(
+        xyxy=np.array([[5, 5, 15, 10], [40, 40, 60, 50]], dtype=np.float32),
+        classes=["bill", "cash"],
+        confs=np.array([0.5, 0.75], dtype=np.float32),
+    )
+    frames = [
+        {people_model: Detections(), "models/bills": bills, "models/curtains": None},
+        {people_model: walk_people(1, 3, np.random.default_rng(0))[0]},
+        {},
+        {"models/bills": bills},
+        {people_model: walk_people(1, 2, np.random.default_rng(1))[0]},
+    ]
+    writer = DetectionStoreWriter(
+        str(tmp_path / "cam1.detections"), meta={"people_model": "yolo11n-pose"}, chunk_frames=2
+    )
+    for i, detections in enumerate(frames):
+        writer.add_frame(start_time + i, detections, closed_rooms=[3] if i % 2 else [])
+    writer.close()
+
+    store = DetectionStore(str(tmp_path / "cam1.detections"))
+    assert len(store) == 5
+    assert store.meta["chunks"] == 3
+    assert store.meta["models"] == ["bills", "yolo11n-pose"]
+    assert store.meta["classes"] == ["bill", "cash", "person"]
+    assert store.meta["curtains"]
+
+    for model, key in [("yolo11n-pose", people_model), ("bills", "models/bills")]:
+        for frame, frame_time, chunk, rows, closed_rooms in store.iter_frames(model):
+            assert frame_time == start_time + frame
+            assert list(closed_rooms) == ([3] if frame % 2 else [])
+            expected = frames[frame].get(key) or Detections()
+            np.testing.assert_array_equal(np.asarray(chunk["xyxy"])[rows], expected.xyxy)
+            np.testing.assert_allclose(
+                np.asarray(chunk["conf"])[rows], expected.confs, atol=1e-3
+            )
+            classes = [store.meta["classes"][i] for i in np.asarray(chunk["class"])[rows]]
+            assert classes == expected.classes
+            ids = np.asarray(chunk["track_id"])[rows]
+            if expected.ids is None:
+                assert (ids == -1).all()
+            else:
+                np.testing.assert_array_equal(ids, expected.ids)
+
+
+def test_writer_clears_old_chunks(tmp_path):
+    people = walk_people(30, 2, np.random.default_rng(0))
+    write_store(tmp_path / "cam1.detections", people, chunk_frames=10)
+    store = write_store(tmp_path / "cam1.detections", people[:5], chunk_frames=10)
+    assert len(store) == 5
+    assert sorted(path.parent.name for path in store.path.glob("*/frame.npy")) == ["00000"]
+
+
+def test_replay_counts_like_tracker(tmp_path):
+    people = walk_people(600, 6, np.random.default_rng(3))
+    store = write_store(tmp_path / "cam1.detections", people, chunk_frames=128)
+
+    rooms = [room(1, 60, 40, 160, 120), room(2, 180, 100, 300, 220)]
+    for window in rooms:
+        window.crossing_log = []
+    manager, _ = replay(store, rooms)
+
+    expected_rooms = [room(1, 60, 40, 160, 120), room(2, 180, 100, 300, 220)]
+    for window in expected_rooms:
+        window.crossing_log = []
+    expected = InstrumentManager(video_name="cam1.mp4", collect_incidents=True)
+    expected.load_data(expected_rooms)
+    for detections in people:
+        # like Tracker.consume_detections
+        expected.update_counting(
+            [
+                (int(id), ((x1 + x2) // 2, (y1 + y2) // 2))
+                for id, (x1, y1, x2, y2) in zip(detections.ids, detections.xyxy.astype(int))
+            ]
+        )
+
+    assert manager.get_border_counts() == expected.get_border_counts()
+    assert sum(len(window.crossing_log) for window in rooms) > 0
+    for window, expected_window in zip(rooms, expected_rooms):
+        assert window.crossing_log == expected_window.crossing_log
+    assert len(manager.pop_incidents()) == len(expected.pop_incidents())
@@ -0,0 +1,131 @@
+"""Rules of source.model_cascade.ModelCascade: order of models, conditions and validation"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from source.detections import Detections
+from source.model_cascade import ModelCascade, boxes_overlap
+
+names = ["models/people", "models/tsd", "models/bills", "models/cash_register", "models/bags"]
+
+
+class Manager:
+    """InstrumentManager with someone near a DetectWindow or not"""
+
+    def __init__(self, dense: bool):
+        self.dense = dense
+
+    def needs_dense_sampling(self) -> bool:
+        return self.dense
+
+
+def boxes(*xyxy) -> Detections:
+    return Detections(xyxy=np.array(xyxy, dtype=np.float32).reshape(-1, 4))
+
+
+def test_without_rules_keeps_order():
+    cascade = ModelCascade({}, names)
+    assert cascade.order == names
+    assert all(cascade.should_run(name, {}, Manager(False)) for name in names)
+    assert cascade.get_stats() == {}
+
+
+def test_dependencies_run_first():
+    cascade = ModelCascade({"bills": {"detected": "cash_register"}}, names)
+    order = cascade.order
+    assert order.index("models/cash_register") < order.index("models/bills")
+    assert order[0] == "models/people"
+    assert sorted(order) == sorted(names)
+
+
+def test_detected():
+    cascade = ModelCascade({"bills": {"detected": "cash_register"}}, names)
+    manager = Manager(False)
+    assert not cascade.should_run("models/bills", {}, manager)
+    assert not cascade.should_run(
+        "models/bills", {"models/cash_register": Detections()}, manager
+    )
+    assert cascade.should_run(
+        "models/bills", {"models/cash_register": boxes([0, 0, 10, 10])}, manager
+    )
+    assert cascade.get_stats() == {"bills": {"run": 1, "skipped": 2}}
+
+
+def test_overlaps_with_margin():
+    cascade = ModelCascade(
+        {"bills": {"overlaps": ["people", "cash_register"], "margin": 0.5}}, names
+    )
+    results = {
+        "models/people": boxes([0, 0, 10, 10]),
+        "models/cash_register": boxes([12, 0, 20, 10]),
+    }
+    # 10 px wide person is expanded by 5 px to each side
+    assert cascade.should_run("models/bills", results, Manager(False))
+    assert not boxes_overlap(results["models/people"].xyxy, results["models/cash_register"].xyxy)
+    results["models/cash_register"] = boxes([16, 0, 20, 10])
+    assert not cascade.should_run("models/bills", results, Manager(False))
+
+
+def test_near_windows():
+    cascade = ModelCascade({"bags": {"near_windows": True}}, names)
+    assert cascade.should_run("models/bags", {}, Manager(True))
+    assert not cascade.should_run("models/bags", {}, Manager(False))
+
+
+def test_all_and_any():
+    cascade = ModelCascade(
+        {
+            "bills": {"all": [{"detected": "cash_register"}, {"near_windows": True}]},
+            "bags": {"any": [{"detected": "tsd"}, {"near_windows": True}]},
+        },
+        names,
+    )
+    register = {"models/cash_register": boxes([0, 0, 10, 10])}
+    assert cascade.should_run("models/bills", register, Manager(True))
+    assert not cascade.should_run("models/bills", register, Manager(False))
+    assert not cascade.should_run("models/bills", {}, Manager(True))
+
+    assert cascade.should_run("models/bags", {"models/tsd": boxes([0, 0, 1, 1])}, Manager(False))
+    assert cascade.should_run("models/bags", {}, Manager(True))
+    assert not cascade.should_run("models/bags", {}, Manager(False))
+
+
+def test_cycle_is_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        ModelCascade(
+            {"bills": {"detected": "cash_register"}, "cash_register": {"detected": "bills"}},
+            names,
+        )
+
+
+def test_self_dependency_is_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        ModelCascade({"bills": {"any": [{"detected": "bills"}]}}, names)
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        {"shoes": {"detected": "people"}},
+        {"bills": {"detected": "shoes"}},
+        {"bills": {"overlaps": ["people", "shoes"]}},
+        {"bills": {"all": [{"detected": "people"}, {"detected": "shoes"}]}},
+    ],
+)
+def test_unknown_models_are_rejected(rules):
+    with pytest.raises(ValueError, match="Unknown"):
+        ModelCascade(rules, names)
+
+
+@pytest.mark.parametrize(
+    "condition",
+    [{}, {"seen": "people"}, {"detected": "people", "near_windows": True}, "people"],
+)
+def test_malformed_conditions_are_rejected(condition):
+    with pytest.raises(ValueError, match="Condition"):
+        ModelCascade({"bills": condition}, names)
@@ -0,0 +1,77 @@
+"""Boxes moved between detector runs by source.motion_prediction.BoxPropagator"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from source.detections import Detections
+from source.motion_prediction import BoxPropagator
+
+
+def person(*xyxy, ids=None) -> Detections:
+    return Detections(
+        xyxy=np.array(xyxy, dtype=np.float32).reshape(-1, 4),
+        ids=np.array(ids if not ids is None else range(len(xyxy)), dtype=int),
+        classes=["person"] * len(xyxy),
+    )
+
+
+def textured_frame(x: int, y: int) -> np.ndarray:
+    """Flat background with a 60x120 px textured patch at (x, y), corners are found only on it"""
+    frame = np.full((360, 640, 3), 100, dtype=np.uint8)
+    rng = np.random.default_rng(0)
+    patch = rng.integers(0, 255, (30, 15), dtype=np.uint8)
+    frame[y : y + 120, x : x + 60] = np.kron(patch, np.ones((4, 4), dtype=np.uint8))[..., None]
+    return frame
+
+
+def flat_frame() -> np.ndarray:
+    return np.full((360, 640, 3), 100, dtype=np.uint8)
+
+
+def test_box_follows_flow():
+    propagator = BoxPropagator()
+    propagator.reset(textured_frame(200, 100), person([200, 100, 260, 220]))
+    predicted = propagator.predict(textured_frame(208, 104))
+    np.testing.assert_allclose(predicted.xyxy[0], [208, 104, 268, 224], atol=1.0)
+    assert list(predicted.ids) == [0]
+
+
+def test_box_without_corners_keeps_velocity():
+    propagator = BoxPropagator()
+    propagator.reset(flat_frame(), person([100, 100, 160, 220], ids=[7]))
+    # detected again 2 frames later, 10 px right
+    propagator.predict(flat_frame())
+    propagator.reset(flat_frame(), person([110, 100, 170, 220], ids=[7]))
+    assert np.allclose(propagator.velocities[7], [5, 0])
+
+    predicted = propagator.predict(flat_frame())
+    np.testing.assert_allclose(predicted.xyxy[0], [115, 100, 175, 220])
+    predicted = propagator.predict(flat_frame())
+    np.testing.assert_allclose(predicted.xyxy[0], [120, 100, 180, 220])
+
+
+def test_new_track_without_corners_stays():
+    propagator = BoxPropagator()
+    propagator.reset(flat_frame(), person([100, 100, 160, 220]))
+    np.testing.assert_allclose(propagator.predict(flat_frame()).xyxy[0], [100, 100, 160, 220])
+
+
+def test_boxes_are_clipped_to_frame():
+    propagator = BoxPropagator()
+    propagator.reset(flat_frame(), person([590, 100, 630, 220], ids=[1]))
+    propagator.reset(flat_frame(), person([600, 100, 640, 220], ids=[1]))
+    predicted = propagator.predict(flat_frame())
+    np.testing.assert_allclose(predicted.xyxy[0], [610, 100, 640, 220])
+
+
+def test_empty_detections():
+    propagator = BoxPropagator()
+    assert not propagator.has_tracks()
+    propagator.reset(flat_frame(), Detections())
+    assert propagator.has_tracks()
+    assert len(propagator.predict(flat_frame())) == 0
+    assert (propagator.detected, propagator.predicted) == (1, 1)
@@ -0,0 +1,95 @@
+"""Splitting of a recording and merging of its segments in source.segments"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from source.segments import match_track_ids, merge_segments, split_segments
+from source.track_objects import IncidentLevel
+
+
+def test_segments_start_on_keyframes():
+    keyframes = [float(t) for t in range(0, 60, 2)]
+    segments = split_segments(keyframes, 60.0, 4, 10.0)
+    assert [segment["start"] for segment in segments] == [0.0, 14.0, 30.0, 44.0]
+    assert [segment["read_start"] for segment in segments] == [0.0, 4.0, 20.0, 34.0]
+    assert [segment["end"] for segment in segments] == [14.0, 30.0, 44.0, None]
+    assert [segment["index"] for segment in segments] == [0, 1, 2, 3]
+
+
+def test_short_file_is_one_segment():
+    keyframes = [float(t) for t in range(0, 15, 2)]
+    assert split_segments(keyframes, 15.0, 4, 10.0) == [
+        {"index": 0, "read_start": 0.0, "start": 0.0, "end": None}
+    ]
+
+
+def test_sparse_keyframes_merge_segments():
+    # one keyframe: every split point falls back to the start of the file
+    assert len(split_segments([0.0], 120.0, 4, 10.0)) == 1
+
+
+def test_ids_are_matched_by_common_boxes():
+    box, other = [10, 10, 50, 100], [200, 10, 240, 100]
+    tail = {1000: [(7, box), (8, other)], 1040: [(7, box), (8, other)]}
+    head = {1000: [(1, box), (2, other)], 1040: [(1, box)], 1080: [(3, box)]}
+    assert match_track_ids(tail, head) == {1: 7, 2: 8}
+
+
+def test_id_is_matched_once_by_most_votes():
+    box = [10, 10, 50, 100]
+    tail = {t: [(7, box)] for t in (0, 40, 80)}
+    tail[120] = [(9, box)]
+    head = {0: [(1, box)], 40: [(1, box)], 80: [(2, box)], 120: [(1, box)]}
+    # 1 saw 7 twice and 9 once, 2 can't take 7 anymore
+    assert match_track_ids(tail, head) == {1: 7}
+
+
+def test_merge_stitches_ids_and_replays_counts():
+    box = [10, 10, 50, 100]
+    first = {
+        "index": 0,
+        "events": [(5.0, 1, [(3, 1)], False), (6.0, 1, [(4, 1)], False)],
+        "head_tracks": {},
+        "tail_tracks": {100000: [(3, box)]},
+    }
+    # the person 3 of the first segment is 1 in the second one
+    second = {
+        "index": 1,
+        "events": [(120.0, 1, [(2, 1)], False), (121.5, 1, [(1, -1), (2, -1)], False)],
+        "head_tracks": {100000: [(1, box)]},
+        "tail_tracks": {},
+    }
+    crossings, incidents = merge_segments(
+        [second, first], datetime(2026, 1, 5, 10, 0, 0, 500000), "cam1.mp4"
+    )
+
+    assert [(c["time"], c["track_id"], c["direction"], c["contain"]) for c in crossings] == [
+        (5.0, 1, "in", 1),
+        (6.0, 2, "in", 2),
+        (120.0, 3, "in", 3),
+        (121.5, 1, "out", 2),
+        (121.5, 3, "out", 1),
+    ]
+    assert second["stitched_ids"] == 1
+    assert [(i["time"], i["level"]) for i in incidents] == [(6.0, 1), (120.0, 2), (121.5, 0)]
+    assert incidents[1]["text"] == (
+        "2026-01-05 10:02:00.50 RoomID:1 EventID:2 People inside: 3 [2] cam1.mp4"
+    )
+
+
+def test_merge_closed_empty_room():
+    result = {
+        "index": 0,
+        "events": [(1.0, 2, [], True), (2.0, 2, [(5, 1)], True)],
+        "head_tracks": {},
+        "tail_tracks": {},
+    }
+    _, incidents = merge_segments([result], datetime(2026, 1, 5, 10, 0, 0, 500000), "cam1.mp4")
+    assert [(i["time"], i["level"]) for i in incidents] == [
+        (1.0, IncidentLevel.CLOSED_EMPTY.value),
+        (2.0, IncidentLevel.NO_INCIDENT.value),
+    ]
+    assert "Room is empty and closed" in incidents[0]["text"]
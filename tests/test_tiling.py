@@ -0,0 +1,141 @@
+"""Tiles, their merge and the motion gate of source.tiling"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from source.detections import Detections
+from source.tiling import TiledInference, make_tiles, merge_tile_detections
+
+
+def boxes(*xyxy, classes=None, confs=None) -> Detections:
+    return Detections(
+        xyxy=np.array(xyxy, dtype=np.float32).reshape(-1, 4),
+        classes=classes or ["tag"] * len(xyxy),
+        confs=np.array(confs or [0.9] * len(xyxy), dtype=np.float32),
+    )
+
+
+def test_tiles_cover_frame():
+    tiles = make_tiles(1920, 1080, 640, 0.2)
+    covered = np.zeros((1080, 1920), dtype=bool)
+    for x1, y1, x2, y2 in tiles:
+        assert x2 - x1 == 640 and y2 - y1 == 640
+        covered[y1:y2, x1:x2] = True
+    assert covered.all()
+
+
+def test_small_frame_is_one_tile():
+    assert make_tiles(320, 240, 640, 0.2) == [(0, 0, 320, 240)]
+
+
+def test_merge_moves_boxes_and_drops_duplicates():
+    # one object in the overlap of two tiles, found by both
+    merged = merge_tile_detections(
+        [boxes([500, 100, 540, 130], confs=[0.8]), boxes([12, 100, 52, 130], confs=[0.9])],
+        [(0, 0), (488, 0)],
+    )
+    assert len(merged) == 1
+    np.testing.assert_allclose(merged.xyxy[0], [500, 100, 540, 130])
+    assert np.isclose(merged.confs[0], 0.9)
+
+
+def test_merge_keeps_overlapping_boxes_of_other_classes():
+    merged = merge_tile_detections(
+        [boxes([10, 10, 50, 50], [10, 10, 50, 50], classes=["tag", "bill"])],
+        [(100, 200)],
+    )
+    assert sorted(merged.classes) == ["bill", "tag"]
+    np.testing.assert_allclose(merged.xyxy[:, :2], [[110, 210], [110, 210]])
+
+
+def test_merge_of_empty_tiles():
+    assert len(merge_tile_detections([Detections(), Detections()], [(0, 0), (10, 0)])) == 0
+
+
+def frame_with_blob(x: int, y: int, rng: np.random.Generator) -> np.ndarray:
+    """Gray scene with sensor noise and a 16x32 px person far away"""
+    frame = np.full((1080, 1920, 3), 90, dtype=np.int16)
+    frame += rng.normal(0, 3, frame.shape[:2]).astype(np.int16)[..., None]
+    frame[y : y + 32, x : x + 16] = 200
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def test_motion_gate_finds_small_mover():
+    rng = np.random.default_rng(0)
+    tiler = TiledInference(rois=[])
+    assert len(tiler.select_tiles(frame_with_blob(1500, 700, rng))) == len(tiler.tiles)
+
+    selected = tiler.select_tiles(frame_with_blob(1506, 702, rng))
+    assert len(selected) > 0
+    assert all(x1 <= 1500 < x2 and y1 <= 700 < y2 for x1, y1, x2, y2 in selected)
+
+
+def test_motion_gate_skips_static_noisy_frame():
+    rng = np.random.default_rng(0)
+    tiler = TiledInference(rois=[(0, 0, 100, 100)])
+    tiler.select_tiles(frame_with_blob(1500, 700, rng))
+    selected = tiler.select_tiles(frame_with_blob(1500, 700, rng))
+    # only tiles of the region of interest
+    assert len(selected) > 0
+    assert all(x1 < 100 and y1 < 100 for x1, y1, _, _ in selected)
+
+
+class FakeTensor:
+    def __init__(self, values):
+        self.values = np.array(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self) -> np.ndarray:
+        return self.values
+
+
+class FakeBoxes:
+    """Boxes of ultralytics Results with one class"""
+
+    def __init__(self, xyxy: list[list[float]]):
+        self.xyxy = FakeTensor(np.reshape(xyxy, (-1, 4)))
+        self.cls = FakeTensor([0] * len(xyxy))
+        self.conf = FakeTensor([0.9] * len(xyxy))
+        self.id = None
+
+    def __len__(self):
+        return len(self.xyxy.values)
+
+
+class FakeResult:
+    names = {0: "tag"}
+
+    def __init__(self, xyxy: list[list[float]]):
+        self.boxes = FakeBoxes(xyxy)
+
+
+class TileModel:
+    """Finds the bright blob in every crop it gets"""
+
+    def __init__(self):
+        self.crops = 0
+
+    def predict(self, crops, stream=True, **predict_args):
+        for crop in crops if isinstance(crops, list) else [crops]:
+            self.crops += 1
+            ys, xs = np.nonzero(crop[..., 0] > 150)
+            if len(xs) == 0:
+                yield FakeResult([])
+            else:
+                yield FakeResult([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]])
+
+
+def test_infer_returns_frame_coordinates():
+    rng = np.random.default_rng(0)
+    model = TileModel()
+    tiler = TiledInference(rois=[])
+    tiler.infer(model, frame_with_blob(1500, 700, rng))
+    detections = tiler.infer(model, frame_with_blob(1506, 702, rng))
+    assert len(detections) == 1
+    np.testing.assert_allclose(detections.xyxy[0], [1506, 702, 1522, 734])
@@ -0,0 +1,57 @@
+"""What-if counting of source.trajectory_index compared with replay of the same store"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from source.detection_store import find_detection_store, replay
+from source.trajectory_index import TrajectoryIndex
+from test_detection_store import room, start_time, walk_people, write_store
+
+
+def test_find_latest_store(tmp_path):
+    people = walk_people(3, 1, np.random.default_rng(0))
+    assert find_detection_store("records/cam1.mp4", root=str(tmp_path)) is None
+    for name, modified in [("old", start_time), ("new", start_time + 60)]:
+        store = write_store(tmp_path / name / "cam1.detections", people)
+        os.utime(store.path / "meta.yaml", (modified, modified))
+    assert find_detection_store("records/cam1.mp4", root=str(tmp_path)) == str(
+        tmp_path / "new" / "cam1.detections"
+    )
+    assert find_detection_store("records/cam2.mp4", root=str(tmp_path)) is None
+
+
+@pytest.mark.parametrize("scale", [1.0, 0.5])
+def test_index_counts_like_replay(tmp_path, scale):
+    rng = np.random.default_rng(7)
+    people = walk_people(600, 6, rng)
+    store = write_store(tmp_path / "cam1.detections", people, scale, chunk_frames=128)
+    index = TrajectoryIndex(store)
+    assert len(index) > 0
+
+    counted = 0
+    for room_id in range(30):
+        x1, y1 = rng.integers(0, 500), rng.integers(0, 380)
+        x2, y2 = x1 + rng.integers(40, 240), y1 + rng.integers(40, 200)
+        window = room(room_id, x1, y1, x2, y2)  # full resolution like rooms of configs
+
+        # copies of rooms are replayed in coordinates of processed frames if scale isn't 1
+        replayed = room(room_id, x1, y1, x2, y2)
+        replayed.crossing_log = []
+        manager, _ = replay(store, [replayed])
+        incidents = manager.pop_incidents()
+
+        counts = index.count(window)
+        assert counts["contain"] == manager.objs[room_id].contain
+        assert counts["incidents"] == len(incidents)
+        if scale == 1.0:
+            deltas = [delta for _, delta in replayed.crossing_log]
+            assert counts["in"] == deltas.count(1)
+            assert counts["out"] == deltas.count(-1)
+        counted += counts["in"] > 0
+    assert counted >= 5  # rooms are crossed, not only empty
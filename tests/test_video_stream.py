@@ -0,0 +1,79 @@
+"""Decoding threads of video_stream readers reach FFmpeg
+
+Run from the repository root: python -m pytest tests
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from source.video_stream import StridedFileReader, VideoStream
+
+pytestmark = pytest.mark.skipif(
+    not os.path.isdir("/proc/self/task"), reason="threads are counted in /proc"
+)
+
+
+def count_threads() -> int:
+    return len(os.listdir("/proc/self/task"))
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory) -> str:
+    path = str(tmp_path_factory.mktemp("video") / "clip.mp4")
+    writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*"mp4v"), 25, (320, 240))
+    for i in range(50):
+        frame = np.full((240, 320, 3), 40, np.uint8)
+        cv.rectangle(frame, (i * 5, 100), (i * 5 + 20, 130), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def started_threads(reader) -> int:
+    """Threads the reader added to the process while it decodes"""
+    before = count_threads()
+    reader.start()
+    try:
+        assert not reader.read() is None
+        return count_threads() - before
+    finally:
+        reader.stop()
+
+
+def test_strided_reader_threads(video):
+    one = started_threads(StridedFileReader(video, threads=1))
+    four = started_threads(StridedFileReader(video, threads=4))
+    assert four > one
+
+
+def test_strided_reader_reads_every_frame(video):
+    reader = StridedFileReader(video, threads=4).start()
+    frames = 0
+    while not reader.read() is None:
+        frames += 1
+    reader.stop()
+    assert frames == 50
+
+
+def test_video_stream_threads(video):
+    pytest.importorskip("vidgear")
+    one = started_threads(VideoStream(video, threads=1, logging=False))
+    four = started_threads(VideoStream(video, threads=4, logging=False))
+    assert four > one
+
+
+def test_video_stream_keeps_first_frame(video):
+    pytest.importorskip("vidgear")
+    stream = VideoStream(video, threads=4, logging=False).start()
+    frames = 0
+    while not stream.read() is None:
+        frames += 1
+    stream.stop()
+    assert frames == 50